@@ -0,0 +1,50 @@
+import os
+import threading
+from contextlib import contextmanager
+
+from run_metrics import count
+
+# --- Atomic Writes ---
+#
+# Outputs are written to a temporary file next to their destination and moved
+# into place with os.replace, so a crash never leaves a half-written file: the
+# destination holds either the previous version or the new one.
+
+
+def temp_tag():
+    """'tmp-<pid>', plus the thread id off the main thread: concurrent writers never share a temporary file."""
+    if threading.current_thread() is threading.main_thread():
+        return f"tmp-{os.getpid()}"
+    return f"tmp-{os.getpid()}-{threading.get_ident()}"
+
+
+def temp_path(path):
+    """Temporary name in the same folder, keeping the extension (np.save adds one)."""
+    root, ext = os.path.splitext(path)
+    return f"{root}.{temp_tag()}{ext}"
+
+
+@contextmanager
+def atomic_path(path):
+    """
+    Yields a temporary path to write to; it replaces `path` when the block
+    succeeds and is removed when it fails.
+    """
+    tmp_path = temp_path(path)
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+        count(bytes_written=os.path.getsize(path))
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def atomic_write_bytes(path, data):
+    """Writes `data` to `path` atomically."""
+    with atomic_path(path) as tmp_path:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
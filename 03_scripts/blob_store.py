@@ -0,0 +1,186 @@
+import os
+import shutil
+import hashlib
+import threading
+from contextlib import contextmanager
+
+from atomic_io import temp_tag
+from eacei_config import project_dir
+from run_metrics import count
+
+# --- Content-Addressed Blob Store ---
+#
+# Raw and intermediate files are stored once, under the sha1 of their bytes:
+#   06_blob_store/objects/ab/cdef0123...
+# The folder layouts the scripts work with (of_interest/original, step_1..3,
+# 02_data_clean) become views: every file in them is a hardlink to its object,
+# so identical files share one copy on disk and "copying" a file is a link.
+#
+# Files in the views are shared. They must be replaced through the store
+# (write_bytes, copy, link), which swap the link atomically, and never opened
+# for writing in place, which would change every view of the same bytes.
+# Files outside the views (the raw folder) are copied into the store, never
+# linked, so their own scripts can keep rewriting them.
+# When hardlinks are not available (another drive, FAT), views fall back to
+# plain copies.
+#
+# The store lives in the "blobs" project folder (06_blob_store by default, see
+# eacei_config.py), resolved on first use.
+
+CHUNK_SIZE = 1 << 20
+
+# Outputs held back by deferred_writes, per thread
+_deferred = threading.local()
+
+
+@contextmanager
+def deferred_writes():
+    """
+    Holds back this thread's write_bytes calls: the yielded list gets their
+    (store, dest, data), written later with write_all (see io_pipeline.py).
+    """
+    _deferred.writes = []
+    try:
+        yield _deferred.writes
+    finally:
+        _deferred.writes = None
+
+
+def write_all(writes):
+    """Writes the outputs deferred_writes held back, in order."""
+    for store, dest, data in writes:
+        store.write_bytes(dest, data)
+
+
+def file_digest(path):
+    """sha1 of a file's bytes."""
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class BlobStore:
+    """Hash-named objects and the hardlink views onto them (see module comment)."""
+
+    def __init__(self, root=None):
+        self._root = root
+
+    @property
+    def root(self):
+        if self._root is None:
+            self._root = project_dir("blobs")
+        return os.path.normpath(self._root)
+
+    @property
+    def objects_dir(self):
+        return os.path.join(self.root, "objects")
+
+    def object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest[2:])
+
+    def has(self, digest):
+        return os.path.exists(self.object_path(digest))
+
+    # --- Storing ---
+
+    def put_bytes(self, data):
+        """Stores `data` if absent. Returns its digest."""
+        digest = hashlib.sha1(data).hexdigest()
+        path = self.object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{temp_tag()}"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return digest
+
+    def put_file(self, path, digest=None):
+        """
+        Stores a copy of an existing file. `path` itself is left alone: a file
+        outside the views (a raw download, a converted sheet) may be rewritten
+        in place by its own script, which must not reach the object. `digest`
+        skips hashing when already known (e.g. from the raw catalog). Returns
+        the digest.
+        """
+        digest = digest or file_digest(path)
+        obj = self.object_path(digest)
+        if not os.path.exists(obj):
+            os.makedirs(os.path.dirname(obj), exist_ok=True)
+            tmp_path = f"{obj}.{temp_tag()}"
+            shutil.copyfile(path, tmp_path)
+            os.replace(tmp_path, obj)
+        return digest
+
+    # --- Views ---
+
+    def link(self, digest, dest):
+        """Makes `dest` a view of an object, replacing what was there."""
+        obj = self.object_path(digest)
+        if not os.path.exists(obj):
+            raise FileNotFoundError(f"Blob {digest} is not in the store")
+        if os.path.exists(dest) and _same_file(dest, obj):
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(dest)), exist_ok=True)
+        tmp_path = f"{dest}.{temp_tag()}"
+        try:
+            os.link(obj, tmp_path)
+        except OSError:
+            shutil.copyfile(obj, tmp_path)
+        os.replace(tmp_path, dest)
+
+    def copy(self, src, dest, digest=None):
+        """Stand-in for shutil.copy2: `dest` becomes a view of the bytes of `src`."""
+        digest = self.put_file(src, digest)
+        self.link(digest, dest)
+        return digest
+
+    def write_bytes(self, dest, data):
+        """Writes a stage output: stores `data` and points `dest` at it."""
+        pending = getattr(_deferred, "writes", None)
+        if pending is not None:
+            pending.append((self, dest, data))
+            return hashlib.sha1(data).hexdigest()
+        count(bytes_written=len(data))
+        digest = self.put_bytes(data)
+        self.link(digest, dest)
+        return digest
+
+    # --- Maintenance ---
+
+    def objects(self):
+        """Digests of every stored object."""
+        if not os.path.isdir(self.objects_dir):
+            return []
+        return [prefix + name
+                for prefix in sorted(os.listdir(self.objects_dir))
+                for name in sorted(os.listdir(os.path.join(self.objects_dir, prefix)))
+                if '.tmp-' not in name]
+
+    def verify(self):
+        """Digests of the objects whose bytes no longer match (written in place)."""
+        return [digest for digest in self.objects() if file_digest(self.object_path(digest)) != digest]
+
+    def prune(self):
+        """Deletes the objects no view links to any more. Returns how many."""
+        removed = 0
+        for digest in self.objects():
+            path = self.object_path(digest)
+            if os.stat(path).st_nlink <= 1:
+                os.remove(path)
+                removed += 1
+        return removed
+
+
+def _same_file(a, b):
+    try:
+        return os.path.samefile(a, b)
+    except OSError:
+        return False
+
+
+def default_store():
+    """The project's blob store (the "blobs" folder)."""
+    return BlobStore()
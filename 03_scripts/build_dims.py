@@ -2,12 +2,14 @@ import os
 import json
 import pandas as pd
 
+from eacei_config import project_dir
 
-def build_dims():
+
+def build_dims(mapping_path=None, output_dir=None):
     
-    # Paths
-    INPUT_MAPPING = r"C:\Users\Henri\Documents\Data Science\Portfolio\SQL\Datasets\EACEI\04_dictionaries\id_mapping.json"
-    OUTPUT_DIR = r"C:\Users\Henri\Documents\Data Science\Portfolio\SQL\Datasets\EACEI\05_database_final"
+    # Paths (defaults: the project folders, see eacei_config.py)
+    INPUT_MAPPING = mapping_path or os.path.join(project_dir("dictionaries"), "id_mapping.json")
+    OUTPUT_DIR = output_dir or project_dir("database")
 
     os.makedirs(OUTPUT_DIR, exist_ok=True)
 
@@ -50,9 +52,14 @@ def build_dims():
     df_year.to_csv(os.path.join(OUTPUT_DIR, "year_dim.csv"), index=False, encoding='utf-8-sig')
     print("Written year_dim.csv")
 
-    # 3) dim_indicator (all T1-T4)
+    # Derived indicators (set "D") are defined next to the mapping file
+    derived_path = os.path.join(os.path.dirname(INPUT_MAPPING), "derived_indicators.json")
+    if os.path.exists(derived_path):
+        mapping["D"] = load_mapping(derived_path).get("D", [])
+
+    # 3) dim_indicator (all T1-T4 and derived)
     ind_list = []
-    for set_name in ("T1", "T2", "T3", "T4"):
+    for set_name in ("T1", "T2", "T3", "T4", "D"):
         for rec in mapping.get(set_name, []):
             entry = {
                 "ind_id": rec["ind_id"],
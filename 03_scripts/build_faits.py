@@ -1,144 +1,280 @@
 import os
 import json
+import shutil
+from contextlib import ExitStack
+import numpy as np
 import pandas as pd
 
-# Paths
-INPUT_MAPPING = r"C:\Users\Henri\Documents\Data_Science\Portfolio\SQL\Datasets\EACEI\04_dictionaries\id_mapping.json"
-INPUT_CLEAN_DIR = r"C:\Users\Henri\Documents\Data_Science\Portfolio\SQL\Datasets\EACEI\02_data_clean"
-OUTPUT_DIR = r"C:\Users\Henri\Documents\Data_Science\Portfolio\SQL\Datasets\EACEI\05_database_final"
+from atomic_io import atomic_path
+from blob_store import file_digest
+from consistency_check import run_check
+from derived_indicators import compute_derived
+from eacei_config import project_dir
+from executor import get_executor
+from fact_changes import load_previous, capture_changes, write_summary
+from fact_ranking import RANKING_FOLDER, write_rankings
+from fact_store import FactWriter, SparseFacts, save_sparse, DEFAULT_VALUE_DTYPE
+from io_pipeline import run_pipeline, source
+from run_journal import RunJournal
+from profiling import profiled, profile_stage, profile_file
+from run_metrics import metered, stage_metrics, file_metrics, count
+from typed_table import typed_path, open_typed, typed_frame
+from shared_lookup import LookupTable, publish_lookups, lookups as shared_lookups, init_worker as attach_worker_lookups
+from unit_conversion import UNITS_FILE, UnitConverter, indicator_units, load_conversions, write_views
 
-os.makedirs(OUTPUT_DIR, exist_ok=True)
-print(f"\nOutput directory: {OUTPUT_DIR}")
-print(f"Output directory exists: {os.path.exists(OUTPUT_DIR)}")
+# Paths (defaults: the project folders, see eacei_config.py)
+MAPPING_FILE = "id_mapping.json"  # In the dictionaries folder
+DERIVED_FILE = "derived_indicators.json"  # Looked up next to the id mapping
+WORK_DIR = ".build_faits_work"  # Per-file checkpoints of an unfinished build
+CHECKPOINT_COLUMNS = ("cat_id", "ind_id", "year_id", "value")
 
 # Load mapping JSON
 def load_mapping(path):
     with open(path, 'r', encoding='utf-8') as f:
         return json.load(f)
 
-mapping = load_mapping(INPUT_MAPPING)
-
-# Build lookups
-# Indicator label -> ind_id
-label_to_ind = {}
-for set_name in ("T1", "T2", "T3", "T4"):
-    for rec in mapping.get(set_name, []):
-        label = rec[f"{set_name}_label"]
-        label_to_ind[label] = rec["ind_id"]
-        print(f"Mapped {label} -> {rec['ind_id']}")
-
-# Category code -> category id
-naf_lookup = {rec["naf_code"]: rec["naf_id"] for rec in mapping.get("NAF", [])}
-reg_lookup = {rec["reg_code"]: rec["reg_id"] for rec in mapping.get("REG", [])}
-teff_lookup = {rec["teff_code"]: rec["teff_id"] for rec in mapping.get("TEFF", [])}
-
-print("\nLookup tables:")
-print(f"NAF codes: {list(naf_lookup.keys())}")
-print(f"REG codes: {list(reg_lookup.keys())}")
-print(f"TEFF codes: {list(teff_lookup.keys())}")
-print(f"Number of indicators: {len(label_to_ind)}")
-
-# Year lookup (year -> year_id)
-year_lookup = {year: year for year in range(2010, 2024)}
-
-# Accumulators for fact rows
-facts_naf = []
-facts_reg = []
-facts_teff = []
-
-# Process each cleaned CSV
-for year in range(2010, 2024):
-    year_dir = os.path.join(INPUT_CLEAN_DIR, str(year))
-    if not os.path.isdir(year_dir):
-        continue
-
-    for fname in os.listdir(year_dir):
-        if not fname.endswith('.csv'):
-            continue
-        parts = fname[:-4].split('_')  # remove .csv
-        # Expect: ['2010', 'NAF', 'T2']
-        _, category, indicator_set = parts
-        filepath = os.path.join(year_dir, fname)
-        print(f"\nReading file: {fname}")
-        df = pd.read_csv(filepath)
-        print(f"Columns found: {df.columns.tolist()}")
-        print(f"Number of rows: {len(df)}")
-        
-        # Debug column names
-        if 'électricité' in ''.join(df.columns):
-            print("Column names containing 'électricité':")
-            for col in df.columns:
-                if 'électricité' in col:
-                    print(f"'{col}' (length: {len(col)})")
-                    print(f"Hex representation: {' '.join(hex(ord(c)) for c in col)}")
-        
-        year_id = year_lookup[year]
-        
-        # Select appropriate lookup and fact accumulator
-        if category == 'NAF':
-            cat_lookup = naf_lookup
-            fact_rows = facts_naf
-            cat_key = 'naf_code'
-            fact_columns = ['naf_id', 'ind_id', 'year_id', 'value']
-        elif category == 'REG':
-            cat_lookup = reg_lookup
-            fact_rows = facts_reg
-            cat_key = 'reg_code'
-            fact_columns = ['reg_id', 'ind_id', 'year_id', 'value']
-        elif category == 'TEFF':
-            cat_lookup = teff_lookup
-            fact_rows = facts_teff
-            cat_key = 'teff_code'
-            fact_columns = ['teff_id', 'ind_id', 'year_id', 'value']
+def build_lookups(mapping):
+    """Builds the indicator label -> ind_id and category code -> id lookups."""
+    # Indicator label -> ind_id
+    label_to_ind = {}
+    for set_name in ("T1", "T2", "T3", "T4"):
+        for rec in mapping.get(set_name, []):
+            label_to_ind[rec[f"{set_name}_label"]] = rec["ind_id"]
+
+    # Category code -> category id
+    cat_lookups = {
+        "NAF": {rec["naf_code"]: rec["naf_id"] for rec in mapping.get("NAF", [])},
+        "REG": {rec["reg_code"]: rec["reg_id"] for rec in mapping.get("REG", [])},
+        "TEFF": {rec["teff_code"]: rec["teff_id"] for rec in mapping.get("TEFF", [])},
+    }
+    return label_to_ind, cat_lookups
+
+def compile_lookups(mapping):
+    """The lookups of build_lookups as LookupTables: {"indicators", "NAF", "REG", "TEFF"} (see shared_lookup.py)."""
+    label_to_ind, cat_lookups = build_lookups(mapping)
+    tables = {"indicators": LookupTable.from_dict(label_to_ind)}
+    tables.update((category, LookupTable.from_dict(lookup)) for category, lookup in cat_lookups.items())
+    return tables
+
+# Per-category settings: (code column in the cleaned files, fact id column)
+CATEGORY_COLUMNS = {
+    "NAF": ("naf_code", "naf_id"),
+    "REG": ("reg_code", "reg_id"),
+    "TEFF": ("teff_code", "teff_id"),
+}
+
+def extract_facts(df, fname, cat_key, cat_lookup, indicators, year_id):
+    """
+    Turns one cleaned wide file into fact columns (cat_id, ind_id, year_id, value).
+    Rows are emitted in the same order as the former row-by-row loop: for each
+    known category row, each known indicator column in file order.
+    `cat_lookup` and `indicators` are LookupTables of compile_lookups.
+    """
+    codes = df[cat_key].to_numpy(dtype=object)
+    cat_ids, known_rows = cat_lookup.resolve(codes)
+    for cat_code in codes[~known_rows]:
+        print(f"Warning: Unknown {cat_key}: {cat_code} in {fname}")
+
+    # Indicator columns start after the code and label columns
+    labels = list(df.columns[2:])
+    ind_ids, known_cols = indicators.resolve(labels)
+    for label, known in zip(labels, known_cols):
+        if not known:
+            print(f"WARNING: Unknown indicator label: '{label}' in {fname}")
+    indicator_cols = [label for label, known in zip(labels, known_cols) if known]
+
+    # Only text columns need pd.to_numeric: the numeric ones (every column of
+    # a typed file) convert as they are
+    block = df.loc[known_rows, indicator_cols]
+    text_cols = [col for col, dtype in block.dtypes.items() if dtype == object]
+    if text_cols:
+        block = block.assign(**{col: pd.to_numeric(block[col], errors='coerce') for col in text_cols})
+    values = block.to_numpy(dtype=np.float64, na_value=np.nan)
+    n_rows, n_cols = values.shape
+    return (
+        np.repeat(cat_ids[known_rows].astype(np.int64), n_cols),
+        np.tile(ind_ids[known_cols].astype(np.int64), n_rows),
+        np.full(n_rows * n_cols, year_id),
+        values.ravel(),
+    )
+
+def save_checkpoint(path, batch):
+    """Writes one file's fact columns atomically."""
+    with atomic_path(path) as tmp_path:
+        np.savez(tmp_path, **dict(zip(CHECKPOINT_COLUMNS, batch)))
+
+def load_checkpoint(path):
+    with np.load(path) as data:
+        return tuple(data[name] for name in CHECKPOINT_COLUMNS)
+
+def extract_task(data, input_path, fname, category, year_id, checkpoint, tables=None):
+    """
+    Reads one cleaned file (CSV or typed) into its fact batch and checkpoints
+    it, as run by the executor (see io_pipeline.run_pipeline). Returns (batch,
+    rows read). Without `tables`, the lookups attached from shared memory are used.
+    """
+    tables = tables or shared_lookups()
+    with profile_file(fname), file_metrics(input_path):
+        cat_key, _ = CATEGORY_COLUMNS[category]
+        if input_path.endswith('.csv'):
+            df = pd.read_csv(source(input_path, data), dtype={cat_key: str})
         else:
-            continue
-
-        # Iterate over each row
-        print(f"\nProcessing rows for {fname}")
-        for idx, row in df.iterrows():
-            print(f"Processing row {idx}, {cat_key}: {row[cat_key]}")
-            cat_code = row[cat_key]
-            cat_id = cat_lookup.get(cat_code)
-            if cat_id is None:
-                print(f"Warning: Unknown {cat_key}: {cat_code}")
-                continue  # unknown code
-
-            # For each indicator column (skip first 2 columns)
-            print(f"\nProcessing indicators for row with {cat_key}={cat_code}")
-            for label, value in row.iloc[2:].items():
-                print(f"Checking indicator: '{label}'")
-                ind_id = label_to_ind.get(label)
-                if ind_id is None:
-                    print(f"WARNING: Unknown indicator label: '{label}'")
-                    print("Available labels:", list(label_to_ind.keys())[:5], "...")  # Show first 5 labels
-                    continue  # unknown indicator
-
-                # Print when we find electricity consumption indicators
-                if "électricité" in label:
-                    print(f"Found electricity indicator: {label} -> {ind_id}")
-
-                # Append fact: [cat_id, ind_id, year_id, value]
-                fact_rows.append([cat_id, ind_id, year_id, value])
-
-# Save fact tables
-naf_df = pd.DataFrame(facts_naf, columns=['naf_id','ind_id','year_id','value'])
-print(f"\nNAF facts count: {len(naf_df)}")
-print("Sample of NAF facts:")
-print(naf_df.head())
-output_path = os.path.join(OUTPUT_DIR, 'faits_naf.csv')
-naf_df.to_csv(output_path, index=False, encoding='utf-8-sig')
-print(f'Written faits_naf.csv to {output_path}')
-print(f'File exists: {os.path.exists(output_path)}')
-print(f'File size: {os.path.getsize(output_path) if os.path.exists(output_path) else "file not found"} bytes')
-
-reg_df = pd.DataFrame(facts_reg, columns=['reg_id','ind_id','year_id','value'])
-output_path = os.path.join(OUTPUT_DIR, 'faits_reg.csv')
-reg_df.to_csv(output_path, index=False, encoding='utf-8-sig')
-print('Written faits_reg.csv')
-
-pd.DataFrame(facts_teff, columns=['teff_id','ind_id','year_id','value']) \
-    .to_csv(os.path.join(OUTPUT_DIR, 'faits_teff.csv'), index=False, encoding='utf-8-sig')
-print('Written faits_teff.csv')
+            # Prefetched bytes are parsed, not mapped
+            df = typed_frame(open_typed(source(input_path, data), mmap_mode='r' if data is None else None))
+        batch = extract_facts(df, fname, cat_key, tables[category], tables["indicators"], year_id)
+        save_checkpoint(checkpoint, batch)
+        count(rows_in=len(df), rows_out=len(batch[0]))
+    return batch, len(df)
+
+@profiled("build_faits")
+@metered("build_faits")
+def build_faits(mapping_path=None, clean_dir=None, output_dir=None,
+                value_dtype=DEFAULT_VALUE_DTYPE, write_binary=True, write_sparse=True, write_changes=True):
+    """
+    Builds faits_naf/faits_reg/faits_teff from the cleaned wide files.
+    Facts are streamed file by file as typed int16/float batches to the CSV
+    for the database load and, with write_binary, to memory-mappable .npy
+    directories. With write_sparse, a present-values-only store with year
+    bitmaps is also written to faits_*_sparse. With write_changes, the inserts, updates and
+    deletes against the previous build go to changes/ (see fact_changes.py).
+    If derived_indicators.json sits next to the mapping file, the derived
+    indicators are computed right after, and if unit_conversions.json does,
+    its normalized views (faits_*_gwh...) are written. The ranking indexes
+    (rankings/, see fact_ranking.py) follow, and the build ends with the
+    totals-vs-components check (consistency_report.csv).
+    Returns a dict of category -> FactTable, memory-mapped with write_binary.
+    """
+    mapping_path = mapping_path or os.path.join(project_dir("dictionaries"), MAPPING_FILE)
+    clean_dir = clean_dir or project_dir("clean")
+    output_dir = output_dir or project_dir("database")
+    os.makedirs(output_dir, exist_ok=True)
+    print(f"\nOutput directory: {output_dir}")
+
+    mapping = load_mapping(mapping_path)
+    lookups = compile_lookups(mapping)
+    print(f"Number of indicators: {len(lookups['indicators'])}")
+
+    # Year lookup (year -> year_id)
+    year_lookup = {year: year for year in range(2010, 2024)}
+
+    # Each file's facts are checkpointed, so an interrupted build resumes
+    # from the journal instead of re-reading every file
+    journal = RunJournal("build_faits")
+    work_dir = os.path.join(output_dir, WORK_DIR)
+    os.makedirs(work_dir, exist_ok=True)
+
+    # Facts are streamed to the outputs one file at a time (see FactWriter), so
+    # memory is bounded by the largest input file. Without write_binary the
+    # binary tables the later passes read go to the work folder and are loaded.
+    binary_root = output_dir if write_binary else work_dir
+    with ExitStack() as stack:
+        writers = {
+            category: stack.enter_context(FactWriter(
+                fact_col, os.path.join(output_dir, f"faits_{category.lower()}.csv"),
+                os.path.join(binary_root, f"faits_{category.lower()}"), value_dtype))
+            for category, (_, fact_col) in CATEGORY_COLUMNS.items()
+        }
+
+        # Each file is read and checkpointed on the run's executor, its reads
+        # overlapped if set (see executor.py, io_pipeline.py); its batch comes
+        # back here, in file order, for the writers.
+        # A process pool attaches the lookups from shared memory (see
+        # shared_lookup.py), the other executors get them with the tasks.
+        shared = get_executor().kind == "processes"
+        units, tasks = [], []
+        for year in range(2010, 2024):
+            year_dir = os.path.join(clean_dir, str(year))
+            if not os.path.isdir(year_dir):
+                continue
+
+            for fname in sorted(os.listdir(year_dir)):
+                if not fname.endswith('.csv'):
+                    continue
+                parts = fname[:-4].split('_')  # remove .csv
+                # Expect: ['2010', 'NAF', 'T2']
+                _, category, indicator_set = parts
+                if category not in CATEGORY_COLUMNS:
+                    continue
+
+                file_path = os.path.join(year_dir, fname)
+                unit = {"year": year, "category": category, "table": indicator_set,
+                        "path": file_path, "sha1": file_digest(file_path)}
+                checkpoint = os.path.join(work_dir, fname.replace('.csv', '.npz'))
+                resumed = journal.is_done(unit) and os.path.exists(checkpoint)
+                units.append((fname, category, unit, checkpoint, resumed))
+                if resumed:
+                    continue
+
+                # The typed file step_3 saved along, when there is one: mapped, not parsed
+                typed = typed_path(file_path)
+                input_path = typed if os.path.exists(typed) else file_path
+                tables = None if shared else {category: lookups[category], "indicators": lookups["indicators"]}
+                tasks.append((input_path, fname, category, year_lookup[year], checkpoint, tables))
+
+        with publish_lookups(lookups) as handle:
+            outcomes = run_pipeline(extract_task, tasks, path=lambda task: task[0],
+                                    initializer=attach_worker_lookups, initargs=(handle,))
+            for fname, category, unit, checkpoint, resumed in units:
+                if resumed:
+                    batch = load_checkpoint(checkpoint)
+                    writers[category].extend(*batch)
+                    print(f"Resumed {fname}: {len(batch[0])} facts from the last run")
+                    continue
+
+                outcome = next(outcomes)
+                if outcome.error is not None:
+                    journal.failed(unit, outcome.error)
+                    continue
+                batch, rows_in = outcome.result
+                writers[category].extend(*batch)
+                journal.done(unit)
+                print(f"Read {fname}: {rows_in} rows -> {len(batch[0])} facts")
+
+        # Save fact tables
+        tables = {}
+        changes = {}
+        for category, writer in writers.items():
+            out_name = f"faits_{category.lower()}"
+            if write_changes:
+                # Read the previous build before it is replaced
+                previous = load_previous(output_dir, out_name)
+            if not write_binary:
+                # A binary table left by an earlier build would be read instead of the new CSV
+                shutil.rmtree(os.path.join(output_dir, out_name), ignore_errors=True)
+            table = writer.finish(mmap_mode="r" if write_binary else None)
+            tables[category] = table
+            print(f"Written {out_name}: {len(table)} facts")
+            if write_changes:
+                changes[out_name] = capture_changes(previous, table, out_name, output_dir)
+            if write_sparse:
+                sparse = SparseFacts.from_table(table)
+                save_sparse(sparse, os.path.join(output_dir, f"{out_name}_sparse"))
+                print(f"Written {out_name}_sparse: {len(sparse)} present values out of {len(table)} facts")
+    if write_changes:
+        write_summary(changes, output_dir)
+
+    derived_path = os.path.join(os.path.dirname(mapping_path), DERIVED_FILE)
+    if os.path.exists(derived_path):
+        with profile_stage("derived_indicators"), stage_metrics("derived_indicators"):
+            compute_derived(tables, mapping, derived_path, output_dir)
+
+    units_path = os.path.join(os.path.dirname(mapping_path), UNITS_FILE)
+    if os.path.exists(units_path):
+        with profile_stage("unit_views"), stage_metrics("unit_views"):
+            converter = UnitConverter(indicator_units(mapping), load_conversions(units_path))
+            write_views(tables, converter, output_dir)
+
+    with profile_stage("rankings"), stage_metrics("rankings"):
+        write_rankings(tables, mapping, os.path.join(output_dir, RANKING_FOLDER))
+
+    with profile_stage("consistency_check"), stage_metrics("consistency_check"):
+        run_check(tables, mapping, output_dir)
+
+    if journal.end():
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return tables
 
 if __name__ == '__main__':
+    build_faits()
     print('Finished building all fact tables.')
@@ -0,0 +1,137 @@
+import os
+import re
+import json
+import pandas as pd
+
+from eacei_config import project_dir
+
+# --- Category Normalization ---
+#
+# The NAF, REG and TEFF step_2 cleaners share this engine. The rules live in
+# 04_dictionaries/category_normalization.json, one block per dimension:
+#   - NAF:      ordered code prefixes (historic '07 - 08 - 09 ...' variants ->
+#               2023 code), canonical labels, and drop prefixes ('Total hors IAA')
+#   - REG/TEFF: aliases (old region / size band -> current name), name -> code,
+#               and names whose rows are dropped ('Corse')
+# Prefix lists are compiled into one anchored regex whose alternatives keep the
+# file order, so the first listed prefix wins as it did with the startswith
+# loop. Rules are resolved once per distinct first-column value, then mapped
+# onto the rows, so the cost grows with distinct values rather than rows × rules.
+
+NORMALIZATION_FILE = 'category_normalization.json'  # In the dictionaries folder
+
+# Actions returned by CategoryNormalizer.resolve
+KEEP = "keep"        # row left untouched (header rows repeated inside the data)
+DROP = "drop"        # row removed
+SPLIT = "split"      # first cell replaced by [code, label]
+REPLACE = "replace"  # code written to the first cell, label to the second if known
+
+_normalizers = {}
+
+
+def _prefix_regex(prefixes):
+    """Single anchored alternation over `prefixes`, tried in list order."""
+    if not prefixes:
+        return None
+    return re.compile("|".join(re.escape(p) for p in prefixes))
+
+
+class CategoryNormalizer:
+    """Normalizes the code/label columns of one dimension's data rows."""
+
+    def __init__(self, dimension, spec):
+        self.dimension = dimension
+        self.header_keywords = spec.get("header_keywords", [])
+        self.labels = spec.get("labels", {})
+        self.aliases = spec.get("aliases", {})
+        self.codes = spec.get("codes", {})
+        self.drop = set(spec.get("drop", []))
+        self.total = spec.get("total")
+        self.plain_codes = set(spec.get("plain_codes", []))
+
+        self.code_prefixes = dict(spec.get("code_prefixes", []))
+        self._prefix_re = _prefix_regex([p for p, _ in spec.get("code_prefixes", [])])
+        self._drop_re = _prefix_regex(spec.get("drop_prefixes", []))
+        self._keep_re = _prefix_regex(self.header_keywords) if spec.get("keep_header_rows") else None
+        self._label_re = re.compile(spec["label_pattern"]) if spec.get("label_pattern") else None
+        self._resolved = {}
+
+    def _resolve_code_cell(self, cell):
+        """NAF-style rules: the cell is a code, possibly followed by its label."""
+        if self.total and self.total["contains"] in cell:
+            code = self.total["code"]
+            return SPLIT, code, self.labels.get(code, self.total["contains"])
+
+        has_label = self._label_re is not None and bool(self._label_re.search(cell)) and cell not in self.plain_codes
+        if not has_label:
+            code = self.code_prefixes.get(cell, cell)
+            return REPLACE, code, self.labels.get(code)
+
+        match = self._prefix_re.match(cell) if self._prefix_re else None
+        if match is None:
+            print(f"  - Warning: Could not find a split pattern for combined cell: '{cell}'")
+            return REPLACE, cell, None
+        code = self.code_prefixes[match.group(0)]
+        label = self.labels.get(code)
+        if label is None:
+            label = re.sub(r'^\s*[-–]\s*', '', cell[match.end():].strip()).strip()
+        return SPLIT, code, label
+
+    def resolve(self, cell):
+        """(action, code, label) for one stripped first-column value; memoized."""
+        if cell in self._resolved:
+            return self._resolved[cell]
+
+        if self._keep_re is not None and self._keep_re.match(cell):
+            result = (KEEP, None, None)
+        elif (self._drop_re is not None and self._drop_re.match(cell)) or cell in self.drop:
+            result = (DROP, None, None)
+        elif self._prefix_re is not None or self._label_re is not None:
+            result = self._resolve_code_cell(cell)
+        else:
+            name = self.aliases.get(cell, cell)
+            result = (SPLIT, self.codes.get(name, ""), name)
+
+        self._resolved[cell] = result
+        return result
+
+    def normalize_rows(self, rows):
+        """
+        Returns the normalized data rows. Empty rows are skipped, like the
+        csv-module loops they replace.
+        """
+        rows = [row for row in rows if row]
+        if not rows:
+            return []
+
+        keys = pd.Series([row[0] for row in rows], dtype=object).str.strip()
+        resolved = {key: self.resolve(key) for key in keys.unique()}
+        for key, (action, _, _) in resolved.items():
+            if action == DROP:
+                print(f"  - Removing obsolete row: {key}")
+
+        normalized = []
+        for row, (action, code, label) in zip(rows, keys.map(resolved)):
+            if action == DROP:
+                continue
+            if action == KEEP:
+                normalized.append(row)
+            elif action == SPLIT:
+                normalized.append([code, label] + row[1:])
+            else:
+                row = [code] + row[1:]
+                if label is not None and len(row) > 1:
+                    row[1] = label
+                normalized.append(row)
+        return normalized
+
+
+def load_normalizer(dimension, path=None):
+    """Returns the normalizer for 'NAF', 'REG' or 'TEFF', loaded once per process."""
+    path = path or os.path.join(project_dir("dictionaries"), NORMALIZATION_FILE)
+    key = (dimension, os.path.abspath(path))
+    if key not in _normalizers:
+        with open(path, 'r', encoding='utf-8') as f:
+            spec = json.load(f)
+        _normalizers[key] = CategoryNormalizer(dimension, spec[dimension])
+    return _normalizers[key]
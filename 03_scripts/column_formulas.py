@@ -0,0 +1,63 @@
+import numpy as np
+
+from typed_table import BLANK, null_aware_sum
+
+# --- Derived Column Formulas ---
+#
+# A naming-convention JSON can declare columns computed from other canonical
+# columns under "derived_columns", e.g. in T4_naming_convention.json:
+#
+#   "derived_columns": {
+#     "Électricité autoproduite": {
+#       "op": "sum",
+#       "inputs": ["Électricité produite d’origine thermique",
+#                  "Production d’électricité d’origine non thermique"]
+#     }
+#   }
+#
+# Formulas run on the typed values and markers of typed_table.py, so a sum is
+# one null_aware_sum over the input columns: nulls count as 0 unless every
+# input is null. Rows where a sum included a null are returned as records
+# instead of being logged from inside a per-row apply.
+
+FORMULA_OPS = ("sum",)
+
+
+def load_formulas(naming_convention):
+    """The "derived_columns" block of a loaded naming-convention JSON."""
+    formulas = naming_convention.get("derived_columns", {})
+    for target, formula in formulas.items():
+        if formula.get("op") not in FORMULA_OPS:
+            raise ValueError(f"Unknown operation for derived column '{target}': {formula.get('op')}")
+    return formulas
+
+
+def evaluate_formulas(df, markers, formulas, nulls):
+    """
+    Appends every derived column of `formulas` to `df` and `markers`. A formula
+    is skipped when its target is already a column of the file, or filled with
+    nulls when one of its inputs is missing.
+    Returns (df, markers, records) with one (aggregation, axis, group_id) record
+    per row sum that included a suppressed or null input.
+    """
+    ids = df.iloc[:, 0].to_numpy()
+    records = []
+
+    for target, formula in formulas.items():
+        if target in df.columns:
+            print(f"  - Warning: '{target}' is already in the file, not recomputed.")
+            continue
+        if not all(col in df.columns for col in formula["inputs"]):
+            print(f"  - Warning: Could not calculate '{target}' because source columns were not found.")
+            df[target] = np.nan
+            markers[target] = np.full(len(df), BLANK, dtype=np.uint8)
+            continue
+
+        cols = [i for i, col in enumerate(df.columns) if col in formula["inputs"]]
+        sums, result, partial = null_aware_sum(
+            df.iloc[:, cols].to_numpy(dtype=np.float64), markers.iloc[:, cols].to_numpy(), nulls, axis=1)
+        df[target] = sums
+        markers[target] = result
+        records.extend(("ManualColumnSum", "columns", group_id) for group_id in ids[partial])
+
+    return df, markers, records
@@ -0,0 +1,157 @@
+import os
+import time
+import numpy as np
+import pandas as pd
+
+from atomic_io import atomic_path
+from eacei_config import project_dir, load_dictionary
+from fact_store import FACT_CAT_COLUMNS, FactTable, read_facts_csv
+
+# --- Hierarchical Consistency Check ---
+#
+# For every dimension, indicator and year, the published total must match the
+# sum of its components:
+#   - NAF  '_T'  = sum of the sector rows
+#   - REG  'FRA' = sum of the regions plus DOM
+#   - TEFF '_T'  = sum of the size bands
+# All checks run in a single groupby over the concatenated fact tables.
+#
+# Suppression-aware decisions:
+#   - total null, or every component null  -> not checkable, skipped
+#   - some components null (suppressed)    -> the component sum is a lower
+#     bound, only flagged when it exceeds the total
+#   - no component null                    -> flagged when |total - sum| is
+#     above tolerance
+# Published values are rounded, so the tolerance grows with the number of
+# summed components. Prices (units with '/') are not additive and are skipped.
+
+TOTAL_CODES = {"NAF": "_T", "REG": "FRA", "TEFF": "_T"}
+ROUNDING_TOLERANCE = 0.5   # per summed component
+RELATIVE_TOLERANCE = 0.01  # of the total
+
+
+def additive_indicators(mapping):
+    """ind_ids whose values can be summed across members (not prices)."""
+    ids = set()
+    for set_name in ("T1", "T2", "T3", "T4"):
+        for rec in mapping.get(set_name, []):
+            if "/" not in rec.get(f"{set_name}_unit", ""):
+                ids.add(rec["ind_id"])
+    return ids
+
+
+def total_ids(mapping):
+    """Category -> id of its total member."""
+    ids = {}
+    for category, code in TOTAL_CODES.items():
+        key = category.lower()
+        for rec in mapping.get(category, []):
+            if rec[f"{key}_code"] == code:
+                ids[category] = rec[f"{key}_id"]
+    return ids
+
+
+def stack_facts(tables):
+    """Concatenates the fact tables into one frame with a 'dim' column."""
+    frames = []
+    for category, table in tables.items():
+        frames.append(pd.DataFrame({
+            "dim": category,
+            "cat_id": np.asarray(table.cat_id),
+            "ind_id": np.asarray(table.ind_id),
+            "year_id": np.asarray(table.year_id),
+            "value": np.asarray(table.value),
+        }))
+    facts = pd.concat(frames, ignore_index=True)
+    facts["dim"] = facts["dim"].astype("category")
+    return facts
+
+
+def check_consistency(tables, mapping):
+    """
+    Reconciles totals against their components for every dimension, indicator
+    and year. Returns (discrepancies, checked) where `checked` holds one row per
+    (dim, ind_id, year_id) group with its status.
+    """
+    facts = stack_facts(tables)
+    facts = facts[facts["ind_id"].isin(additive_indicators(mapping))]
+
+    totals = total_ids(mapping)
+    is_total = np.zeros(len(facts), dtype=bool)
+    for category, total_id in totals.items():
+        is_total |= (facts["dim"] == category).to_numpy() & (facts["cat_id"] == total_id).to_numpy()
+
+    value = facts["value"].to_numpy()
+    present = ~np.isnan(value)
+    component = ~is_total
+    keyed = pd.DataFrame({
+        "dim": facts["dim"],
+        "ind_id": facts["ind_id"],
+        "year_id": facts["year_id"],
+        "total": np.where(is_total, value, np.nan),
+        "component_sum": np.where(component & present, value, 0.0),
+        "n_components": component.astype(np.int32),
+        "n_present": (component & present).astype(np.int32),
+    })
+    checked = keyed.groupby(["dim", "ind_id", "year_id"], observed=True, sort=True).agg(
+        total=("total", "max"),
+        component_sum=("component_sum", "sum"),
+        n_components=("n_components", "sum"),
+        n_present=("n_present", "sum"),
+    ).reset_index()
+
+    total = checked["total"].to_numpy()
+    comp_sum = checked["component_sum"].to_numpy()
+    n_present = checked["n_present"].to_numpy()
+    diff = total - comp_sum
+    tolerance = np.maximum(ROUNDING_TOLERANCE * n_present, RELATIVE_TOLERANCE * np.abs(np.nan_to_num(total)))
+    partial = n_present < checked["n_components"].to_numpy()
+
+    status = np.full(len(checked), "ok", dtype=object)
+    status[partial] = "ok_partial"
+    status[partial & (-diff > tolerance)] = "components_exceed_total"
+    status[~partial & (np.abs(diff) > tolerance)] = "mismatch"
+    status[n_present == 0] = "components_suppressed"
+    status[np.isnan(total)] = "total_suppressed"
+
+    checked["difference"] = diff
+    checked["tolerance"] = tolerance
+    checked["status"] = status
+    discrepancies = checked[checked["status"].isin(["mismatch", "components_exceed_total"])]
+    return discrepancies.reset_index(drop=True), checked
+
+
+def load_tables(database_dir=None):
+    """Reads faits_naf/faits_reg/faits_teff into FactTables."""
+    database_dir = database_dir or project_dir("database")
+    return {
+        category: FactTable.from_frame(read_facts_csv(os.path.join(database_dir, f"faits_{category.lower()}.csv")))
+        for category in FACT_CAT_COLUMNS
+    }
+
+
+def run_check(tables, mapping, output_dir):
+    """Runs the check, writes consistency_report.csv and prints a summary."""
+    start = time.perf_counter()
+    discrepancies, checked = check_consistency(tables, mapping)
+    elapsed = time.perf_counter() - start
+
+    report_path = os.path.join(output_dir, "consistency_report.csv")
+    with atomic_path(report_path) as tmp_path:
+        discrepancies.to_csv(tmp_path, index=False, encoding='utf-8-sig')
+
+    print(f"\nConsistency check: {len(checked)} (dimension, indicator, year) groups in {elapsed:.3f}s")
+    for (dim, status), count in checked.groupby(["dim", "status"], observed=True).size().items():
+        print(f"  - {dim} {status}: {count}")
+    print(f"Written {report_path}: {len(discrepancies)} discrepancies")
+    return discrepancies
+
+
+def check_database(database_dir=None):
+    """Checks the fact tables already written in the database folder."""
+    database_dir = database_dir or project_dir("database")
+    return run_check(load_tables(database_dir), load_dictionary("id_mapping.json"), database_dir)
+
+
+if __name__ == '__main__':
+    check_database()
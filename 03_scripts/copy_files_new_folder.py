@@ -1,7 +1,25 @@
 import os
-import shutil
 
-def organize_and_copy_files(base_dir, target_base_dir):
+from eacei_config import project_dir
+from executor import run_tasks
+from blob_store import BlobStore
+from typed_table import typed_path
+
+def copy_task(source_file_path, target_file_path, store):
+    """One file of the batch, as run by the executor."""
+    # Link the file into the target directory (no second copy on disk)
+    store.copy(source_file_path, target_file_path)
+    print(f"Copied: {source_file_path} -> {target_file_path}")
+
+    # The typed file step_3 may have saved along (see typed_table.py)
+    if os.path.exists(typed_path(source_file_path)):
+        store.copy(typed_path(source_file_path), typed_path(target_file_path))
+    elif os.path.exists(typed_path(target_file_path)):
+        os.remove(typed_path(target_file_path))
+
+def organize_and_copy_files(base_dir, target_base_dir, store=None):
+    store = store or BlobStore()
+    tasks = []
     for year in range(2010, 2024):
         year_path = os.path.join(base_dir, str(year))
 
@@ -20,13 +38,15 @@ def organize_and_copy_files(base_dir, target_base_dir):
                     if file.endswith(".csv"):
                         source_file_path = os.path.join(root, file)
                         target_file_path = os.path.join(target_year_path, file)
+                        tasks.append((source_file_path, target_file_path, store))
 
-                        # Copy the file to the target directory
-                        shutil.copy2(source_file_path, target_file_path)
-                        print(f"Copied: {source_file_path} -> {target_file_path}")
-
-# Set base and target directories
-base_data_path = r"C:\Users\Henri\Documents\Data Science\Portfolio\SQL\Datasets\EACEI\01_data_raw"
-target_data_path = r"C:\Users\Henri\Documents\Data Science\Portfolio\SQL\Datasets\EACEI\02_data_clean"
+    # I/O bound: threads rather than processes (see executor.py)
+    for outcome in run_tasks(copy_task, tasks, path=lambda task: task[0], io_bound=True):
+        if outcome.error is not None:
+            raise outcome.error
 
-organize_and_copy_files(base_data_path, target_data_path)
\ No newline at end of file
+# Copy from the raw to the clean data folder
+if __name__ == '__main__':
+    base_data_path = project_dir("raw")
+    target_data_path = project_dir("clean")
+    organize_and_copy_files(base_data_path, target_data_path)
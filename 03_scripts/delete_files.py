@@ -1,5 +1,7 @@
 import os
 
+from eacei_config import project_dir
+
 # This script will delete all files ending with "_rows.csv" in the "of_interest" directories
 # for each year from 2010 to 2023.
 
@@ -22,5 +24,6 @@ def delete_rows_files(base_dir):
                             print(f"Deleted file: {file_path}")
 
 # Example usage
-base_data_path = r"C:\Users\Henri\Documents\Data Science\Portfolio\SQL\Datasets\EACEI\01_data_raw"
-delete_rows_files(base_data_path)
+if __name__ == '__main__':
+    base_data_path = project_dir("raw")
+    delete_rows_files(base_data_path)
@@ -1,6 +1,8 @@
 import os
 import shutil
 
+from eacei_config import project_dir
+
 # This script will delete the "step_1" folders that were created in the
 # "original" directories for each year from 2010 to 2023.
 
@@ -18,6 +20,6 @@ def delete_removed_rows_folders(base_dir):
                     print(f"Deleted folder: {removed_rows_path}")
 
 # Example usage:
-base_data_path = r"C:\Users\Henri\Documents\Data Science\Portfolio\SQL\Datasets\EACEI\01_data_raw"
-delete_removed_rows_folders(base_data_path)
-
+if __name__ == '__main__':
+    base_data_path = project_dir("raw")
+    delete_removed_rows_folders(base_data_path)
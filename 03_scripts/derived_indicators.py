@@ -0,0 +1,194 @@
+import os
+import json
+import hashlib
+import numpy as np
+
+from atomic_io import atomic_path
+from fact_store import FactBuffer, save_binary, open_binary
+
+# --- Derived Indicators ---
+#
+# Definitions live in 04_dictionaries/derived_indicators.json, next to
+# id_mapping.json, under the "D" indicator set. Each one names its inputs by
+# ind_code and one of these operations:
+#   - sum:            sum of the inputs
+#   - ratio:          sum(numerator) / sum(denominator)
+#   - share_of_total: input / the same input for the dimension total ('_T', 'FRA')
+# and an optional scale factor. Sums follow the cleaning scripts' rule: nulls
+# count as 0 unless every input is null, in which case the result is null.
+#
+# Each category's input indicators are scattered once into a dense
+# [indicator, member, year] array, so every definition is a single vectorized
+# expression over all members and years. Results are cached per definition
+# under a fingerprint of the definition and its input rows, and recomputed
+# only when that fingerprint changes.
+
+CACHE_FILE = "derived_cache.json"
+
+
+def load_definitions(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def code_lookup(mapping):
+    """ind_code -> ind_id over the T1..T4 sets of id_mapping.json."""
+    return {
+        rec[f"{set_name}_code"]: rec["ind_id"]
+        for set_name in ("T1", "T2", "T3", "T4")
+        for rec in mapping.get(set_name, [])
+    }
+
+
+def formula_inputs(formula):
+    """Lists the input ind_codes of a formula."""
+    if formula["op"] == "sum":
+        return list(formula["inputs"])
+    if formula["op"] == "ratio":
+        return list(formula["numerator"]) + list(formula["denominator"])
+    if formula["op"] == "share_of_total":
+        return [formula["input"]]
+    raise ValueError(f"Unknown derived indicator operation: {formula['op']}")
+
+
+def null_aware_sum(planes):
+    """Sums [k, member, year] planes; null only where every plane is null."""
+    total = np.nansum(planes, axis=0)
+    total[np.isnan(planes).all(axis=0)] = np.nan
+    return total
+
+
+class DenseInputs:
+    """Input indicators of one category scattered into [indicator, member, year]."""
+
+    def __init__(self, table, ind_ids):
+        self.members = np.unique(np.asarray(table.cat_id))
+        self.years = np.unique(np.asarray(table.year_id))
+        self.ind_pos = {ind_id: i for i, ind_id in enumerate(ind_ids)}
+
+        shape = (len(ind_ids), len(self.members), len(self.years))
+        self.values = np.full(shape, np.nan)
+        self.exists = np.zeros(shape, dtype=bool)
+
+        ind = np.searchsorted(ind_ids, np.asarray(table.ind_id))
+        ind = np.clip(ind, 0, len(ind_ids) - 1)
+        wanted = np.asarray(ind_ids)[ind] == np.asarray(table.ind_id)
+        m = np.searchsorted(self.members, np.asarray(table.cat_id)[wanted])
+        y = np.searchsorted(self.years, np.asarray(table.year_id)[wanted])
+        self.values[ind[wanted], m, y] = np.asarray(table.value)[wanted]
+        self.exists[ind[wanted], m, y] = True
+
+    def planes(self, ind_ids):
+        return self.values[[self.ind_pos[i] for i in ind_ids]]
+
+    def any_exists(self, ind_ids):
+        return self.exists[[self.ind_pos[i] for i in ind_ids]].any(axis=0)
+
+
+def evaluate(formula, dense, codes, total_id):
+    """Evaluates one formula over all members and years; returns (values, row exists)."""
+    op = formula["op"]
+    scale = formula.get("scale", 1)
+    input_ids = [codes[c] for c in formula_inputs(formula)]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if op == "sum":
+            result = null_aware_sum(dense.planes(input_ids))
+        elif op == "ratio":
+            numerator = null_aware_sum(dense.planes([codes[c] for c in formula["numerator"]]))
+            denominator = null_aware_sum(dense.planes([codes[c] for c in formula["denominator"]]))
+            result = numerator / denominator
+        else:  # share_of_total
+            plane = dense.planes(input_ids)[0]
+            total_pos = np.searchsorted(dense.members, total_id)
+            if total_pos >= len(dense.members) or dense.members[total_pos] != total_id:
+                return None, None
+            result = plane / plane[total_pos]
+
+    result = result * scale
+    result[~np.isfinite(result)] = np.nan
+    return result, dense.any_exists(input_ids)
+
+
+def fingerprint(definition, table, input_ids, total_id):
+    """Hash of a definition and the fact rows it reads."""
+    digest = hashlib.sha1(json.dumps(definition, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+    digest.update(str(total_id).encode('utf-8'))
+    ind_id = np.asarray(table.ind_id)
+    for input_id in sorted(input_ids):
+        rows = ind_id == input_id
+        for column in (table.cat_id, table.year_id, table.value):
+            digest.update(np.ascontiguousarray(np.asarray(column)[rows]).tobytes())
+    return digest.hexdigest()
+
+
+def compute_derived(tables, mapping, definitions_path, output_dir):
+    """
+    Computes the derived indicators for every category of `tables` (as returned
+    by build_faits) and writes faits_<cat>_derived.csv, with a derived=1 marker
+    column, plus a binary copy that serves as the cache for the next run.
+    Returns a dict of category -> FactTable of derived rows.
+    """
+    config = load_definitions(definitions_path)
+    definitions = config.get("D", [])
+    codes = code_lookup(mapping)
+
+    cache_path = os.path.join(output_dir, CACHE_FILE)
+    cache = {}
+    if os.path.exists(cache_path):
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+
+    results = {}
+    for category, table in tables.items():
+        id_key = f"{category.lower()}_id"
+        code_key = f"{category.lower()}_code"
+        total_code = config.get("total_codes", {}).get(category)
+        total_id = next((rec[id_key] for rec in mapping.get(category, []) if rec[code_key] == total_code), None)
+
+        out_name = f"faits_{category.lower()}_derived"
+        previous = None
+        if os.path.isfile(os.path.join(output_dir, out_name, 'meta.json')):
+            previous = open_binary(os.path.join(output_dir, out_name), mmap_mode=None)
+        category_cache = cache.get(category, {})
+        new_cache = {}
+
+        usable = [d for d in definitions if all(c in codes for c in formula_inputs(d["formula"]))]
+        for d in definitions:
+            if d not in usable:
+                print(f"  - Warning: {d['D_code']} references unknown indicator codes, skipped")
+        input_ids = sorted({codes[c] for d in usable for c in formula_inputs(d["formula"])})
+        dense = DenseInputs(table, input_ids) if input_ids else None
+
+        buffer = FactBuffer(table.cat_col)
+        recomputed = 0
+        for d in usable:
+            ids = [codes[c] for c in formula_inputs(d["formula"])]
+            key = fingerprint(d, table, ids, total_id)
+            new_cache[d["D_code"]] = key
+
+            if previous is not None and category_cache.get(d["D_code"]) == key:
+                rows = np.asarray(previous.ind_id) == d["ind_id"]
+                buffer.extend(previous.cat_id[rows], previous.ind_id[rows], previous.year_id[rows], previous.value[rows])
+                continue
+
+            values, exists = evaluate(d["formula"], dense, codes, total_id)
+            if values is None:
+                print(f"  - Warning: no total member for {category}, {d['D_code']} skipped")
+                continue
+            m, y = np.nonzero(exists)
+            buffer.extend(dense.members[m], np.full(len(m), d["ind_id"]), dense.years[y], values[m, y])
+            recomputed += 1
+
+        derived = buffer.finish()
+        results[category] = derived
+        with atomic_path(os.path.join(output_dir, f"{out_name}.csv")) as tmp_path:
+            derived.to_frame().assign(derived=1).to_csv(tmp_path, index=False, encoding='utf-8-sig')
+        save_binary(derived, os.path.join(output_dir, out_name))
+        cache[category] = new_cache
+        print(f"Written {out_name}: {len(derived)} rows, {recomputed} of {len(usable)} indicators recomputed")
+
+    with atomic_path(cache_path) as tmp_path:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, indent=2)
+    return results
@@ -0,0 +1,241 @@
+import os
+import sys
+import argparse
+
+from eacei_config import (FOLDERS, TYPED_TABLES_ENV, BACKENDS, COORDINATOR_ENV, EXECUTOR_ENV, OVERLAP_ENV,
+                          WORKERS_ENV, configure, project_dir)
+from profiling import PROFILE_ENV, profile_stage
+from run_metrics import BASELINE_RUNS, SLOWDOWN_THRESHOLD, stage_metrics
+
+# --- EACEI Command Line ---
+#
+#   python 03_scripts/eacei.py [folder options] <stage> [stage options]
+#
+# One subcommand per pipeline stage. A stage's module (and with it pandas and
+# NumPy) is only imported when that stage runs, so `eacei --help` and argument
+# errors answer without loading them. Folders default to the project layout
+# and can be changed with --root, --config or --<folder>-dir (see
+# eacei_config.py).
+
+CATEGORIES = ("NAF", "REG", "TEFF")
+TABLES = ("T1", "T2", "T3", "T4")
+
+
+# --- Stages ---
+
+def run_catalog(args):
+    from raw_catalog import load_catalog
+    load_catalog(project_dir("raw"))
+
+
+def run_convert(args):
+    if args.since is None:
+        from xls_to_csv import convert_excel_to_csv
+        convert_excel_to_csv(project_dir("raw"))
+    else:
+        from xls_to_csv_post_2018 import convert_excel_to_csv
+        convert_excel_to_csv(project_dir("raw"), start_year=args.since)
+
+
+def run_organize(args):
+    from of_interest import organize_and_rename_files
+    organize_and_rename_files(project_dir("raw"))
+
+
+def run_step1(args):
+    from step_1_cleaning import process_all_files
+    process_all_files(project_dir("raw"))
+
+
+def run_step2(args):
+    import importlib
+    for category in args.categories or CATEGORIES:
+        importlib.import_module(f"step_2_{category}").process_all_files(project_dir("raw"))
+
+
+def run_step3(args):
+    import importlib
+    for table in args.tables or TABLES:
+        module = importlib.import_module(f"step_3_{table}")
+        getattr(module, f"process_{table.lower()}_files")(project_dir("raw"), f"step_3_{table}.py")
+
+
+def run_publish(args):
+    from copy_files_new_folder import organize_and_copy_files
+    organize_and_copy_files(project_dir("raw"), project_dir("clean"))
+
+
+def run_dims(args):
+    from build_dims import build_dims
+    build_dims()
+
+
+def run_facts(args):
+    import numpy as np
+    from build_faits import build_faits
+    build_faits(value_dtype=np.float32 if args.float32 else np.float64,
+                write_binary=not args.no_binary, write_sparse=not args.no_sparse)
+
+
+def run_check(args):
+    from consistency_check import check_database
+    check_database()
+
+
+def run_tensors(args):
+    from fact_tensor import export_tensors
+    export_tensors()
+
+
+def run_rankings(args):
+    from fact_ranking import export_rankings
+    export_rankings()
+
+
+def run_partitions(args):
+    from fact_partitions import export_partitions
+    export_partitions()
+
+
+def run_refresh(args):
+    from fact_partitions import refresh
+    loads, drops = refresh(lambda table, year, path: print(f"load {table} {year}: {path}"),
+                           lambda table, year: print(f"drop {table} {year}"),
+                           state_path=args.state, record=not args.dry_run)
+    print(f"{loads} partitions to load, {drops} to drop")
+
+
+def run_blobs(args):
+    from blob_store import default_store
+    store = default_store()
+    if args.action == "verify":
+        damaged = store.verify()
+        for digest in damaged:
+            print(f"  - Damaged object: {digest}")
+        print(f"Blob store: {len(damaged)} damaged objects")
+        return 1 if damaged else 0
+    print(f"Blob store: {store.prune()} unreferenced objects removed")
+
+
+def run_report(args):
+    from run_metrics import report
+    return 1 if report(baseline_runs=args.runs, threshold=args.threshold) else 0
+
+
+def run_all(args):
+    """step1 -> step2 -> step3 -> publish -> dims -> facts -> partitions."""
+    args.categories, args.tables = None, None
+    args.float32, args.no_binary, args.no_sparse = False, False, False
+    for stage in (run_step1, run_step2, run_step3, run_publish, run_dims, run_facts, run_partitions):
+        stage(args)
+
+
+def run_worker(args):
+    from executor import parse_address, serve
+    serve(parse_address(args.address))
+
+
+# --- Parser ---
+
+def one_of(names):
+    """argparse type accepting one of `names`, in any case (choices= rejects an empty nargs='*')."""
+    def parse(value):
+        if value.upper() not in names:
+            raise argparse.ArgumentTypeError(f"invalid choice: '{value}' (choose from {', '.join(names)})")
+        return value.upper()
+    return parse
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="eacei", description="EACEI energy consumption data pipeline.")
+    parser.add_argument("--root", help="Project root folder (default: the folder above 03_scripts)")
+    parser.add_argument("--config", help="JSON config file with a \"paths\" section (default: <root>/eacei.json)")
+    parser.add_argument("--profile", action="store_true",
+                        help=f"Profile every stage and file into <logs>/profiles/ (same as {PROFILE_ENV}=1)")
+    parser.add_argument("--typed", action="store_true",
+                        help=f"step3 also saves memory-mappable typed tables, read by facts (same as {TYPED_TABLES_ENV}=1)")
+    parser.add_argument("--executor", choices=BACKENDS,
+                        help=f"Where the per-file tasks run (default: serial, same as {EXECUTOR_ENV}; see executor.py)")
+    parser.add_argument("--workers", type=int, metavar="N",
+                        help=f"Threads, processes or local cluster workers (default: the CPU count, same as {WORKERS_ENV})")
+    parser.add_argument("--coordinator", metavar="HOST:PORT",
+                        help=f"Address the cluster coordinator listens on (same as {COORDINATOR_ENV})")
+    parser.add_argument("--overlap-io", action="store_true",
+                        help=f"Overlap the file reads, processing and writes of each stage (same as {OVERLAP_ENV}=1; see io_pipeline.py)")
+    for key, default in FOLDERS.items():
+        parser.add_argument(f"--{key}-dir", metavar="DIR", help=f"{key.capitalize()} folder (default: <root>/{default})")
+
+    stages = parser.add_subparsers(dest="stage", metavar="<stage>")
+    stages.required = True
+
+    def stage(name, func, help):
+        sub = stages.add_parser(name, help=help, description=help)
+        sub.set_defaults(func=func)
+        return sub
+
+    stage("catalog", run_catalog, "Refresh the raw file catalog")
+    convert = stage("convert", run_convert, "Convert the downloaded Excel sheets to CSV")
+    convert.add_argument("--since", type=int, metavar="YEAR", help="Only packages from YEAR on (post-2018 layout)")
+    stage("organize", run_organize, "Copy the NAF/REG/TEFF T1-T4 tables into of_interest/")
+    stage("step1", run_step1, "Step 1: clean the raw CSV text")
+    step2 = stage("step2", run_step2, "Step 2: normalize the category rows")
+    step2.add_argument("categories", nargs="*", type=one_of(CATEGORIES), metavar="CATEGORY",
+                       help=f"Among {', '.join(CATEGORIES)} (default: all)")
+    step3 = stage("step3", run_step3, "Step 3: standardize and aggregate the indicator columns")
+    step3.add_argument("tables", nargs="*", type=one_of(TABLES), metavar="TABLE",
+                       help=f"Among {', '.join(TABLES)} (default: all)")
+    stage("publish", run_publish, "Copy the step_3 files into the clean data folder")
+    stage("dims", run_dims, "Build the dimension tables")
+    facts = stage("facts", run_facts, "Build the fact tables, derived indicators and consistency report")
+    facts.add_argument("--float32", action="store_true", help="Store values as float32")
+    facts.add_argument("--no-binary", action="store_true", help="Skip the memory-mappable .npy tables")
+    facts.add_argument("--no-sparse", action="store_true", help="Skip the sparse fact stores")
+    stage("check", run_check, "Re-run the totals-vs-components check on the database folder")
+    stage("tensors", run_tensors, "Export the fact tables as dense tensors")
+    stage("rankings", run_rankings, "Rebuild the per-indicator and year ranking indexes")
+    stage("partitions", run_partitions, "Export the fact tables as year partitions with a manifest")
+    refresh = stage("refresh", run_refresh, "List the year partitions changed since the last refresh and record them")
+    refresh.add_argument("--state", metavar="FILE",
+                         help="Refresh state of this loader (default: <database>/partitions/refresh_state.json)")
+    refresh.add_argument("--dry-run", action="store_true", help="Only list them")
+    blobs = stage("blobs", run_blobs, "Verify or prune the blob store")
+    blobs.add_argument("action", choices=("verify", "prune"))
+    stage("all", run_all, "Run step1 to partitions in order")
+    worker = stage("worker", run_worker, "Serve the tasks of a cluster coordinator until it closes")
+    worker.add_argument("address", metavar="HOST:PORT", help="The coordinator's address")
+    report = stage("report", run_report, "Compare the last run's stage times with the previous runs")
+    report.add_argument("--runs", type=int, default=BASELINE_RUNS, metavar="N",
+                        help=f"Baseline: median of the N previous runs (default: {BASELINE_RUNS})")
+    report.add_argument("--threshold", type=float, default=SLOWDOWN_THRESHOLD, metavar="PCT",
+                        help=f"Flag stages more than PCT%% slower (default: {SLOWDOWN_THRESHOLD:g})")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    configure(root=args.root, config_path=args.config,
+              **{key: getattr(args, f"{key}_dir") for key in FOLDERS})
+    if args.profile:
+        os.environ[PROFILE_ENV] = "1"
+    if args.typed:
+        os.environ[TYPED_TABLES_ENV] = "1"
+    if args.executor:
+        os.environ[EXECUTOR_ENV] = args.executor
+    if args.workers:
+        os.environ[WORKERS_ENV] = str(args.workers)
+    if args.coordinator:
+        os.environ[COORDINATOR_ENV] = args.coordinator
+    if args.overlap_io:
+        os.environ[OVERLAP_ENV] = "1"
+    if args.func in (run_report, run_worker):  # Not a pipeline run, not recorded
+        return args.func(args) or 0
+    try:
+        with profile_stage(args.stage), stage_metrics(args.stage):
+            return args.func(args) or 0
+    finally:
+        from executor import close_executor
+        close_executor()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,87 @@
+import os
+import json
+from functools import lru_cache
+
+# --- Project Configuration ---
+#
+# The scripts find the project folders through project_dir(key) instead of
+# hard-coded paths. Each folder is resolved, first match wins, from:
+#   1. the environment variable EACEI_<KEY>_DIR (e.g. EACEI_RAW_DIR), which the
+#      eacei command line options set
+#   2. the "paths" section of the config file (EACEI_CONFIG, else eacei.json at
+#      the project root), e.g. {"paths": {"raw": "D:/eacei/01_data_raw"}}
+#   3. its default name under the project root (EACEI_ROOT, else the folder
+#      above 03_scripts)
+# Settings travel through the environment so worker processes inherit them.
+# Nothing is read at import; the config file is read on first use.
+
+FOLDERS = {
+    "zips": "00_original_zip_files",
+    "raw": "01_data_raw",
+    "clean": "02_data_clean",
+    "dictionaries": "04_dictionaries",
+    "database": "05_database_final",
+    "blobs": "06_blob_store",
+    "logs": "07_logs",
+}
+CONFIG_FILE = "eacei.json"
+TYPED_TABLES_ENV = "EACEI_TYPED_TABLES"  # step_3 saves typed tables (see typed_table.py)
+
+# Execution settings, read by executor.py and io_pipeline.py. They are kept
+# here so the command line can set them without importing those modules.
+EXECUTOR_ENV = "EACEI_EXECUTOR"
+WORKERS_ENV = "EACEI_WORKERS"
+COORDINATOR_ENV = "EACEI_COORDINATOR"  # host:port the cluster coordinator listens on
+CLUSTER_KEY_ENV = "EACEI_CLUSTER_KEY"  # Shared secret of the coordinator and its workers
+BACKENDS = ("serial", "threads", "processes", "cluster")
+OVERLAP_ENV = "EACEI_OVERLAP_IO"
+WINDOW_ENV = "EACEI_IO_WINDOW"
+
+
+def project_root():
+    return os.path.normpath(os.environ.get("EACEI_ROOT") or os.path.join(os.path.dirname(__file__), '..'))
+
+
+@lru_cache(maxsize=None)
+def _config_paths(config_path):
+    if not os.path.exists(config_path):
+        return {}
+    with open(config_path, 'r', encoding='utf-8') as f:
+        return json.load(f).get("paths", {})
+
+
+def configure(root=None, config_path=None, **paths):
+    """Sets the project root, config file or folders (e.g. raw='D:/eacei/raw'); None values are ignored."""
+    if root:
+        os.environ["EACEI_ROOT"] = os.path.abspath(root)
+    if config_path:
+        os.environ["EACEI_CONFIG"] = os.path.abspath(config_path)
+    for key, path in paths.items():
+        if key not in FOLDERS:
+            raise KeyError(f"Unknown project folder '{key}', expected one of {', '.join(FOLDERS)}")
+        if path:
+            os.environ[f"EACEI_{key.upper()}_DIR"] = os.path.abspath(path)
+
+
+def project_dir(key):
+    """Absolute path of a project folder (see module comment)."""
+    if key not in FOLDERS:
+        raise KeyError(f"Unknown project folder '{key}', expected one of {', '.join(FOLDERS)}")
+    config_path = os.environ.get("EACEI_CONFIG") or os.path.join(project_root(), CONFIG_FILE)
+    path = (os.environ.get(f"EACEI_{key.upper()}_DIR")
+            or _config_paths(config_path).get(key)
+            or FOLDERS[key])
+    return os.path.abspath(os.path.join(project_root(), path))  # Relative paths start at the root
+
+
+@lru_cache(maxsize=None)
+def _read_dictionary(path):
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Dictionary '{os.path.basename(path)}' not found in {os.path.dirname(path)}")
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def load_dictionary(name):
+    """A JSON file of the dictionaries folder, read once per process. Do not modify the result."""
+    return _read_dictionary(os.path.join(project_dir("dictionaries"), name))
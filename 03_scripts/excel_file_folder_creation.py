@@ -1,6 +1,8 @@
 import os
 import shutil
 
+from eacei_config import project_dir
+
 def organize_excel_files(root_dir):
     # Loop through each year directory
     for year in range(2013, 2024):
@@ -20,6 +22,7 @@ def organize_excel_files(root_dir):
                         shutil.move(file_path, os.path.join(excel_files_dir, file))
                         print(f"Moved {file} to {excel_files_dir}")
 
-# Specify the root directory where your folders are located
-root_directory = r"C:\Users\Henri\Documents\Data Science\Portfolio\SQL\Datasets\EACEI\data"
-organize_excel_files(root_directory)
+# Run on the raw data folder (downloaded packages)
+if __name__ == '__main__':
+    root_directory = project_dir("raw")
+    organize_excel_files(root_directory)
@@ -0,0 +1,385 @@
+import os
+import time
+import queue
+import pickle
+import threading
+import traceback
+import ipaddress
+import multiprocessing
+from itertools import islice, chain
+from collections import deque, namedtuple
+
+from eacei_config import BACKENDS, CLUSTER_KEY_ENV, COORDINATOR_ENV, EXECUTOR_ENV, WORKERS_ENV
+from pipeline_log import init_cluster_worker, take_records, forward_records
+from run_metrics import captured_counts, add_file
+
+# --- Execution Backends ---
+#
+# The batch stages hand their per-file work to run_tasks() instead of a for
+# loop, and one setting picks where it runs (EACEI_EXECUTOR, or
+# `eacei --executor`):
+#   serial     in this process, one file after the other (the default, for debugging)
+#   threads    a thread pool, for the I/O-bound stages (Excel conversion, copies)
+#   processes  a process pool, for the CPU-bound cleaning and aggregation; the
+#              I/O-bound stages (run_tasks(io_bound=True)) use as many threads
+#   cluster    worker processes, on this host or on others, pull the tasks
+#              from a coordinator over TCP (see Cluster below)
+# EACEI_WORKERS sets the number of threads, processes or local cluster
+# workers (default: the CPU count).
+#
+# Tasks are handed out as the outcomes are consumed, at most
+# WINDOW_PER_WORKER per worker ahead of the caller: a slow consumer (the
+# fact writers of build_faits) holds the workers back instead of letting
+# finished results pile up in memory. `tasks` may be a lazy iterable.
+#
+# A task is a module-level function and a tuple of picklable arguments, one
+# per file. The outcomes come back to the calling process in task order, so
+# the journal, the outputs and the printed summaries stay there. Off the
+# serial backend, a task's count() calls are collected in the worker and its
+# time and counters recorded as a file of the current stage (see
+# run_metrics.add_file); profile_file is only effective on the serial backend.
+
+DEFAULT_CLUSTER_KEY = "eacei"  # Only accepted on a loopback address
+POLL_INTERVAL = 0.2  # Seconds between the coordinator's checks for its closing
+WINDOW_PER_WORKER = 2  # Tasks handed out ahead of the consumer, per worker
+WORKER_TIMEOUT = 60.0  # Seconds a cluster run waits with no worker connected
+
+Outcome = namedtuple("Outcome", "task result error")
+
+_executor = None
+
+
+def call_task(func, task, remote=False):
+    """
+    Runs one task in a worker: (result, error, (wall, cpu, counts)). With
+    `remote`, the outcome is pickled back: the traceback becomes a note of the
+    error, and an error that cannot be pickled is replaced by a RuntimeError.
+    """
+    wall, cpu = time.perf_counter(), time.thread_time()
+    with captured_counts() as counts:
+        try:
+            result, error = func(*task), None
+        except Exception as e:
+            result, error = None, e
+    metrics = (time.perf_counter() - wall, time.thread_time() - cpu, counts)
+    if error is not None and remote:
+        note = "".join(traceback.format_exception(error))
+        try:
+            pickle.dumps(error)
+        except Exception:
+            error = RuntimeError(repr(error))
+        error.add_note(f"In worker {multiprocessing.current_process().name}:\n{note}")
+    return result, error, metrics
+
+
+def _call_packed(item):
+    func, task = item
+    return call_task(func, task, remote=True)
+
+
+def _in_window(submit, tasks, window):
+    """
+    Yields (task, handle) in task order, submitting the tasks lazily: at most
+    `window` are submitted and not yet consumed.
+    """
+    pending = deque()
+    for task in tasks:
+        pending.append((task, submit(task)))
+        if len(pending) >= window:
+            yield pending.popleft()
+    while pending:
+        yield pending.popleft()
+
+
+class SerialExecutor:
+    kind = "serial"
+
+    def run(self, func, tasks, initializer=None, initargs=()):
+        for task in tasks:
+            try:
+                yield Outcome(task, func(*task), None), None
+            except Exception as e:
+                yield Outcome(task, None, e), None
+
+    def close(self):
+        pass
+
+
+class ThreadExecutor:
+    kind = "threads"
+
+    def __init__(self, workers):
+        self.workers = workers
+
+    def run(self, func, tasks, initializer=None, initargs=()):
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(self.workers) as pool:
+            submit = lambda task: pool.submit(call_task, func, task, False)
+            for task, future in _in_window(submit, tasks, WINDOW_PER_WORKER * self.workers):
+                result, error, metrics = future.result()
+                yield Outcome(task, result, error), metrics
+
+    def close(self):
+        pass
+
+
+class ProcessExecutor:
+    kind = "processes"
+
+    def __init__(self, workers):
+        self.workers = workers
+
+    def run(self, func, tasks, initializer=None, initargs=()):
+        # Pool.imap would queue every task at once: submit them in the window
+        window = WINDOW_PER_WORKER * self.workers
+        tasks = iter(tasks)
+        first = list(islice(tasks, window))
+        if not first:
+            return
+        # close/join, never terminate: see pipeline_log.LogWriter
+        pool = multiprocessing.Pool(min(self.workers, len(first)), initializer=initializer, initargs=initargs)
+        try:
+            submit = lambda task: pool.apply_async(_call_packed, ((func, task),))
+            for task, pending in _in_window(submit, chain(first, tasks), window):
+                result, error, metrics = pending.get()
+                yield Outcome(task, result, error), metrics
+        finally:
+            pool.close()
+            pool.join()
+
+    def close(self):
+        pass
+
+
+# --- Cluster ---
+#
+# The coordinator listens on EACEI_COORDINATOR (multiprocessing.connection,
+# authenticated with EACEI_CLUSTER_KEY) and serves each connected worker one
+# task at a time; a task whose worker disconnects goes back to the queue.
+# Workers are started on any host that sees the same project folders with
+#     python 03_scripts/eacei.py worker <coordinator host>:<port>
+# and serve every stage of the run until the coordinator closes. Without a
+# coordinator address, the coordinator listens on localhost and starts
+# EACEI_WORKERS local workers itself, a stand-in for a cluster on one machine.
+# Every message is unpickled, so the key is what keeps other hosts from
+# running code: the public default key is only accepted on a loopback
+# address, and EACEI_CLUSTER_KEY must be set for any other one.
+# A run fails instead of waiting forever when its local workers have all
+# exited, or when no worker has been connected for WORKER_TIMEOUT seconds.
+# The workers' step_3 log records come back with the outcomes and go to the
+# run's log writer (see pipeline_log.py).
+
+class ClusterExecutor:
+    kind = "cluster"
+
+    def __init__(self, address=None, local_workers=0, authkey=None, window=None):
+        from multiprocessing.connection import Listener
+        self.window = window or WINDOW_PER_WORKER * max(local_workers, 1)
+        self.authkey = authkey or cluster_key(address)
+        self.listener = Listener(address or ("127.0.0.1", 0), authkey=self.authkey)
+        self.tasks = queue.Queue()
+        self.results = queue.Queue()
+        self.generation = 0
+        self.closed = False
+        self.connections = 0  # Workers connected right now
+        self.lock = threading.Lock()
+        threading.Thread(target=self._accept, name="coordinator", daemon=True).start()
+        host, port = self.listener.address
+        print(f"Coordinator listening on {host}:{port}")
+        self.local = [multiprocessing.Process(target=serve, args=(self.listener.address, self.authkey),
+                                              name=f"worker-{i + 1}", daemon=True)
+                      for i in range(local_workers)]
+        for process in self.local:
+            process.start()
+
+    def _accept(self):
+        while True:
+            try:
+                connection = self.listener.accept()
+            except Exception:  # Closed listener, or a client with the wrong key
+                if self.closed:
+                    break
+                continue
+            threading.Thread(target=self._serve_connection, args=(connection,), daemon=True).start()
+
+    def _serve_connection(self, connection):
+        with self.lock:
+            self.connections += 1
+        try:
+            self._serve_tasks(connection)
+        finally:
+            with self.lock:
+                self.connections -= 1
+            connection.close()
+
+    def _serve_tasks(self, connection):
+        while True:
+            try:
+                item = self.tasks.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                if not self.closed:
+                    continue
+                item = None  # Stops the worker
+            try:
+                connection.send(item)
+                if item is None:
+                    break
+                self.results.put(connection.recv())
+            except (OSError, EOFError):
+                if item is not None:
+                    self.tasks.put(item)  # Another worker takes it
+                break
+
+    def _next_result(self, outstanding):
+        """
+        Waits for a worker's result. Fails when no worker has been connected
+        for WORKER_TIMEOUT seconds, or at once when the local workers all
+        exited and none is connected, rather than waiting forever.
+        """
+        alone_since = None
+        while True:
+            try:
+                return self.results.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                pass
+            if self.connections or not self.results.empty():
+                alone_since = None
+                continue
+            alone_since = alone_since or time.monotonic()
+            local_gone = self.local and not any(process.is_alive() for process in self.local)
+            if local_gone or time.monotonic() - alone_since > WORKER_TIMEOUT:
+                while not self.tasks.empty():
+                    self.tasks.get_nowait()
+                raise RuntimeError(f"No cluster worker connected to {self.listener.address} "
+                                   f"with {outstanding} tasks outstanding")
+
+    def run(self, func, tasks, initializer=None, initargs=()):
+        self.generation += 1
+        generation, submitted = self.generation, [0]
+
+        def submit(task):
+            i = submitted[0]
+            self.tasks.put(((generation, i), func, task))
+            submitted[0] += 1
+            return i
+
+        pending = {}
+        for task, i in _in_window(submit, tasks, self.window):
+            while i not in pending:
+                outstanding = submitted[0] - i - len(pending)
+                (result_generation, j), result, error, metrics, records = self._next_result(outstanding)
+                if result_generation == generation:  # Else left over from an interrupted run
+                    pending[j] = (result, error, metrics, records)
+            result, error, metrics, records = pending.pop(i)
+            forward_records(records)
+            yield Outcome(task, result, error), metrics
+
+    def close(self):
+        """Stops the connected workers and the listener."""
+        while not self.tasks.empty():
+            self.tasks.get_nowait()
+        self.closed = True
+        for process in self.local:
+            process.join()
+        self.listener.close()
+
+
+def serve(address, authkey=None):
+    """Worker loop: runs the coordinator's tasks until it closes."""
+    from multiprocessing.connection import Client
+    connection = Client(tuple(address), authkey=authkey or cluster_key(address))
+    # Log records go back with the outcomes (a forked local worker also drops
+    # the log writer it inherited)
+    records = init_cluster_worker()
+    try:
+        while True:
+            item = connection.recv()
+            if item is None:
+                break
+            task_id, func, task = item
+            outcome = call_task(func, task, remote=True)
+            connection.send((task_id, *outcome, take_records(records)))
+    except EOFError:  # The coordinator went away
+        pass
+    finally:
+        connection.close()
+
+
+def parse_address(address):
+    host, _, port = address.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+def is_loopback(host):
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:  # A host name
+        return False
+
+
+def cluster_key(address=None):
+    """
+    The cluster's authkey: EACEI_CLUSTER_KEY, or the default one when the
+    coordinator is on a loopback address (None: the local default).
+    """
+    key = os.environ.get(CLUSTER_KEY_ENV)
+    if key:
+        return key.encode()
+    if address is not None and not is_loopback(address[0]):
+        raise ValueError(f"Set {CLUSTER_KEY_ENV} to a shared secret: the default key is only "
+                         f"accepted on a loopback address, not {address[0]}")
+    return DEFAULT_CLUSTER_KEY.encode()
+
+
+# --- Settings ---
+
+def worker_count():
+    return int(os.environ.get(WORKERS_ENV) or os.cpu_count() or 1)
+
+
+def get_executor():
+    """The executor of this run, created from the settings on first use."""
+    global _executor
+    if _executor is None:
+        kind = os.environ.get(EXECUTOR_ENV) or "serial"
+        if kind not in BACKENDS:
+            raise ValueError(f"Unknown executor '{kind}', expected one of {', '.join(BACKENDS)}")
+        if kind == "threads":
+            _executor = ThreadExecutor(worker_count())
+        elif kind == "processes":
+            _executor = ProcessExecutor(worker_count())
+        elif kind == "cluster":
+            address = os.environ.get(COORDINATOR_ENV)
+            local = int(os.environ.get(WORKERS_ENV) or 0) if address else worker_count()
+            _executor = ClusterExecutor(parse_address(address) if address else None, local,
+                                        window=WINDOW_PER_WORKER * worker_count())
+        else:
+            _executor = SerialExecutor()
+    return _executor
+
+
+def close_executor():
+    """Closes the run's executor (stops the cluster workers)."""
+    global _executor
+    if _executor is not None:
+        _executor.close()
+        _executor = None
+
+
+def run_tasks(func, tasks, path=None, initializer=None, initargs=(), io_bound=False):
+    """
+    Runs func(*task) for each task on the run's executor and yields an
+    Outcome(task, result, error) for each, in task order. `path(task)` names
+    the input file recorded in the run metrics off the serial backend (None:
+    not recorded); `initializer(*initargs)` runs in each process pool worker.
+    With `io_bound`, a process pool setting runs the tasks on threads instead.
+    """
+    executor = get_executor()
+    if io_bound and executor.kind == "processes":
+        executor = ThreadExecutor(executor.workers)
+    for outcome, metrics in executor.run(func, tasks, initializer, initargs):
+        if metrics is not None and path is not None and path(outcome.task) is not None:
+            add_file(path(outcome.task), *metrics, failed=outcome.error is not None)
+        yield outcome
@@ -0,0 +1,124 @@
+import os
+import json
+import time
+import numpy as np
+
+from atomic_io import atomic_path
+from fact_store import FactTable, read_facts_csv, open_binary
+
+# --- Fact Changes Between Builds ---
+#
+# Before build_faits overwrites faits_<cat>, the previous build is read back
+# (its binary directory, or the CSV when there is none) and compared with the
+# new table. Rows are keyed on (category id, ind_id, year_id), packed into one
+# int64, and each row's hash is the bit pattern of its value (all NaNs share
+# one pattern, so a null stays a null). The delta goes to changes/:
+#   faits_<cat>_inserts.csv   new keys, in the faits_*.csv layout
+#   faits_<cat>_updates.csv   keys whose value changed, with the new value
+#   faits_<cat>_deletes.csv   keys gone from the build (id columns only)
+#   changes_summary.json      per table: row counts, number of inserts,
+#                             updates and deletes, and the ind_ids touched
+# A loader applies deletes, then updates, then inserts. Without a previous
+# build there is nothing to diff: the summary says full_reload and no change
+# files are written.
+
+CHANGES_FOLDER = "changes"  # In the database folder
+SUMMARY_FILE = "changes_summary.json"
+CHANGE_KINDS = ("inserts", "updates", "deletes")
+
+
+def row_keys(table):
+    """(category id, ind_id, year_id) of each row packed into one int64."""
+    return ((np.asarray(table.cat_id).astype(np.int64) << 32)
+            | (np.asarray(table.ind_id).astype(np.int64) << 16)
+            | np.asarray(table.year_id).astype(np.int64))
+
+
+def row_hashes(table):
+    """Bit pattern of each row's value as float64, with a single NaN pattern."""
+    value = np.asarray(table.value, dtype=np.float64)
+    return np.where(np.isnan(value), np.nan, value).view(np.uint64)
+
+
+def load_previous(output_dir, out_name):
+    """The FactTable of the last build in output_dir, None when there is none."""
+    binary_dir = os.path.join(output_dir, out_name)
+    csv_path = os.path.join(output_dir, f"{out_name}.csv")
+    # Read into memory: the files are replaced by the new build right after
+    if os.path.isfile(os.path.join(binary_dir, 'meta.json')):
+        return open_binary(binary_dir, mmap_mode=None)
+    if os.path.isfile(csv_path):
+        return FactTable.from_frame(read_facts_csv(csv_path))
+    return None
+
+
+def _take(table, rows):
+    return FactTable(table.cat_col, *(np.asarray(column)[rows] for column in
+                                      (table.cat_id, table.ind_id, table.year_id, table.value)))
+
+
+def diff_facts(previous, current):
+    """
+    Compares two builds of one fact table (keys are unique within a build).
+    Returns {"inserts", "updates", "deletes"} as FactTables, inserts and
+    updates in the order of `current`, deletes in the order of `previous`.
+    """
+    old_keys, new_keys = row_keys(previous), row_keys(current)
+    _, new_rows, old_rows = np.intersect1d(new_keys, old_keys, assume_unique=True, return_indices=True)
+    changed = row_hashes(current)[new_rows] != row_hashes(previous)[old_rows]
+    return {
+        "inserts": _take(current, np.flatnonzero(~np.isin(new_keys, old_keys, assume_unique=True))),
+        "updates": _take(current, np.sort(new_rows[changed])),
+        "deletes": _take(previous, np.flatnonzero(~np.isin(old_keys, new_keys, assume_unique=True))),
+    }
+
+
+def write_changes(changes, out_name, output_dir):
+    """Writes the three change files of one table; returns their total size in bytes."""
+    changes_dir = os.path.join(output_dir, CHANGES_FOLDER)
+    os.makedirs(changes_dir, exist_ok=True)
+    size = 0
+    for kind in CHANGE_KINDS:
+        df = changes[kind].to_frame()
+        if kind == "deletes":
+            df = df.drop(columns="value")
+        path = os.path.join(changes_dir, f"{out_name}_{kind}.csv")
+        with atomic_path(path) as tmp_path:
+            df.to_csv(tmp_path, index=False, encoding='utf-8-sig')
+        size += os.path.getsize(path)
+    return size
+
+
+def capture_changes(previous, current, out_name, output_dir):
+    """
+    Diffs a new fact table against the previous build (from load_previous)
+    and writes the change files. Returns the table's entry of the summary.
+    """
+    if previous is None:
+        # A stale delta must not be applied on top of a full reload
+        for kind in CHANGE_KINDS:
+            path = os.path.join(output_dir, CHANGES_FOLDER, f"{out_name}_{kind}.csv")
+            if os.path.exists(path):
+                os.remove(path)
+        print(f"No previous {out_name} to compare with: full reload")
+        return {"full_reload": True, "rows": len(current)}
+
+    changes = diff_facts(previous, current)
+    size = write_changes(changes, out_name, output_dir)
+    touched = np.unique(np.concatenate([np.asarray(changes[kind].ind_id) for kind in CHANGE_KINDS]))
+    entry = {"full_reload": False, "rows": len(current), "previous_rows": len(previous)}
+    entry.update({kind: len(changes[kind]) for kind in CHANGE_KINDS})
+    entry["indicators"] = touched.tolist()
+    print(f"Changes in {out_name}: {entry['inserts']} inserts, {entry['updates']} updates, "
+          f"{entry['deletes']} deletes ({size} bytes)")
+    return entry
+
+
+def write_summary(entries, output_dir):
+    """Writes changes_summary.json from {out_name: entry of capture_changes}."""
+    changes_dir = os.path.join(output_dir, CHANGES_FOLDER)
+    os.makedirs(changes_dir, exist_ok=True)
+    summary = {"built": time.strftime('%Y-%m-%d %H:%M:%S'), "tables": entries}
+    with atomic_path(os.path.join(changes_dir, SUMMARY_FILE)) as tmp_path:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
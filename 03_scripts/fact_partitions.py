@@ -0,0 +1,163 @@
+import os
+import json
+import time
+import hashlib
+import numpy as np
+
+from atomic_io import atomic_path, atomic_write_bytes
+from eacei_config import project_dir
+from fact_store import FACT_CAT_COLUMNS
+from fact_tensor import load_fact_table
+
+# --- Year Partitions ---
+#
+# The export writes each fact table as one CSV per year, in the faits_*.csv
+# layout, under partitions/<table>/<table>_<year>.csv, and a manifest:
+#   partitions/manifest.json
+#     {"build_id", "built",
+#      "tables": {"faits_naf": {"2010": {"file", "rows", "sha1", "build_id"}, ...}}}
+# The sha1 is taken over the partition's bytes, and a partition's build_id is
+# the export that last changed them: an unchanged year keeps both, and its
+# file is not rewritten.
+#
+# A refresh driver keeps the sha1s it last imported in a state file of its
+# own. refresh_plan() compares it with the manifest, so only the years whose
+# hash changed are re-imported and the years gone from the manifest dropped;
+# refresh() runs the plan through load/drop callbacks and records each
+# partition in the state as soon as it is done, so a failed refresh resumes.
+
+PARTITION_FOLDER = "partitions"  # In the database folder
+MANIFEST_FILE = "manifest.json"
+STATE_FILE = "refresh_state.json"  # Default refresh state, in the partitions folder
+
+
+def partition_dir(database_dir=None):
+    return os.path.join(database_dir or project_dir("database"), PARTITION_FOLDER)
+
+
+def partition_bytes(table, rows):
+    """The given rows of a FactTable as faits_*.csv bytes."""
+    df = table.to_frame().iloc[rows]
+    return ("\ufeff" + df.to_csv(index=False)).encode("utf-8")
+
+
+def year_rows(table):
+    """{year: row positions} with each year's rows in table order."""
+    years = np.asarray(table.year_id)
+    order = np.argsort(years, kind="stable")
+    bounds = np.flatnonzero(np.diff(years[order])) + 1
+    return {int(years[rows[0]]): rows for rows in np.split(order, bounds) if len(rows)}
+
+
+def load_manifest(out_dir):
+    path = os.path.join(out_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {"build_id": None, "tables": {}}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def export_partitions(database_dir=None, out_dir=None):
+    """
+    Writes the NAF, REG and TEFF fact tables as year partitions plus the
+    manifest (see module comment). Returns the manifest.
+    """
+    database_dir = database_dir or project_dir("database")
+    out_dir = out_dir or partition_dir(database_dir)
+    previous = load_manifest(out_dir)
+    build_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+
+    tables = {}
+    for category in FACT_CAT_COLUMNS:
+        name = f"faits_{category.lower()}"
+        table = load_fact_table(category, database_dir)
+        table_dir = os.path.join(out_dir, name)
+        os.makedirs(table_dir, exist_ok=True)
+        old = previous["tables"].get(name, {})
+
+        entries, changed = {}, 0
+        for year, rows in year_rows(table).items():
+            data = partition_bytes(table, rows)
+            digest = hashlib.sha1(data).hexdigest()
+            entry = {"file": f"{name}/{name}_{year}.csv", "rows": len(rows), "sha1": digest}
+            path = os.path.join(out_dir, entry["file"])
+            if old.get(str(year), {}).get("sha1") == digest and os.path.exists(path):
+                entry["build_id"] = old[str(year)]["build_id"]
+            else:
+                atomic_write_bytes(path, data)
+                entry["build_id"] = build_id
+                changed += 1
+            entries[str(year)] = entry
+
+        for year, entry in old.items():
+            if year not in entries and os.path.exists(os.path.join(out_dir, entry["file"])):
+                os.remove(os.path.join(out_dir, entry["file"]))
+        tables[name] = entries
+        print(f"Written {name} partitions: {changed} of {len(entries)} years changed")
+
+    manifest = {"build_id": build_id, "built": time.strftime('%Y-%m-%d %H:%M:%S'), "tables": tables}
+    with atomic_path(os.path.join(out_dir, MANIFEST_FILE)) as tmp_path:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+    return manifest
+
+
+# --- Refresh Driver ---
+
+def load_state(state_path):
+    if not os.path.exists(state_path):
+        return {}
+    with open(state_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_state(state, state_path):
+    with atomic_path(state_path) as tmp_path:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, indent=2)
+
+
+def refresh_plan(manifest, state):
+    """
+    Partitions to re-import and to drop, given the manifest and a refresh
+    state ({table: {year: sha1}}): ([(table, year, entry)], [(table, year)]).
+    """
+    loads, drops = [], []
+    for table, years in manifest["tables"].items():
+        imported = state.get(table, {})
+        loads += [(table, year, entry) for year, entry in years.items() if imported.get(year) != entry["sha1"]]
+        drops += [(table, year) for year in imported if year not in years]
+    drops += [(table, year) for table, years in state.items() if table not in manifest["tables"] for year in years]
+    return loads, drops
+
+
+def refresh(load, drop=None, out_dir=None, state_path=None, record=True):
+    """
+    Runs the refresh plan: load(table, year, path) for each changed partition,
+    drop(table, year) for each one gone from the manifest, recording each in
+    the state file once done (not with record=False, a dry run). Returns the
+    number of partitions loaded and dropped.
+    """
+    out_dir = out_dir or partition_dir()
+    state_path = state_path or os.path.join(out_dir, STATE_FILE)
+    state = load_state(state_path)
+    loads, drops = refresh_plan(load_manifest(out_dir), state)
+
+    for table, year in drops:
+        if drop is not None:
+            drop(table, year)
+        del state[table][year]
+        if not state[table]:
+            del state[table]
+        if record:
+            save_state(state, state_path)
+    for table, year, entry in loads:
+        load(table, year, os.path.join(out_dir, entry["file"]))
+        state.setdefault(table, {})[year] = entry["sha1"]
+        if record:
+            save_state(state, state_path)
+    return len(loads), len(drops)
+
+
+if __name__ == '__main__':
+    export_partitions()
@@ -0,0 +1,212 @@
+import os
+import json
+import numpy as np
+
+from atomic_io import atomic_path
+from consistency_check import total_ids
+from eacei_config import project_dir, load_dictionary
+from fact_store import FACT_CAT_COLUMNS
+from fact_tensor import load_fact_table
+
+# --- Ranking Index ---
+#
+# "Top 10 sectors by consumption in 2021" or "where does this region rank"
+# would otherwise sort a (dimension, indicator, year) slice of the facts on
+# every query. The ranking index sorts every group once, after build_faits:
+# for each category, the members of each (ind_id, year_id) group are stored
+# contiguously, best first:
+#   - values in descending order, ties broken by member id
+#   - null values after the ranked ones, by member id: kept, never ranked
+#   - the total member ('_T' / 'FRA', see consistency_check.TOTAL_CODES)
+#     left out, it would top every ranking
+# Ties share their competition rank (1, 2, 2, 4). A second ordering of each
+# group by member id answers rank-of-member with one binary search. Top-N
+# and percentiles are then slices and index arithmetic on memory-mapped
+# arrays, saved as rankings/<cat>_<array>.npy with a <cat>_ranking.json
+# sidecar holding the member and indicator codes.
+
+RANKING_FOLDER = 'rankings'  # In the database folder
+RANKING_ARRAYS = ("group_ind", "group_year", "starts", "present", "member", "value", "rank",
+                  "member_sorted", "by_member")
+
+
+def build_ranking(table, excluded=()):
+    """
+    Sorts a FactTable into ranked groups (see module comment) and returns the
+    arrays of RANKING_ARRAYS, leaving out the members in `excluded`.
+    """
+    cat_id = np.asarray(table.cat_id)
+    keep = ~np.isin(cat_id, list(excluded))
+    cat_id = cat_id[keep]
+    ind_id = np.asarray(table.ind_id)[keep]
+    year_id = np.asarray(table.year_id)[keep]
+    value = np.asarray(table.value, dtype=np.float64)[keep]
+
+    is_null = np.isnan(value)
+    order = np.lexsort((cat_id, np.where(is_null, 0.0, -value), is_null, year_id, ind_id))
+    cat_id, ind_id, year_id, value, is_null = (a[order] for a in (cat_id, ind_id, year_id, value, is_null))
+
+    n = len(order)
+    positions = np.arange(n)
+    new_group = np.ones(n, dtype=bool)
+    new_group[1:] = (ind_id[1:] != ind_id[:-1]) | (year_id[1:] != year_id[:-1])
+    group_starts = np.flatnonzero(new_group)
+    starts = np.append(group_starts, n).astype(np.int64)
+    group_of_row = np.cumsum(new_group) - 1
+    present = np.add.reduceat((~is_null).astype(np.int64), group_starts) if n else np.zeros(0, dtype=np.int64)
+
+    # Competition rank: a row starting a run of equal values ranks at its position
+    new_run = new_group.copy()
+    new_run[1:] |= value[1:] != value[:-1]
+    run_start = np.maximum.accumulate(np.where(new_run, positions, 0))
+    rank = (run_start - starts[group_of_row] + 1).astype(np.int32)
+    rank[is_null] = 0
+
+    by_member_order = np.lexsort((cat_id, group_of_row))
+    return {
+        "group_ind": ind_id[group_starts],
+        "group_year": year_id[group_starts],
+        "starts": starts,
+        "present": present,
+        "member": cat_id,
+        "value": value,
+        "rank": rank,
+        "member_sorted": cat_id[by_member_order],
+        "by_member": (by_member_order - starts[group_of_row[by_member_order]]).astype(np.int32),
+    }
+
+
+def ranking_index(category, mapping):
+    """Sidecar of a category's ranking: its members, indicators and the excluded total."""
+    key = category.lower()
+    total = total_ids(mapping).get(category)
+    return {
+        "category": category,
+        "excluded": [] if total is None else [total],
+        "members": [{"id": rec[f"{key}_id"], "code": rec[f"{key}_code"]} for rec in mapping.get(category, [])],
+        "indicators": [
+            {"id": rec["ind_id"], "code": rec[f"{set_name}_code"]}
+            for set_name in ("T1", "T2", "T3", "T4")
+            for rec in mapping.get(set_name, [])
+        ],
+    }
+
+
+def save_ranking(out_dir, category, arrays, index):
+    """Saves <cat>_<array>.npy for each ranking array and <cat>_ranking.json."""
+    os.makedirs(out_dir, exist_ok=True)
+    name = category.lower()
+    for array in RANKING_ARRAYS:
+        with atomic_path(os.path.join(out_dir, f"{name}_{array}.npy")) as tmp_path:
+            np.save(tmp_path, arrays[array])
+    with atomic_path(os.path.join(out_dir, f"{name}_ranking.json")) as tmp_path:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False, indent=2)
+
+
+class RankingIndex:
+    """Ranked members of each (indicator, year) group of one dimension."""
+
+    def __init__(self, category, arrays, index):
+        self.category = category
+        self.index = index
+        for array in RANKING_ARRAYS:
+            setattr(self, array, arrays[array])
+        self._groups = {(int(i), int(y)): g for g, (i, y) in enumerate(zip(self.group_ind, self.group_year))}
+        self._member_ids = {m["code"]: m["id"] for m in index["members"]}
+        self._member_codes = {m["id"]: m["code"] for m in index["members"]}
+        self._ind_ids = {ind["code"]: ind["id"] for ind in index["indicators"]}
+
+    def _bounds(self, indicator, year):
+        """(start, end of the ranked members, end) of a group in the arrays."""
+        g = self._groups[(self._ind_ids.get(indicator, indicator), year)]
+        start = int(self.starts[g])
+        return start, start + int(self.present[g]), int(self.starts[g + 1])
+
+    def member_id(self, member):
+        """Id of a member given its id (e.g. 101) or code (e.g. '13')."""
+        return self._member_ids.get(member, member)
+
+    def member_codes(self, member_ids):
+        return [self._member_codes.get(int(m)) for m in member_ids]
+
+    def counts(self, indicator, year):
+        """(ranked members, members with a null value) of a group."""
+        start, ranked_end, end = self._bounds(indicator, year)
+        return ranked_end - start, end - ranked_end
+
+    def top(self, indicator, year, n, with_ties=False):
+        """
+        (member ids, values) of the n highest values, best first (views, no
+        copy). With with_ties, members tied with the n-th are included too.
+        """
+        start, ranked_end, _ = self._bounds(indicator, year)
+        stop = min(start + n, ranked_end)
+        if with_ties and start < stop < ranked_end:
+            ranks = self.rank[start:ranked_end]
+            stop = start + int(np.searchsorted(ranks, ranks[stop - start - 1], side='right'))
+        return self.member[start:stop], self.value[start:stop]
+
+    def bottom(self, indicator, year, n):
+        """(member ids, values) of the n lowest non-null values, in the reverse of top's order."""
+        start, ranked_end, _ = self._bounds(indicator, year)
+        first = max(start, ranked_end - n)
+        return self.member[first:ranked_end][::-1], self.value[first:ranked_end][::-1]
+
+    def nulls(self, indicator, year):
+        """Member ids whose value is null (suppressed) for the group."""
+        _, ranked_end, end = self._bounds(indicator, year)
+        return self.member[ranked_end:end]
+
+    def rank_of(self, member, indicator, year):
+        """Competition rank of a member (1 = highest), None when its value is null or missing."""
+        start, _, end = self._bounds(indicator, year)
+        member = self.member_id(member)
+        members = self.member_sorted[start:end]
+        i = int(np.searchsorted(members, member))
+        if i == len(members) or members[i] != member:
+            return None
+        rank = int(self.rank[start + int(self.by_member[start + i])])
+        return rank or None
+
+    def percentile(self, indicator, year, q):
+        """Nearest-rank q-th percentile (0-100) of the non-null values, None if there are none."""
+        start, ranked_end, _ = self._bounds(indicator, year)
+        ranked = ranked_end - start
+        if not ranked:
+            return None
+        k = min(max(int(np.ceil(q / 100 * ranked)), 1), ranked)  # k-th lowest value
+        return float(self.value[ranked_end - k])
+
+
+def open_ranking(category, ranking_dir=None, mmap_mode='r'):
+    """Opens a saved ranking index; with mmap_mode set, the arrays are memory-mapped."""
+    ranking_dir = ranking_dir or os.path.join(project_dir("database"), RANKING_FOLDER)
+    name = category.lower()
+    with open(os.path.join(ranking_dir, f"{name}_ranking.json"), 'r', encoding='utf-8') as f:
+        index = json.load(f)
+    arrays = {array: np.load(os.path.join(ranking_dir, f"{name}_{array}.npy"), mmap_mode=mmap_mode)
+              for array in RANKING_ARRAYS}
+    return RankingIndex(category, arrays, index)
+
+
+def write_rankings(tables, mapping, out_dir):
+    """Builds and saves the ranking index of each category of `tables`."""
+    for category, table in tables.items():
+        index = ranking_index(category, mapping)
+        arrays = build_ranking(table, index["excluded"])
+        save_ranking(out_dir, category, arrays, index)
+        print(f"Written {category} ranking: {len(arrays['present'])} (indicator, year) groups, "
+              f"{int(arrays['present'].sum())} ranked values, {len(arrays['member']) - int(arrays['present'].sum())} nulls")
+
+
+def export_rankings(database_dir=None, out_dir=None):
+    """Rebuilds the ranking indexes from the fact tables in the database folder."""
+    database_dir = database_dir or project_dir("database")
+    out_dir = out_dir or os.path.join(database_dir, RANKING_FOLDER)
+    tables = {category: load_fact_table(category, database_dir) for category in FACT_CAT_COLUMNS}
+    write_rankings(tables, load_dictionary("id_mapping.json"), out_dir)
+
+
+if __name__ == '__main__':
+    export_rankings()
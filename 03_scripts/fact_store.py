@@ -0,0 +1,437 @@
+import os
+import json
+import shutil
+import numpy as np
+import pandas as pd
+
+from atomic_io import atomic_path, temp_path
+from run_metrics import count
+
+# --- Typed Fact Storage ---
+#
+# Fact rows are held column-wise with narrow dtypes instead of Python lists of
+# [cat_id, ind_id, year_id, value]:
+#   - category, indicator and year ids as int16 (all ids in id_mapping.json fit)
+#   - values as float64 (or float32 on request), NaN where no value exists
+#   - a packed validity bitmap (1 bit per row) telling which values are present
+#
+# The binary layout is one directory per fact table holding one .npy file per
+# column plus a small meta.json, so it can be memory-mapped with np.load
+# without any parsing.
+
+ID_DTYPE = np.int16
+DEFAULT_VALUE_DTYPE = np.float64
+FACT_CAT_COLUMNS = {"NAF": "naf_id", "REG": "reg_id", "TEFF": "teff_id"}
+FACT_LAYOUT_VERSION = 1
+
+
+class FactTable:
+    """Column-wise fact table with int16 ids, typed values and a validity bitmap."""
+
+    def __init__(self, cat_col, cat_id, ind_id, year_id, value, valid=None):
+        self.cat_col = cat_col
+        self.cat_id = cat_id
+        self.ind_id = ind_id
+        self.year_id = year_id
+        self.value = value
+        # Packed bitmap, one bit per row, True when the value is present
+        if valid is None:
+            valid = np.packbits(~np.isnan(value))
+        self.valid = valid
+
+    def __len__(self):
+        return len(self.cat_id)
+
+    @property
+    def nbytes(self):
+        """Resident size of the columns in bytes."""
+        return sum(a.nbytes for a in (self.cat_id, self.ind_id, self.year_id, self.value, self.valid))
+
+    def is_valid(self):
+        """Returns the validity bitmap unpacked to one boolean per row."""
+        return np.unpackbits(self.valid, count=len(self)).astype(bool)
+
+    def to_frame(self):
+        """Returns the facts as a DataFrame with the narrow dtypes preserved."""
+        return pd.DataFrame({
+            self.cat_col: self.cat_id,
+            "ind_id": self.ind_id,
+            "year_id": self.year_id,
+            "value": self.value,
+        })
+
+    @classmethod
+    def from_frame(cls, df, value_dtype=DEFAULT_VALUE_DTYPE):
+        """Builds a FactTable from a fact DataFrame (first column is the category id)."""
+        cat_col = df.columns[0]
+        return cls(
+            cat_col,
+            df[cat_col].to_numpy(dtype=ID_DTYPE),
+            df["ind_id"].to_numpy(dtype=ID_DTYPE),
+            df["year_id"].to_numpy(dtype=ID_DTYPE),
+            pd.to_numeric(df["value"], errors="coerce").to_numpy(dtype=value_dtype, na_value=np.nan),
+        )
+
+
+class FactBuffer:
+    """Accumulates typed fact batches; replaces the per-row Python lists."""
+
+    def __init__(self, cat_col, value_dtype=DEFAULT_VALUE_DTYPE):
+        self.cat_col = cat_col
+        self.value_dtype = value_dtype
+        self._chunks = []
+        self.rows = 0
+
+    def extend(self, cat_ids, ind_ids, year_ids, values):
+        """Appends one batch of fact rows given as equal-length arrays."""
+        chunk = (
+            np.asarray(cat_ids, dtype=ID_DTYPE),
+            np.asarray(ind_ids, dtype=ID_DTYPE),
+            np.asarray(year_ids, dtype=ID_DTYPE),
+            np.asarray(values, dtype=self.value_dtype),
+        )
+        self._chunks.append(chunk)
+        self.rows += len(chunk[0])
+
+    def finish(self):
+        """Concatenates all batches into a single FactTable."""
+        if not self._chunks:
+            empty_id = np.empty(0, dtype=ID_DTYPE)
+            return FactTable(self.cat_col, empty_id, empty_id.copy(), empty_id.copy(),
+                             np.empty(0, dtype=self.value_dtype))
+        columns = [np.concatenate(parts) for parts in zip(*self._chunks)]
+        return FactTable(self.cat_col, *columns)
+
+
+# --- Streaming Writer ---
+#
+# FactWriter appends each batch to faits_*.csv and to one raw spill file per
+# column as it arrives, so the builder holds one input file's facts at a time
+# instead of the whole table. finish() turns the spill files into the binary
+# layout (.npy header + the raw bytes; the validity bitmap packed chunk by
+# chunk) and returns the table memory-mapped from it. The previous outputs are
+# only replaced in finish(); abort(), or an exception in a with block, removes
+# the temporary files instead.
+
+STREAM_CHUNK_ROWS = 1 << 20  # Rows read at a time when packing the bitmap (a multiple of 8)
+
+
+class FactWriter:
+    """Streams typed fact batches to faits_*.csv and a binary table directory."""
+
+    def __init__(self, cat_col, csv_path, binary_dir, value_dtype=DEFAULT_VALUE_DTYPE):
+        self.cat_col = cat_col
+        self.csv_path = csv_path
+        self.binary_dir = binary_dir
+        self.dtypes = {cat_col: np.dtype(ID_DTYPE), "ind_id": np.dtype(ID_DTYPE),
+                       "year_id": np.dtype(ID_DTYPE), "value": np.dtype(value_dtype)}
+        self.rows = 0
+        self.finished = False
+        self._header = True
+        os.makedirs(binary_dir, exist_ok=True)
+        self._csv = open(temp_path(csv_path), "w", encoding="utf-8-sig", newline="")
+        self._spills = {name: open(self._spill_path(name), "wb") for name in self.dtypes}
+
+    def _spill_path(self, name):
+        return temp_path(os.path.join(self.binary_dir, f"{name}.col"))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if not self.finished:
+            self.abort()
+
+    def extend(self, cat_ids, ind_ids, year_ids, values):
+        """Appends one batch of fact rows given as equal-length arrays."""
+        columns = {name: np.asarray(array, dtype=dtype) for (name, dtype), array
+                   in zip(self.dtypes.items(), (cat_ids, ind_ids, year_ids, values))}
+        for name, array in columns.items():
+            self._spills[name].write(np.ascontiguousarray(array).tobytes())
+        pd.DataFrame(columns).to_csv(self._csv, index=False, header=self._header)
+        self._header = False
+        self.rows += len(columns["value"])
+
+    def _write_npy(self, name, dtype, length, write_data):
+        """Writes <name>.npy: the header, then write_data(f) writes the raw values."""
+        with atomic_path(os.path.join(self.binary_dir, f"{name}.npy")) as tmp_path:
+            with open(tmp_path, "wb") as f:
+                header = {"descr": np.lib.format.dtype_to_descr(dtype), "fortran_order": False, "shape": (length,)}
+                np.lib.format.write_array_header_1_0(f, header)
+                write_data(f)
+
+    def _copy_spill(self, name, f):
+        with open(self._spill_path(name), "rb") as spill:
+            shutil.copyfileobj(spill, f)
+
+    def _pack_valid(self, f):
+        with open(self._spill_path("value"), "rb") as spill:
+            while True:
+                values = np.fromfile(spill, dtype=self.dtypes["value"], count=STREAM_CHUNK_ROWS)
+                if not len(values):
+                    break
+                f.write(np.packbits(~np.isnan(values)).tobytes())
+
+    def finish(self, mmap_mode="r"):
+        """Closes the outputs, writes the binary layout and returns the FactTable opened from it."""
+        if self._header:  # No batch at all: header only
+            pd.DataFrame({name: np.empty(0, dtype) for name, dtype in self.dtypes.items()}).to_csv(self._csv, index=False)
+        self._csv.close()
+        for spill in self._spills.values():
+            spill.close()
+        os.replace(temp_path(self.csv_path), self.csv_path)
+        count(bytes_written=os.path.getsize(self.csv_path))
+
+        for name, dtype in self.dtypes.items():
+            self._write_npy(name, dtype, self.rows, lambda f: self._copy_spill(name, f))
+        self._write_npy("valid", np.dtype(np.uint8), (self.rows + 7) // 8, self._pack_valid)
+        for name in self.dtypes:
+            os.remove(self._spill_path(name))
+        meta = {"layout_version": FACT_LAYOUT_VERSION, "layout": "dense", "cat_col": self.cat_col, "rows": self.rows}
+        _write_meta(self.binary_dir, meta, dict(self.dtypes, valid=np.dtype(np.uint8)))
+        self.finished = True
+        # An empty file cannot be memory-mapped
+        return open_binary(self.binary_dir, mmap_mode=mmap_mode if self.rows else None)
+
+    def abort(self):
+        """Closes and removes the temporary files; the previous outputs stay in place."""
+        self._csv.close()
+        for spill in self._spills.values():
+            spill.close()
+        for path in [temp_path(self.csv_path)] + [self._spill_path(name) for name in self.dtypes]:
+            if os.path.exists(path):
+                os.remove(path)
+        self.finished = True
+
+
+# --- Sparse Layout ---
+#
+# Only present values are stored as fact rows. For every (category, indicator)
+# pair two uint32 year bitmaps (bit i = year_base + i) record in which years a
+# row existed in the dense table and in which years it carried a value. A row
+# that existed without a value is "suppressed" when the same indicator has a
+# value for some other member that year, and "not collected" otherwise.
+
+YEAR_BITS_DTYPE = np.uint32
+MAX_SPARSE_YEARS = 32
+
+
+def _pair_keys(cat_id, ind_id):
+    """Packs (category id, indicator id) into one sortable int64 key."""
+    return (cat_id.astype(np.int64) << 16) | ind_id.astype(np.int64)
+
+
+class SparseFacts:
+    """Present-only fact rows plus per-(category, indicator) year bitmaps."""
+
+    def __init__(self, cat_col, year_base, cat_id, ind_id, year_id, value,
+                 pair_cat, pair_ind, row_bits, value_bits):
+        self.cat_col = cat_col
+        self.year_base = year_base
+        # Present rows, sorted by (category, indicator, year)
+        self.cat_id = cat_id
+        self.ind_id = ind_id
+        self.year_id = year_id
+        self.value = value
+        # One entry per (category, indicator) pair, sorted the same way
+        self.pair_cat = pair_cat
+        self.pair_ind = pair_ind
+        self.row_bits = row_bits
+        self.value_bits = value_bits
+
+    def __len__(self):
+        return len(self.cat_id)
+
+    @property
+    def nbytes(self):
+        """Resident size of the columns in bytes."""
+        arrays = (self.cat_id, self.ind_id, self.year_id, self.value,
+                  self.pair_cat, self.pair_ind, self.row_bits, self.value_bits)
+        return sum(a.nbytes for a in arrays)
+
+    @classmethod
+    def from_table(cls, table):
+        """Builds the sparse layout from a dense FactTable."""
+        year_base = int(table.year_id.min()) if len(table) else 0
+        offsets = table.year_id.astype(np.int64) - year_base
+        if len(table) and offsets.max() >= MAX_SPARSE_YEARS:
+            raise ValueError(f"Sparse layout supports at most {MAX_SPARSE_YEARS} years from {year_base}")
+        year_bit = (np.ones(len(table), dtype=YEAR_BITS_DTYPE) << offsets.astype(YEAR_BITS_DTYPE))
+
+        keys = _pair_keys(table.cat_id, table.ind_id)
+        pair_keys, pair_index = np.unique(keys, return_inverse=True)
+        valid = table.is_valid()
+
+        row_bits = np.zeros(len(pair_keys), dtype=YEAR_BITS_DTYPE)
+        value_bits = np.zeros(len(pair_keys), dtype=YEAR_BITS_DTYPE)
+        np.bitwise_or.at(row_bits, pair_index, year_bit)
+        np.bitwise_or.at(value_bits, pair_index[valid], year_bit[valid])
+
+        order = np.lexsort((table.year_id[valid], table.ind_id[valid], table.cat_id[valid]))
+        return cls(
+            table.cat_col, year_base,
+            np.asarray(table.cat_id)[valid][order],
+            np.asarray(table.ind_id)[valid][order],
+            np.asarray(table.year_id)[valid][order],
+            np.asarray(table.value)[valid][order],
+            (pair_keys >> 16).astype(ID_DTYPE),
+            (pair_keys & 0xFFFF).astype(ID_DTYPE),
+            row_bits, value_bits,
+        )
+
+    def _dense_keys(self):
+        """Returns (pair index, year) of every dense row, ordered by year then pair."""
+        bit_positions = np.arange(MAX_SPARSE_YEARS, dtype=YEAR_BITS_DTYPE)
+        present = ((self.row_bits[None, :] >> bit_positions[:, None]) & 1).astype(bool)
+        year_offsets, pair_index = np.nonzero(present)
+        return pair_index, (year_offsets + self.year_base).astype(ID_DTYPE)
+
+    def indicator_years(self):
+        """Returns ind_id -> bitmap of years in which the indicator has any value."""
+        ind_ids, ind_index = np.unique(self.pair_ind, return_inverse=True)
+        bits = np.zeros(len(ind_ids), dtype=YEAR_BITS_DTYPE)
+        np.bitwise_or.at(bits, ind_index, self.value_bits)
+        return dict(zip(ind_ids.tolist(), bits.tolist()))
+
+    def to_table(self):
+        """Rehydrates the dense FactTable, rows ordered by year, category, indicator."""
+        pair_index, year_id = self._dense_keys()
+        cat_id = np.asarray(self.pair_cat)[pair_index]
+        ind_id = np.asarray(self.pair_ind)[pair_index]
+
+        value = np.full(len(pair_index), np.nan, dtype=self.value.dtype)
+        year_offset = (year_id.astype(YEAR_BITS_DTYPE) - self.year_base)
+        has_value = ((np.asarray(self.value_bits)[pair_index] >> year_offset) & 1).astype(bool)
+        if has_value.any():
+            # Present rows are sorted by (cat, ind, year), so one searchsorted finds them
+            stored = (_pair_keys(self.cat_id, self.ind_id) << 8) | (self.year_id.astype(np.int64) - self.year_base)
+            wanted = (_pair_keys(cat_id[has_value], ind_id[has_value]) << 8) | year_offset[has_value].astype(np.int64)
+            value[has_value] = np.asarray(self.value)[np.searchsorted(stored, wanted)]
+        return FactTable(self.cat_col, cat_id, ind_id, year_id, value)
+
+    def null_rows(self):
+        """
+        Returns the dense rows without a value, with a 'suppressed' column:
+        True when the indicator has values for other members that year,
+        False when the indicator was not collected at all that year.
+        """
+        pair_index, year_id = self._dense_keys()
+        year_offset = year_id.astype(YEAR_BITS_DTYPE) - self.year_base
+        missing = ~((np.asarray(self.value_bits)[pair_index] >> year_offset) & 1).astype(bool)
+        pair_index, year_id, year_offset = pair_index[missing], year_id[missing], year_offset[missing]
+
+        ind_id = np.asarray(self.pair_ind)[pair_index]
+        ind_years = self.indicator_years()
+        ind_bits = np.array([ind_years[i] for i in ind_id.tolist()], dtype=YEAR_BITS_DTYPE)
+        return pd.DataFrame({
+            self.cat_col: np.asarray(self.pair_cat)[pair_index],
+            "ind_id": ind_id,
+            "year_id": year_id,
+            "suppressed": ((ind_bits >> year_offset) & 1).astype(bool),
+        })
+
+
+# --- CSV Loaders ---
+
+def read_facts_csv(path, value_dtype=DEFAULT_VALUE_DTYPE):
+    """
+    Reads a faits_*.csv file with narrow dtypes.
+    Both empty cells and MySQL '\\N' markers are read as missing values, so the
+    value column never falls back to object dtype.
+    """
+    header = pd.read_csv(path, nrows=0, encoding="utf-8-sig").columns
+    dtypes = {col: ID_DTYPE for col in header[:3]}
+    dtypes[header[3]] = value_dtype
+    return pd.read_csv(path, dtype=dtypes, na_values=["\\N"], keep_default_na=True, encoding="utf-8-sig")
+
+
+def write_facts_csv(table, path):
+    """Writes a FactTable in the faits_*.csv layout used by the database load."""
+    with atomic_path(path) as tmp_path:
+        table.to_frame().to_csv(tmp_path, index=False, encoding="utf-8-sig")
+
+
+# --- Binary (memory-mappable) Layout ---
+
+def _save_columns(out_dir, columns, meta):
+    """Writes each column as <name>.npy and the metadata as meta.json."""
+    os.makedirs(out_dir, exist_ok=True)
+    for name, array in columns.items():
+        with atomic_path(os.path.join(out_dir, f"{name}.npy")) as tmp_path:
+            np.save(tmp_path, np.ascontiguousarray(array))
+    _write_meta(out_dir, meta, {name: array.dtype for name, array in columns.items()})
+
+
+def _write_meta(out_dir, meta, dtypes):
+    # meta.json goes last: a directory without it is never opened
+    meta = dict(meta, dtypes={name: str(dtype) for name, dtype in dtypes.items()})
+    with atomic_path(os.path.join(out_dir, "meta.json")) as tmp_path:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+
+
+def _open_columns(in_dir, layout, mmap_mode):
+    """Reads meta.json and returns it with a loader for the column files."""
+    with open(os.path.join(in_dir, "meta.json"), "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta.get("layout_version") != FACT_LAYOUT_VERSION or meta.get("layout", "dense") != layout:
+        raise ValueError(f"Unsupported fact layout in {in_dir}: {meta.get('layout')} v{meta.get('layout_version')}")
+
+    def load(name):
+        return np.load(os.path.join(in_dir, f"{name}.npy"), mmap_mode=mmap_mode)
+
+    return meta, load
+
+
+def save_binary(table, out_dir):
+    """Saves a FactTable as one .npy file per column plus meta.json."""
+    columns = {
+        table.cat_col: table.cat_id,
+        "ind_id": table.ind_id,
+        "year_id": table.year_id,
+        "value": table.value,
+        "valid": table.valid,
+    }
+    meta = {"layout_version": FACT_LAYOUT_VERSION, "layout": "dense", "cat_col": table.cat_col, "rows": len(table)}
+    _save_columns(out_dir, columns, meta)
+
+
+def open_binary(in_dir, mmap_mode="r"):
+    """Opens a binary fact table; with mmap_mode set, columns are memory-mapped."""
+    meta, load = _open_columns(in_dir, "dense", mmap_mode)
+    cat_col = meta["cat_col"]
+    return FactTable(cat_col, load(cat_col), load("ind_id"), load("year_id"), load("value"), load("valid"))
+
+
+def save_sparse(sparse, out_dir):
+    """Saves a SparseFacts store as .npy columns plus meta.json."""
+    columns = {
+        sparse.cat_col: sparse.cat_id,
+        "ind_id": sparse.ind_id,
+        "year_id": sparse.year_id,
+        "value": sparse.value,
+        "pair_cat": sparse.pair_cat,
+        "pair_ind": sparse.pair_ind,
+        "row_bits": sparse.row_bits,
+        "value_bits": sparse.value_bits,
+    }
+    meta = {
+        "layout_version": FACT_LAYOUT_VERSION,
+        "layout": "sparse",
+        "cat_col": sparse.cat_col,
+        "year_base": sparse.year_base,
+        "rows": len(sparse),
+        "pairs": len(sparse.pair_cat),
+    }
+    _save_columns(out_dir, columns, meta)
+
+
+def open_sparse(in_dir, mmap_mode="r"):
+    """Opens a sparse fact store; with mmap_mode set, columns are memory-mapped."""
+    meta, load = _open_columns(in_dir, "sparse", mmap_mode)
+    cat_col = meta["cat_col"]
+    return SparseFacts(
+        cat_col, meta["year_base"],
+        load(cat_col), load("ind_id"), load("year_id"), load("value"),
+        load("pair_cat"), load("pair_ind"), load("row_bits"), load("value_bits"),
+    )
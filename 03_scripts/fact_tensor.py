@@ -0,0 +1,148 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+
+from atomic_io import atomic_path
+from eacei_config import project_dir
+from fact_store import FACT_CAT_COLUMNS, FactTable, open_binary, read_facts_csv
+
+# --- Dense Tensor Store ---
+#
+# Each dimension's facts are materialized as one float64 array indexed
+# [member, indicator, year], NaN where no value exists, plus a boolean mask of
+# present values. Arrays are saved as .npy so they can be memory-mapped, and a
+# sidecar JSON holds the index maps built from the dimension tables, so
+# position <-> id/code lookups never need the fact table.
+
+TENSOR_FOLDER = 'tensors'  # In the database folder
+
+# Dimension table and its (id, code) columns for each category
+DIM_FILES = {
+    "NAF": ("naf_dim.csv", "naf_id", "naf_code"),
+    "REG": ("reg_dim.csv", "reg_id", "reg_code"),
+    "TEFF": ("teff_dim.csv", "teff_id", "teff_code"),
+}
+
+
+class FactTensor:
+    """Dense [member, indicator, year] view of one dimension's facts."""
+
+    def __init__(self, category, values, mask, index):
+        self.category = category
+        self.values = values
+        self.mask = mask
+        self.index = index
+        self._member_pos = {m["id"]: i for i, m in enumerate(index["members"])}
+        self._member_pos.update({m["code"]: i for i, m in enumerate(index["members"])})
+        self._ind_pos = {ind["id"]: i for i, ind in enumerate(index["indicators"])}
+        self._ind_pos.update({ind["code"]: i for i, ind in enumerate(index["indicators"])})
+        self._year_pos = {year: i for i, year in enumerate(index["years"])}
+
+    def member_pos(self, member):
+        """Position of a member given its id (e.g. 101) or code (e.g. '13')."""
+        return self._member_pos[member]
+
+    def ind_pos(self, indicator):
+        """Position of an indicator given its ind_id or ind_code."""
+        return self._ind_pos[indicator]
+
+    def year_pos(self, year):
+        return self._year_pos[year]
+
+    def indicator(self, indicator):
+        """[member, year] matrix for one indicator (a view, no copy)."""
+        return self.values[:, self.ind_pos(indicator), :]
+
+    def series(self, member, indicator):
+        """Time series of one indicator for one member (a view, no copy)."""
+        return self.values[self.member_pos(member), self.ind_pos(indicator), :]
+
+    def cross_section(self, indicator, year):
+        """Values of one indicator across all members for one year (a view, no copy)."""
+        return self.values[:, self.ind_pos(indicator), self.year_pos(year)]
+
+
+def load_index(category, database_dir=None):
+    """Builds the member/indicator/year index maps from the dimension tables."""
+    database_dir = database_dir or project_dir("database")
+    dim_file, id_col, code_col = DIM_FILES[category]
+    dims = pd.read_csv(os.path.join(database_dir, dim_file), dtype={code_col: str}, encoding='utf-8-sig')
+    inds = pd.read_csv(os.path.join(database_dir, 'ind_dim.csv'), encoding='utf-8-sig')
+    years = pd.read_csv(os.path.join(database_dir, 'year_dim.csv'), encoding='utf-8-sig')
+    return {
+        "category": category,
+        "members": [{"id": int(i), "code": c} for i, c in zip(dims[id_col], dims[code_col])],
+        "indicators": [{"id": int(i), "code": c} for i, c in zip(inds['ind_id'], inds['ind_code'])],
+        "years": [int(y) for y in years['year_id']],
+    }
+
+
+def build_tensor(table, index):
+    """Scatters a FactTable into a dense [member, indicator, year] array."""
+    member_ids = [m["id"] for m in index["members"]]
+    ind_ids = [ind["id"] for ind in index["indicators"]]
+    shape = (len(member_ids), len(ind_ids), len(index["years"]))
+
+    m = pd.Index(member_ids).get_indexer(np.asarray(table.cat_id))
+    i = pd.Index(ind_ids).get_indexer(np.asarray(table.ind_id))
+    y = pd.Index(index["years"]).get_indexer(np.asarray(table.year_id))
+    known = (m >= 0) & (i >= 0) & (y >= 0)
+    if not known.all():
+        print(f"  - Warning: {int((~known).sum())} facts reference ids missing from the dimension tables")
+
+    values = np.full(shape, np.nan, dtype=np.float64)
+    values[m[known], i[known], y[known]] = np.asarray(table.value)[known]
+    return values, ~np.isnan(values)
+
+
+def save_tensor(out_dir, category, values, mask, index):
+    """
+    Saves <cat>_values.npy, <cat>_mask.npy and <cat>_index.json, each replaced
+    atomically; the index goes last, so it only names complete arrays.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    name = category.lower()
+    with atomic_path(os.path.join(out_dir, f"{name}_values.npy")) as tmp_path:
+        np.save(tmp_path, values)
+    with atomic_path(os.path.join(out_dir, f"{name}_mask.npy")) as tmp_path:
+        np.save(tmp_path, mask)
+    with atomic_path(os.path.join(out_dir, f"{name}_index.json")) as tmp_path:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False, indent=2)
+
+
+def open_tensor(category, tensor_dir=None, mmap_mode='r'):
+    """Opens a saved tensor; with mmap_mode set, the arrays are memory-mapped."""
+    tensor_dir = tensor_dir or os.path.join(project_dir("database"), TENSOR_FOLDER)
+    name = category.lower()
+    with open(os.path.join(tensor_dir, f"{name}_index.json"), 'r', encoding='utf-8') as f:
+        index = json.load(f)
+    values = np.load(os.path.join(tensor_dir, f"{name}_values.npy"), mmap_mode=mmap_mode)
+    mask = np.load(os.path.join(tensor_dir, f"{name}_mask.npy"), mmap_mode=mmap_mode)
+    return FactTensor(category, values, mask, index)
+
+
+def load_fact_table(category, database_dir=None):
+    """Opens the binary fact table if build_faits wrote one, else the CSV."""
+    database_dir = database_dir or project_dir("database")
+    name = f"faits_{category.lower()}"
+    binary_dir = os.path.join(database_dir, name)
+    if os.path.isfile(os.path.join(binary_dir, 'meta.json')):
+        return open_binary(binary_dir)
+    return FactTable.from_frame(read_facts_csv(os.path.join(database_dir, f"{name}.csv")))
+
+
+def export_tensors(database_dir=None, out_dir=None):
+    """Exports the NAF, REG and TEFF fact tables as dense tensors."""
+    database_dir = database_dir or project_dir("database")
+    out_dir = out_dir or os.path.join(database_dir, TENSOR_FOLDER)
+    for category in FACT_CAT_COLUMNS:
+        index = load_index(category, database_dir)
+        values, mask = build_tensor(load_fact_table(category, database_dir), index)
+        save_tensor(out_dir, category, values, mask, index)
+        print(f"Written {category} tensor {values.shape}: {int(mask.sum())} values present")
+
+
+if __name__ == '__main__':
+    export_tensors()
@@ -0,0 +1,235 @@
+import os
+import re
+import copy
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+
+from atomic_io import atomic_path
+from eacei_config import project_dir
+
+# --- Header Plan Cache ---
+#
+# step_3_T2/T3 resolve every file's indicator columns against the naming
+# convention: forward-fill and flatten the pre-2020 two-row headers, match each
+# (product, indicator) pair against the rules of the file's year, drop obsolete
+# columns and add the missing standard ones. The result only depends on the
+# header rows, so it is computed once as a "plan":
+#   - names: final name of every source column, None when it is dropped
+#   - add:   standard columns to add as nulls
+#   - order: final column order used when aggregating duplicate columns
+# and stored under a fingerprint of the normalized header rows and of the rules
+# that apply to them. The plans persist in 04_dictionaries/header_plans/<table>.json
+# together with the dictionary version; a new version discards them.
+#
+# The file's own id columns (naf_code/naf_label, reg_...) are replaced by a
+# placeholder in the header rows and in the rules before fingerprinting, so
+# NAF, REG and TEFF files with the same indicator columns share one plan.
+
+PLAN_CACHE_FOLDER = 'header_plans'  # In the dictionaries folder
+ID_COLUMN = re.compile(r'^(naf|reg|teff)_(code|label)$')
+PLACEHOLDER = "<dim>"
+
+
+def is_year_in_range(year_to_check, year_spec):
+    """
+    Checks if a given year falls within a year specification.
+    The spec can be a string range "YYYY-YYYY" or a list of years [YYYY, YYYY].
+    """
+    if isinstance(year_spec, str) and '-' in year_spec:
+        start, end = map(int, year_spec.split('-'))
+        return start <= year_to_check <= end
+    elif isinstance(year_spec, list):
+        return year_to_check in year_spec
+    return False
+
+
+def applicable_rules(header_map, year):
+    """Source -> target map of the rules for `year`, in header_map order."""
+    reverse_map = {}
+    for target_header, sources in header_map.items():
+        for source in sources:
+            if year < 2020 and source['type'] == 'multi-index' and is_year_in_range(year, source['years']):
+                reverse_map[(source['product_contains'], source['indicator'])] = target_header
+            elif year >= 2020 and source['type'] == 'single-header' and is_year_in_range(year, source['years']):
+                reverse_map[source['header']] = target_header
+    return reverse_map
+
+
+def resolve_columns(columns, multi_index, reverse_map, target_headers, extra_drops=()):
+    """Computes the plan of a header (see module comment)."""
+    if multi_index:
+        # Forward-fill the product names on the top level, then flatten
+        flat = pd.MultiIndex.from_tuples(columns).to_frame().ffill().to_records(index=False).tolist()
+        names = []
+        for product, indicator in flat:
+            # [code, code] or [label, label] tuples become a single header
+            if product == indicator:
+                names.append(product)
+                continue
+            for (map_prod, map_ind), target in reverse_map.items():
+                # 'in' for flexible matching ("Houille" in "Houille (en milliers de tonnes)")
+                if map_prod in product and map_ind == indicator:
+                    names.append(target)
+                    break
+            else:
+                names.append((product, indicator))
+    else:
+        names = [c.replace('\n', ' ').strip() for c in columns]
+        names = [reverse_map.get(c, c) for c in names]
+
+    # Drop unmatched tuples and obsolete columns, never the code and label columns
+    extra_drops = [tuple(col) for col in extra_drops]
+    for i in range(2, len(names)):
+        name = names[i]
+        lowered = str(name).lower()
+        if isinstance(name, tuple) or 'stock' in lowered or 'établissements' in lowered or name in extra_drops:
+            names[i] = None
+
+    kept = [name for name in names if name is not None]
+    add = [header for header in target_headers if header not in kept]
+    order = [col for col in names[:2] + list(target_headers) if col in kept or col in add]
+    return {"names": names, "add": add, "order": order}
+
+
+def _swap(value, old, new):
+    """Replaces exact id names inside a header value or rule (str or tuple)."""
+    if isinstance(value, tuple):
+        return tuple(_swap(v, old, new) for v in value)
+    if isinstance(value, str) and old and new:
+        for part in ("code", "label"):
+            value = value.replace(f"{old}_{part}", f"{new}_{part}")
+    return value
+
+
+def _dimension(columns):
+    """'naf', 'reg' or 'teff' from the id columns, None if not found."""
+    for column in list(columns)[:2]:
+        for value in (column if isinstance(column, tuple) else (column,)):
+            match = ID_COLUMN.match(str(value))
+            if match:
+                return match.group(1)
+    return None
+
+
+def _encode(names):
+    return [list(n) if isinstance(n, tuple) else n for n in names]
+
+
+def _decode(names):
+    return [tuple(n) if isinstance(n, list) else n for n in names]
+
+
+class HeaderPlanCache:
+    """Persistent header plans of one table (T2, T3)."""
+
+    def __init__(self, table, header_map, extra_drops=(), cache_dir=None):
+        cache_dir = cache_dir or os.path.join(project_dir("dictionaries"), PLAN_CACHE_FOLDER)
+        self.table = table
+        self.header_map = header_map
+        self.extra_drops = [tuple(col) for col in extra_drops]
+        self.path = os.path.join(cache_dir, f"{table}.json")
+        self.version = hashlib.sha1(json.dumps(
+            {"header_map": header_map, "extra_drops": self.extra_drops}, sort_keys=True, ensure_ascii=False
+        ).encode('utf-8')).hexdigest()
+        self.hits = 0
+        self.misses = 0
+        self.resolved = {}  # Plans resolved since this cache (or fork) was made
+        self._dirty = False
+
+        self.plans = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    stored = json.load(f)
+            except ValueError:  # Unreadable: the plans are resolved again
+                print(f"  - Warning: ignoring unreadable header plan cache {self.path}")
+                stored = {}
+            if stored.get("version") == self.version:
+                self.plans = stored.get("plans", {})
+
+    def fingerprint(self, columns, multi_index, reverse_map):
+        """Hash of the normalized header rows and the rules applying to them."""
+        # Rules keep their order: the first matching one wins
+        payload = json.dumps({
+            "version": self.version,
+            "multi_index": multi_index,
+            "rules": [[list(k) if isinstance(k, tuple) else k, v] for k, v in reverse_map.items()],
+            "columns": _encode(columns),
+        }, ensure_ascii=False)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+    def plan_for(self, columns, year):
+        """Plan for a file's columns (as read, after the id renaming)."""
+        multi_index = year < 2020
+        columns = [tuple(c) if isinstance(c, tuple) else c for c in columns]
+        dim = _dimension(columns)
+        columns = [_swap(c, dim, PLACEHOLDER) for c in columns]
+        reverse_map = {_swap(k, dim, PLACEHOLDER): v for k, v in applicable_rules(self.header_map, year).items()}
+
+        key = self.fingerprint(columns, multi_index, reverse_map)
+        if key in self.plans:
+            self.hits += 1
+            plan = self.plans[key]
+        else:
+            self.misses += 1
+            plan = resolve_columns(columns, multi_index, reverse_map, list(self.header_map.keys()), self.extra_drops)
+            plan = {"names": _encode(plan["names"]), "add": plan["add"], "order": _encode(plan["order"])}
+            self.plans[key] = plan
+            self.resolved[key] = plan
+            self._dirty = True
+
+        return {
+            "names": [_swap(n, PLACEHOLDER, dim) for n in _decode(plan["names"])],
+            "add": plan["add"],
+            "order": [_swap(n, PLACEHOLDER, dim) for n in _decode(plan["order"])],
+        }
+
+    def fork(self):
+        """
+        Copy of the cache for one file run on the executor: it starts with the
+        plans known so far, and what it learns goes back with merge(fork.changes()).
+        """
+        fork = copy.copy(self)
+        fork.plans = dict(self.plans)
+        fork.resolved = {}
+        fork.hits = fork.misses = 0
+        return fork
+
+    def changes(self):
+        """(resolved plans, hits, misses) of a fork."""
+        return self.resolved, self.hits, self.misses
+
+    def merge(self, changes):
+        resolved, hits, misses = changes
+        self.hits += hits
+        self.misses += misses
+        if resolved:
+            self.plans.update(resolved)
+            self.resolved.update(resolved)
+            self._dirty = True
+
+    def save(self):
+        """Writes the plans if new ones were resolved."""
+        if not self._dirty:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with atomic_path(self.path) as tmp_path:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"version": self.version, "plans": self.plans}, f, ensure_ascii=False, indent=1)
+        self._dirty = False
+
+
+def plan_positions(plan):
+    """Positions of the source columns a plan keeps."""
+    return [i for i, name in enumerate(plan["names"]) if name is not None]
+
+
+def apply_plan(df, plan):
+    """Renames, drops and adds columns of `df` according to a plan."""
+    keep = plan_positions(plan)
+    df = df.iloc[:, keep].set_axis([plan["names"][i] for i in keep], axis=1)
+    for header in plan["add"]:
+        df[header] = np.nan
+    return df
@@ -0,0 +1,176 @@
+import io
+import os
+import queue
+import asyncio
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from blob_store import deferred_writes, write_all
+from eacei_config import OVERLAP_ENV, WINDOW_ENV
+from executor import Outcome, call_task, get_executor, run_tasks
+from run_metrics import add_file
+
+# --- Overlapped I/O ---
+#
+# By default a stage reads a file, processes it and writes its outputs before
+# it opens the next one, so the disk waits for the CPU and the CPU for the
+# disk. With EACEI_OVERLAP_IO=1 (`eacei --overlap-io`), run_pipeline drives
+# the files through three overlapping phases on an asyncio loop:
+#   read     reader threads prefetch the input files' bytes
+#   compute  the stage's function runs on the bytes, on the executor's
+#            processes or threads (one thread with the serial executor); the
+#            outputs it writes through the blob store are held back
+#   write    one writer thread stores the outputs, in file order
+# At most EACEI_IO_WINDOW files (default: 2 per compute worker, at least 4)
+# are in flight at once, read, computed or waiting to be written: a slow
+# phase holds the others back instead of letting buffered files pile up in
+# memory. The outcomes come back in file order, as from run_tasks.
+#
+# The cluster executor keeps run_tasks: its workers already read and write
+# in parallel. The per-file profiles (profile_file) are not taken while
+# overlapping, as off the serial executor.
+
+MIN_WINDOW = 4
+POLL_INTERVAL = 0.2  # Seconds between the writer's checks for an abandoned run
+
+
+def overlap_enabled():
+    return os.environ.get(OVERLAP_ENV, "") not in ("", "0")
+
+
+def read_bytes(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def source(path, data):
+    """What pandas or NumPy should read: the prefetched bytes if any, else the path."""
+    return path if data is None else io.BytesIO(data)
+
+
+def open_text(path, data, encoding='utf-8'):
+    """A file opened as text (universal newlines), from the prefetched bytes if any."""
+    if data is None:
+        return open(path, 'r', encoding=encoding)
+    return io.TextIOWrapper(io.BytesIO(data), encoding=encoding)
+
+
+def _compute(func, data, task):
+    """Compute phase: (result, held-back writes) of func(data, *task)."""
+    with deferred_writes() as writes:
+        result = func(data, *task)
+    return result, list(writes)
+
+
+def _write(output):
+    result, writes = output
+    write_all(writes)
+    return result
+
+
+def _combined(phases):
+    """(wall, cpu, counts) of a file over its phases."""
+    counts = Counter()
+    for _, _, phase_counts in phases:
+        counts.update(phase_counts)
+    return sum(p[0] for p in phases), sum(p[1] for p in phases), dict(counts)
+
+
+def _deliver(outcomes, stop, item):
+    """Hands an item to the consumer, waiting while it is behind (outcomes is bounded)."""
+    while not stop.is_set():
+        try:
+            outcomes.put(item, timeout=POLL_INTERVAL)
+            return
+        except queue.Full:
+            continue
+
+
+async def _drive(func, tasks, paths, window, pool, remote, outcomes, stop):
+    loop = asyncio.get_running_loop()
+    slots = asyncio.Semaphore(window)
+    written = [asyncio.Event() for _ in tasks]
+
+    with ThreadPoolExecutor(window, thread_name_prefix="reader") as readers, \
+            ThreadPoolExecutor(1, thread_name_prefix="writer") as writer:
+
+        async def run(i, task):
+            try:
+                phases, output, result = [], None, None
+                data, error, metrics = await loop.run_in_executor(readers, call_task, read_bytes, (paths[i],))
+                phases.append(metrics)
+                if error is None:
+                    output, error, metrics = await loop.run_in_executor(
+                        pool, call_task, _compute, (func, data, task), remote)
+                    phases.append(metrics)
+                del data
+                if i:
+                    await written[i - 1].wait()
+                if error is None:
+                    result, error, metrics = await loop.run_in_executor(writer, call_task, _write, (output,))
+                    phases.append(metrics)
+                await loop.run_in_executor(writer, _deliver, outcomes, stop, (Outcome(task, result, error), _combined(phases)))
+            finally:
+                written[i].set()
+                slots.release()
+
+        jobs = []
+        for i, task in enumerate(tasks):
+            await slots.acquire()
+            if stop.is_set():
+                break
+            jobs.append(asyncio.create_task(run(i, task)))
+        await asyncio.gather(*jobs)
+
+
+def run_pipeline(func, tasks, path, initializer=None, initargs=()):
+    """
+    Runs func(data, *task) for each task and yields an Outcome(task, result,
+    error) for each, in task order, like run_tasks. With overlapped I/O on,
+    `data` is the prefetched bytes of path(task) (read it with source() or
+    open_text()) and the blob store writes are made by the writer; otherwise
+    it is None and the tasks simply go to run_tasks.
+    """
+    tasks = list(tasks)
+    if not overlap_enabled() or get_executor().kind == "cluster":
+        outcomes = run_tasks(func, [(None, *task) for task in tasks], path=lambda task: path(task[1:]),
+                             initializer=initializer, initargs=initargs)
+        for outcome in outcomes:
+            yield Outcome(outcome.task[1:], outcome.result, outcome.error)
+        return
+    if not tasks:
+        return
+
+    executor = get_executor()
+    workers = getattr(executor, "workers", 1)
+    if executor.kind == "processes":
+        pool, remote = ProcessPoolExecutor(workers, initializer=initializer, initargs=initargs), True
+    else:
+        pool, remote = ThreadPoolExecutor(workers, thread_name_prefix="compute"), False
+    window = int(os.environ.get(WINDOW_ENV) or max(MIN_WINDOW, 2 * workers))
+    outcomes = queue.Queue(maxsize=2)
+    stop = threading.Event()
+    failure = []
+
+    def drive():
+        try:
+            asyncio.run(_drive(func, tasks, [path(task) for task in tasks], window, pool, remote, outcomes, stop))
+        except BaseException as e:
+            failure.append(e)
+            _deliver(outcomes, stop, None)
+
+    driver = threading.Thread(target=drive, name="io_pipeline", daemon=True)
+    driver.start()
+    try:
+        for _ in tasks:
+            item = outcomes.get()
+            if item is None:
+                raise failure[0]
+            outcome, metrics = item
+            add_file(path(outcome.task), *metrics, failed=outcome.error is not None)
+            yield outcome
+    finally:
+        stop.set()
+        driver.join()
+        pool.shutdown()
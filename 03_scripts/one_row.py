@@ -1,6 +1,8 @@
 import re
 import os
 
+from eacei_config import project_dir
+
 def remove_newlines_in_quotes(file_path):
     # Read the entire file as raw text
     with open(file_path, 'r', encoding='utf-8') as f:
@@ -24,5 +26,6 @@ def remove_newlines_in_quotes(file_path):
     print(f"Cleaned file saved to: {new_path}")
 
 # Example usage:
-file_path = r"C:\Users\Henri\Documents\Data Science\Portfolio\SQL\Datasets\EACEI\01_data_raw\2021\irecoeacei21_xlsx\of_interest\removed_rows\2021_REG_T2.csv"
-remove_newlines_in_quotes(file_path)
+if __name__ == '__main__':
+    file_path = os.path.join(project_dir("raw"), "2021", "irecoeacei21_xlsx", "of_interest", "removed_rows", "2021_REG_T2.csv")
+    remove_newlines_in_quotes(file_path)
@@ -0,0 +1,221 @@
+import os
+import time
+import logging
+import logging.handlers
+import threading
+import multiprocessing
+import queue as queue_module
+
+from eacei_config import project_dir
+
+# --- Centralized Pipeline Logging ---
+#
+# The step_3 scripts log through 'DataCleaningLogger'. Instead of a
+# FileHandler per process, every process (the main one and any worker) only
+# holds a QueueHandler; the records go through a multiprocessing queue to one
+# writer process, the only one that opens the log file. It writes them in
+# batches (up to BATCH_SIZE records, or what arrived within FLUSH_INTERVAL
+# seconds) so lines of different workers never interleave.
+#
+# Every record is tagged with the run id, the worker (process name) and the
+# file being processed:
+#   2025-07-18 21:35:57,620 | INFO | <run> | MainProcess | 2010_NAF_T1.csv | <message>
+#
+# Each run starts a fresh 07_logs/<log_name>.log. The previous one is moved to
+# 07_logs/history/<log_name>.<run id>.log, keeping the last KEEP_RUNS.
+
+LOGGER_NAME = 'DataCleaningLogger'
+LOG_FORMAT = '%(asctime)s | %(levelname)s | %(run_id)s | %(worker)s | %(file)s | %(message)s'
+BATCH_SIZE = 500
+FLUSH_INTERVAL = 0.5
+KEEP_RUNS = 10
+
+# File currently processed by each thread of this process, set with set_log_file
+_current = threading.local()
+
+
+class RunTags(logging.Filter):
+    """Adds run_id, worker and file to the records, in the process that emits them."""
+
+    def __init__(self, run_id):
+        super().__init__()
+        self.run_id = run_id
+
+    def filter(self, record):
+        record.run_id = self.run_id
+        if not hasattr(record, "worker"):  # Else forwarded by a cluster worker, already tagged
+            record.worker = record.processName
+            record.file = getattr(_current, "file", "-")
+        return True
+
+
+def set_log_file(file_name):
+    """Tags the following records of this thread with `file_name`."""
+    _current.file = file_name
+
+
+def init_worker(log_queue, run_id, level=logging.INFO):
+    """
+    Routes 'DataCleaningLogger' to the writer's queue. Called by LogWriter for
+    the main process; use it as the initializer of worker pools.
+    """
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(level)
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
+    handler = logging.handlers.QueueHandler(log_queue)
+    handler.addFilter(RunTags(run_id))
+    logger.addHandler(handler)
+    logger.propagate = False
+    return logger
+
+
+# --- Cluster Workers ---
+#
+# A cluster worker (see executor.py) has no access to the writer's queue: it
+# keeps its records, tagged with its name and file, and sends them back with
+# each task's outcome; the coordinator hands them to its own logger.
+
+class _WorkerTags(logging.Filter):
+    def filter(self, record):
+        record.worker = record.processName
+        record.file = getattr(_current, "file", "-")
+        return True
+
+
+def init_cluster_worker(level=logging.INFO):
+    """Routes 'DataCleaningLogger' to a local buffer, read with take_records()."""
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(level)
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    handler = logging.handlers.QueueHandler(queue_module.SimpleQueue())
+    handler.addFilter(_WorkerTags())
+    logger.addHandler(handler)
+    logger.propagate = False
+    return handler.queue
+
+
+def take_records(buffer):
+    """The records buffered since the last call."""
+    records = []
+    while not buffer.empty():
+        records.append(buffer.get())
+    return records
+
+
+def forward_records(records):
+    """Emits a cluster worker's records through this process's logger."""
+    logger = logging.getLogger(LOGGER_NAME)
+    for record in records:
+        logger.handle(record)
+
+
+def _log_run_id(log_path):
+    """Run id tagged on the first line of a log, else its modification time."""
+    with open(log_path, 'r', encoding='utf-8') as f:
+        fields = f.readline().split(" | ")
+    if len(fields) >= 6:
+        return fields[2]
+    return time.strftime('%Y%m%d-%H%M%S', time.localtime(os.path.getmtime(log_path)))
+
+
+def rotate(log_path, keep=KEEP_RUNS):
+    """Moves the last run's log to history/, keeping the `keep` most recent."""
+    if not os.path.exists(log_path) or os.path.getsize(log_path) == 0:
+        return None
+    history_dir = os.path.join(os.path.dirname(log_path), 'history')
+    os.makedirs(history_dir, exist_ok=True)
+    name = os.path.splitext(os.path.basename(log_path))[0]
+    run_id = _log_run_id(log_path)
+    rotated = os.path.join(history_dir, f"{name}.{run_id}.log")
+    attempt = 1
+    while os.path.exists(rotated):  # A resumed run keeps its run id
+        attempt += 1
+        rotated = os.path.join(history_dir, f"{name}.{run_id}.{attempt}.log")
+    os.replace(log_path, rotated)
+
+    runs = sorted(f for f in os.listdir(history_dir) if f.startswith(name + '.'))
+    for old in runs[:max(len(runs) - keep, 0)]:
+        os.remove(os.path.join(history_dir, old))
+    return rotated
+
+
+def _write_batches(log_queue, log_path, batch_size, flush_interval):
+    """Writer process: drains the queue into the log file until it gets None."""
+    formatter = logging.Formatter(LOG_FORMAT)
+    with open(log_path, 'w', encoding='utf-8') as f:
+        running = True
+        while running:
+            try:
+                batch = [log_queue.get(timeout=flush_interval)]
+            except queue_module.Empty:
+                continue
+            while len(batch) < batch_size and batch[-1] is not None:
+                try:
+                    batch.append(log_queue.get_nowait())
+                except queue_module.Empty:
+                    break
+            if batch[-1] is None:
+                running = False
+                batch.pop()
+            if batch:
+                f.write("".join(formatter.format(record) + "\n" for record in batch))
+                f.flush()
+
+
+class LogWriter:
+    """
+    The writer process of one run (see module comment). Use as a context
+    manager around the batch loop:
+        with LogWriter("data_cleaning_T1", run_id) as log_writer:
+            pool = Pool(initializer=init_worker, initargs=log_writer.worker_args())
+            ...
+            pool.close()
+            pool.join()
+    Close and join the pool before the writer stops: terminate() (what
+    `with Pool()` does) can kill a worker while it holds the queue's lock,
+    and the end marker then never reaches the writer.
+    """
+
+    def __init__(self, log_name, run_id, log_dir=None, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.log_path = os.path.join(log_dir or project_dir("logs"), f"{log_name}.log")
+        self.run_id = run_id
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = None
+        self.process = None
+
+    def worker_args(self):
+        return (self.queue, self.run_id)
+
+    def start(self):
+        os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+        rotate(self.log_path)
+        self.queue = multiprocessing.Queue()
+        self.process = multiprocessing.Process(
+            target=_write_batches, name="LogWriter",
+            args=(self.queue, self.log_path, self.batch_size, self.flush_interval))
+        self.process.start()
+        init_worker(self.queue, self.run_id)
+        return self
+
+    def stop(self):
+        """Sends the end marker and waits until every record is written."""
+        logger = logging.getLogger(LOGGER_NAME)
+        for handler in list(logger.handlers):
+            if isinstance(handler, logging.handlers.QueueHandler) and handler.queue is self.queue:
+                logger.removeHandler(handler)
+        self.queue.put(None)
+        self.process.join()
+        self.queue.close()
+        self.queue.join_thread()
+        set_log_file("-")
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
@@ -1,6 +1,8 @@
 import os
 import shutil
 
+from eacei_config import project_dir
+
 # This script organizes loose CSV files into an "original" subfolder within each "of_interest" directory.
 
 def organize_loose_files(base_dir):
@@ -23,6 +25,7 @@ def organize_loose_files(base_dir):
                         shutil.move(file_path, destination)
                         print(f"Moved: {file_path} -> {destination}")
 
-# Set your base directory here
-base_data_path = r"C:\Users\Henri\Documents\Data Science\Portfolio\SQL\Datasets\EACEI\01_data_raw"
-organize_loose_files(base_data_path)
\ No newline at end of file
+# Run on the raw data folder
+if __name__ == '__main__':
+    base_data_path = project_dir("raw")
+    organize_loose_files(base_data_path)
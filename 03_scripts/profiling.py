@@ -0,0 +1,221 @@
+import os
+import io
+import json
+import time
+import functools
+import threading
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+from eacei_config import project_dir
+
+# --- Opt-in Profiling ---
+#
+# With EACEI_PROFILE=1 (or `eacei --profile`), every stage and every file the
+# stages process is profiled:
+#   - CPU: one cProfile per scope. A scope's profiler is paused while a nested
+#     scope runs, so each call is counted once and the stage totals add up.
+#   - memory: tracemalloc peak per scope, and the allocation sites still
+#     holding the most memory when each of the two outer stage levels ends
+#     (a snapshot takes seconds on a full fact build, so not per nested stage).
+# When the outermost scope ends, the run's artifacts are written to
+# 07_logs/profiles/<run id>/:
+#   - <stage>.prof: the stage's merged profile (pstats / snakeviz)
+#   - summary.txt:  stages, the slowest files and functions, allocation sites
+#   - summary.json: the same figures for scripts
+# Disabled, profile_stage and profile_file return a shared no-op context.
+
+PROFILE_ENV = "EACEI_PROFILE"
+PROFILE_FOLDER = "profiles"  # In the logs folder
+TOP_FILES = 15
+TOP_FUNCTIONS = 25
+TOP_ALLOCATIONS = 15
+
+_NO_PROFILE = nullcontext()
+_run = None
+
+
+def profiling_enabled():
+    return os.environ.get(PROFILE_ENV, "") not in ("", "0")
+
+
+def profile_stage(name):
+    """Context profiling one stage (a script's batch loop, a CLI subcommand)."""
+    if not profiling_enabled():
+        return _NO_PROFILE
+    return _scope("stage", name)
+
+
+def profiled(name):
+    """Decorator running a function inside profile_stage(name)."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with profile_stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def profile_file(name):
+    """Context profiling one file of the current stage (in the thread and process that run it)."""
+    if _run is None or _run.owner != (os.getpid(), threading.get_ident()):
+        return _NO_PROFILE
+    return _scope("file", name)
+
+
+class Scope:
+    def __init__(self, kind, name, parent):
+        import cProfile  # With pstats, only loaded when profiling is on
+        self.kind = kind
+        self.name = name
+        self.parent = parent
+        self.stage = name if kind == "stage" else parent.stage
+        self.children = []
+        self.profile = cProfile.Profile()
+        self.elapsed = 0.0
+        self.peak = 0
+        self._stats = None
+
+    def stats(self):
+        """Profile of the scope and everything nested in it (merged once, after the scope ended)."""
+        if self._stats is None:
+            import pstats
+            self._stats = pstats.Stats(self.profile)
+            for child in self.children:
+                self._stats.add(child.stats())
+        return self._stats
+
+
+class ProfileRun:
+    """The scopes of one profiled run and their artifacts."""
+
+    def __init__(self):
+        self.run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        self.owner = (os.getpid(), threading.get_ident())
+        self.stack = []
+        self.scopes = []
+        self.allocations = {}
+        self.started_tracing = not tracemalloc.is_tracing()
+        if self.started_tracing:
+            tracemalloc.start()
+
+    def sample_peak(self):
+        """Credits the peak since the last sample to every open scope."""
+        _, peak = tracemalloc.get_traced_memory()
+        for scope in self.stack:
+            scope.peak = max(scope.peak, peak)
+        tracemalloc.reset_peak()
+
+    def record_allocations(self, scope):
+        # Filtering the grouped statistics is much faster than filter_traces
+        stats = [stat for stat in tracemalloc.take_snapshot().statistics('lineno')
+                 if stat.traceback[0].filename not in (tracemalloc.__file__, __file__)]
+        self.allocations[scope.name] = [
+            {"site": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+             "bytes": stat.size, "blocks": stat.count}
+            for stat in stats[:TOP_ALLOCATIONS]
+        ]
+
+    # --- Artifacts ---
+
+    def write(self, out_dir=None):
+        out_dir = out_dir or os.path.join(project_dir("logs"), PROFILE_FOLDER, self.run_id)
+        os.makedirs(out_dir, exist_ok=True)
+        stages = [s for s in self.scopes if s.kind == "stage"]
+        for stage in stages:
+            stage.stats().dump_stats(os.path.join(out_dir, f"{stage.name}.prof"))
+
+        merged = self.scopes[0].stats()  # The outermost scope, which ends the run
+
+        summary = {
+            "run": self.run_id,
+            "stages": [{"stage": s.name, "seconds": s.elapsed, "peak_bytes": s.peak} for s in stages],
+            "files": sorted(
+                ({"stage": s.stage, "file": s.name, "seconds": s.elapsed, "peak_bytes": s.peak}
+                 for s in self.scopes if s.kind == "file"),
+                key=lambda f: f["seconds"], reverse=True),
+            "functions": top_functions(merged, TOP_FUNCTIONS),
+            "allocations": self.allocations,
+        }
+        with open(os.path.join(out_dir, "summary.json"), 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=1)
+        with open(os.path.join(out_dir, "summary.txt"), 'w', encoding='utf-8') as f:
+            f.write(format_summary(summary, merged))
+        print(f"Profile written to {out_dir}")
+        return out_dir
+
+
+@contextmanager
+def _scope(kind, name):
+    global _run
+    if _run is None:
+        _run = ProfileRun()
+    run = _run
+    parent = run.stack[-1] if run.stack else None
+    scope = Scope(kind, name, parent)
+    if parent is not None:
+        parent.profile.disable()
+        parent.children.append(scope)
+    run.sample_peak()
+    run.stack.append(scope)
+    run.scopes.append(scope)
+
+    start = time.perf_counter()
+    scope.profile.enable()
+    try:
+        yield scope
+    finally:
+        scope.profile.disable()
+        scope.elapsed = time.perf_counter() - start
+        run.sample_peak()
+        if kind == "stage" and len(run.stack) <= 2:
+            run.record_allocations(scope)
+        run.stack.pop()
+        if parent is not None:
+            parent.profile.enable()
+        else:
+            if run.started_tracing:
+                tracemalloc.stop()
+            _run = None
+            run.write()
+
+
+def top_functions(stats, limit):
+    """The functions with the most own time: [{function, calls, own_seconds, cumulative_seconds}]."""
+    rows = []
+    for (filename, lineno, func), (_, calls, tottime, cumtime, _) in stats.stats.items():
+        rows.append({
+            "function": f"{os.path.basename(filename)}:{lineno}({func})",
+            "calls": calls,
+            "own_seconds": tottime,
+            "cumulative_seconds": cumtime,
+        })
+    rows.sort(key=lambda r: r["own_seconds"], reverse=True)
+    return rows[:limit]
+
+
+def format_summary(summary, stats):
+    mb = 1024 * 1024
+    lines = [f"Profile of run {summary['run']}", "", "Stages (inclusive time):"]
+    for s in summary["stages"]:
+        lines.append(f"  {s['seconds']:9.3f}s  peak {s['peak_bytes'] / mb:8.1f} MB  {s['stage']}")
+
+    lines += ["", f"Slowest files (top {TOP_FILES}):"]
+    for f in summary["files"][:TOP_FILES]:
+        lines.append(f"  {f['seconds']:9.3f}s  peak {f['peak_bytes'] / mb:8.1f} MB  {f['stage']} / {f['file']}")
+
+    lines += ["", f"Functions by own time (top {TOP_FUNCTIONS}):"]
+    for r in summary["functions"]:
+        lines.append(f"  {r['own_seconds']:9.3f}s own  {r['cumulative_seconds']:9.3f}s cum  {r['calls']:>9} calls  {r['function']}")
+
+    for stage, sites in summary["allocations"].items():
+        lines += ["", f"Memory held at the end of {stage} (top {TOP_ALLOCATIONS} sites):"]
+        for a in sites:
+            lines.append(f"  {a['bytes'] / mb:8.2f} MB  {a['blocks']:>8} blocks  {a['site']}")
+
+    out = io.StringIO()
+    stats.stream = out
+    stats.sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+    lines += ["", "cProfile, by cumulative time:", out.getvalue()]
+    return "\n".join(lines) + "\n"
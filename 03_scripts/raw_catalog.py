@@ -0,0 +1,317 @@
+import os
+import re
+import csv
+import json
+import hashlib
+import zipfile
+
+from atomic_io import atomic_path
+from eacei_config import project_dir
+
+# --- Raw File Catalog ---
+#
+# A manifest of every CSV under 01_data_raw, stored in 01_data_raw/catalog.json.
+# Each entry records, for one file:
+#   - path:      path relative to 01_data_raw, with '/' separators
+#   - kind:      "source" (downloaded or converted table) or "stage" (of_interest/<stage>/)
+#   - stage:     "original", "step_1", "step_2" or "step_3" for stage files
+#   - package:   the download folder it belongs to (e.g. dd_irecoeacei10_excel)
+#   - year, category, table: (2010, "NAF", "T2"), None when not classified
+#   - archive, member: the zip in the zips folder and the file in it
+#   - source:    for stage files, the file it was copied or cleaned from
+#   - size, mtime_ns, sha1, encoding
+#   - header_depth: number of rows before the first data row
+#
+# A refresh only stats the files: an entry is recomputed when its size or mtime
+# changed, and its layout is only re-detected when the checksum changed too.
+# The pipeline stages then look files up through in-memory indexes instead of
+# walking the year folders and splitting file names.
+
+CATALOG_FILE = "catalog.json"
+CATALOG_VERSION = 1
+STAGES = ("original", "step_1", "step_2", "step_3")
+STAGE_NAME = re.compile(r'^(\d{4})_(NAF|REG|TEFF)_(T[1-4])\.csv$')
+DATA_MARKERS = {"s", "so", "ns", "nd", "-"}
+NUMBER = re.compile(r'^\s*[+-]?(\d+([.,]\d*)?|[.,]\d+)\s*$')
+DETECTION_ROWS = 30
+
+
+def classify_source(file_name):
+    """
+    (category, table) of a downloaded table from its file name, None when it is
+    not one of the NAF/REG/TEFF T1-T4 tables.
+    """
+    name = file_name.lower()
+    if not any(keyword in name for keyword in ['naf', 'reg', 'teff', 'taille', 'effectif', "secteur d'activité", 'régions']):
+        return None
+    if any(exclusion in name for exclusion in ['regio', 'region', 'tab5', 'ia']):
+        return None
+
+    category = None
+    if any(keyword in name for keyword in ['naf', 'secteur d\'activité']):
+        category = 'NAF'
+    elif any(keyword in name for keyword in ['reg', 'régions']):
+        category = 'REG'
+    elif any(keyword in name for keyword in ['teff', 'taille', 'effectif']):
+        category = 'TEFF'
+
+    table = None
+    for t in ['T1', 'T2', 'T3', 'T4', 'tab1', 'tab2', 'tab3', 'tab4']:
+        if t.lower() in name:
+            table = f"T{t[-1].upper()}"  # 'tabX' -> 'TX'
+            break
+
+    if category and table:
+        return category, table
+    return None
+
+
+def detect_encoding(data):
+    """'utf-8-sig', 'utf-8' or 'cp1252' for the raw bytes of a file."""
+    if data.startswith(b'\xef\xbb\xbf'):
+        return 'utf-8-sig'
+    try:
+        data.decode('utf-8')
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return 'cp1252'
+
+
+def detect_header_depth(lines):
+    """
+    Number of rows before the first data row: a row with a code in its first
+    cell and a number or suppression marker among its values.
+    """
+    for depth, row in enumerate(csv.reader(lines)):
+        if depth >= DETECTION_ROWS:
+            break
+        if row and row[0].strip() and any(
+                NUMBER.match(cell) or cell.strip() in DATA_MARKERS for cell in row[2:]):
+            return depth
+    return None
+
+
+def read_header(entry):
+    """`header` argument of pd.read_csv for a catalogued file."""
+    depth = entry["header_depth"] or 1
+    return list(range(depth)) if depth > 1 else 0
+
+
+def _checksum(data):
+    return hashlib.sha1(data).hexdigest()
+
+
+class RawCatalog:
+    """The catalog of one raw data folder (see module comment)."""
+
+    def __init__(self, raw_dir=None, zip_dir=None):
+        self.raw_dir = os.path.normpath(raw_dir or project_dir("raw"))
+        self.zip_dir = zip_dir or project_dir("zips")
+        self.path = os.path.join(self.raw_dir, CATALOG_FILE)
+        self.entries = {}
+        self._dirty = False
+        self._zip_members = {}
+
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    stored = json.load(f)
+            except ValueError:  # Unreadable: rebuilt by the next refresh
+                print(f"  - Warning: ignoring unreadable catalog {self.path}")
+                stored = {}
+            if stored.get("version") == CATALOG_VERSION:
+                self.entries = stored.get("entries", {})
+        self._build_indexes()
+
+    # --- Refresh ---
+
+    def refresh(self):
+        """
+        Brings the catalog up to date with the files on disk.
+        Returns (added, changed, removed) counts.
+        """
+        on_disk = {}
+        for root, dirs, files in os.walk(self.raw_dir):
+            dirs.sort()
+            for file in sorted(files):
+                if file.lower().endswith('.csv'):
+                    full_path = os.path.join(root, file)
+                    on_disk[os.path.relpath(full_path, self.raw_dir).replace(os.sep, '/')] = os.stat(full_path)
+
+        added = changed = 0
+        for rel_path, stat in on_disk.items():
+            entry = self.entries.get(rel_path)
+            if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+                continue
+            with open(os.path.join(self.raw_dir, rel_path), 'rb') as f:
+                data = f.read()
+            sha1 = _checksum(data)
+            if entry and entry["sha1"] == sha1:
+                entry["mtime_ns"] = stat.st_mtime_ns
+            else:
+                if entry:
+                    changed += 1
+                else:
+                    added += 1
+                self.entries[rel_path] = self._describe(rel_path, data, sha1, stat)
+            self._dirty = True
+
+        removed = [rel_path for rel_path in self.entries if rel_path not in on_disk]
+        for rel_path in removed:
+            del self.entries[rel_path]
+        if removed:
+            self._dirty = True
+
+        self._link_sources()
+        self._build_indexes()
+        return added, changed, len(removed)
+
+    def _describe(self, rel_path, data, sha1, stat):
+        """Entry of one file, without its source links."""
+        parts = rel_path.split('/')
+        encoding = detect_encoding(data)
+        lines = data.decode(encoding, errors='replace').splitlines()[:DETECTION_ROWS]
+        entry = {
+            "path": rel_path,
+            "kind": "source",
+            "stage": None,
+            "package": parts[1] if len(parts) > 2 else None,
+            "year": int(parts[0]) if parts[0].isdigit() else None,
+            "category": None,
+            "table": None,
+            "archive": None,
+            "member": None,
+            "source": None,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha1": sha1,
+            "encoding": encoding,
+            "header_depth": detect_header_depth(lines),
+        }
+
+        if len(parts) >= 4 and parts[-3] == "of_interest" and parts[-2] in STAGES:
+            entry["kind"] = "stage"
+            entry["stage"] = parts[-2]
+            match = STAGE_NAME.match(parts[-1])
+            if match:
+                entry["year"] = int(match.group(1))
+                entry["category"], entry["table"] = match.group(2), match.group(3)
+        elif "of_interest" not in parts:
+            classification = classify_source(parts[-1])
+            if classification:
+                entry["category"], entry["table"] = classification
+            entry["archive"], entry["member"] = self._origin(parts)
+        return entry
+
+    def _origin(self, parts):
+        """(archive, member) of a source file, None when the zip is not found."""
+        if len(parts) < 3:
+            return None, None
+        archive = f"{parts[1]}.zip"
+        members = self._members(archive, parts[:2])
+        if members is None:
+            return None, None
+
+        member = parts[-1]
+        if parts[-2] == "converted_csv_files":
+            # xls_to_csv names a sheet '{file[:-5]}_{sheet}.csv'
+            candidates = [name for name in members
+                          if name.lower().endswith(('.xls', '.xlsx')) and member.startswith(name[:-5] + '_')]
+            member = max(candidates, key=len) if candidates else None
+        elif member not in members:
+            member = None
+        return archive, member
+
+    def _members(self, archive, package_parts):
+        """
+        Base names of the files in a zip of the zips folder, None if absent.
+        Some downloads are 7z archives under a .zip name: their members are taken
+        from the extracted package folder instead.
+        """
+        if archive not in self._zip_members:
+            path = os.path.join(self.zip_dir, archive)
+            members = None
+            if os.path.exists(path):
+                try:
+                    with zipfile.ZipFile(path) as z:
+                        members = {os.path.basename(name) for name in z.namelist() if not name.endswith('/')}
+                except zipfile.BadZipFile:
+                    package_dir = os.path.join(self.raw_dir, *package_parts)
+                    members = set()
+                    for folder in (package_dir, os.path.join(package_dir, "original_excel_files")):
+                        if os.path.isdir(folder):
+                            members.update(f for f in os.listdir(folder) if os.path.isfile(os.path.join(folder, f)))
+            self._zip_members[archive] = members
+        return self._zip_members[archive]
+
+    def _link_sources(self):
+        """
+        Links each stage file to the file it comes from: the source with the same
+        checksum for 'original' copies, the same file of the previous stage after.
+        """
+        sources_by_sha1 = {}
+        for entry in self.entries.values():
+            if entry["kind"] == "source":
+                sources_by_sha1.setdefault((entry["year"], entry["sha1"]), entry)
+
+        for entry in self.entries.values():
+            if entry["kind"] != "stage":
+                continue
+            if entry["stage"] == "original":
+                origin = sources_by_sha1.get((entry["year"], entry["sha1"]))
+            else:
+                previous = STAGES[STAGES.index(entry["stage"]) - 1]
+                origin = self.entries.get(entry["path"].replace(f"/{entry['stage']}/", f"/{previous}/"))
+            link = (origin["path"], origin["archive"], origin["member"]) if origin else (None, None, None)
+            if (entry["source"], entry["archive"], entry["member"]) != link:
+                entry["source"], entry["archive"], entry["member"] = link
+                self._dirty = True
+
+    # --- Lookups ---
+
+    def _build_indexes(self):
+        self._by_key = {}
+        self._by_stage = {}
+        for rel_path in sorted(self.entries, key=lambda p: (self.entries[p]["year"] or 0, p)):
+            entry = self.entries[rel_path]
+            if entry["kind"] != "stage" or entry["table"] is None:
+                continue
+            self._by_key[(entry["stage"], entry["year"], entry["category"], entry["table"])] = entry
+            self._by_stage.setdefault(entry["stage"], []).append(entry)
+
+    def entry(self, file_path):
+        """Entry of a file under the raw folder, None if not catalogued."""
+        rel_path = os.path.relpath(file_path, self.raw_dir).replace(os.sep, '/')
+        return self.entries.get(rel_path)
+
+    def lookup(self, stage, year, category, table):
+        """Entry of one table at one stage, None if absent."""
+        return self._by_key.get((stage, year, category, table))
+
+    def tables(self, stage, table=None, category=None):
+        """Entries of a stage, by year, optionally filtered on table and category."""
+        return [entry for entry in self._by_stage.get(stage, [])
+                if (table is None or entry["table"] == table)
+                and (category is None or entry["category"] == category)]
+
+    def full_path(self, entry):
+        """Absolute path of an entry."""
+        return os.path.join(self.raw_dir, *entry["path"].split('/'))
+
+    def save(self):
+        """Writes the catalog if the refresh changed it."""
+        if not self._dirty:
+            return
+        with atomic_path(self.path) as tmp_path:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"version": CATALOG_VERSION, "entries": self.entries}, f, ensure_ascii=False, indent=1)
+        self._dirty = False
+
+
+def load_catalog(raw_dir=None):
+    """Loads, refreshes and saves the catalog of a raw data folder."""
+    catalog = RawCatalog(raw_dir)
+    added, changed, removed = catalog.refresh()
+    catalog.save()
+    print(f"Raw catalog: {len(catalog.entries)} files ({added} added, {changed} changed, {removed} removed)")
+    return catalog
@@ -1,3 +1,7 @@
+import os
+
+from eacei_config import project_dir
+
 def clean_csv(file_path):
     # Read the CSV file
     with open(file_path, 'r', encoding='utf-8') as file:
@@ -21,5 +25,6 @@ def clean_csv(file_path):
     print(f"Cleaned and saved: {output_file_path}")
 
 # Example usage
-file_path = r"C:\Users\Henri\Documents\Data Science\Portfolio\SQL\Datasets\EACEI\01_data_raw\2010\dd_irecoeacei10_excel\of_interest\2010_NAF_T4.csv"
-clean_csv(file_path)
+if __name__ == '__main__':
+    file_path = os.path.join(project_dir("raw"), "2010", "dd_irecoeacei10_excel", "of_interest", "2010_NAF_T4.csv")
+    clean_csv(file_path)
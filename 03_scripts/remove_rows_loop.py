@@ -1,5 +1,7 @@
 import os
 
+from eacei_config import project_dir
+
 def remove_rows(file_path, output_dir):
     # Read the CSV file
     with open(file_path, 'r', encoding='utf-8') as file:
@@ -46,6 +48,7 @@ def process_all_files(root_dir):
                         output_dir = os.path.join(root, "removed_rows")
                         remove_rows(file_path, output_dir)
 
-# Set the root folder (you can customize this)
-base_data_path = r"C:\Users\Henri\Documents\Data Science\Portfolio\SQL\Datasets\EACEI\01_data_raw"
-process_all_files(base_data_path)
+# Run on the raw data folder
+if __name__ == '__main__':
+    base_data_path = project_dir("raw")
+    process_all_files(base_data_path)
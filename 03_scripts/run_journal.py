@@ -0,0 +1,130 @@
+import os
+import json
+import time
+import traceback
+
+from atomic_io import atomic_write_bytes
+from eacei_config import project_dir
+
+# --- Run Journal ---
+#
+# Each batch stage (step_2_*, step_3_*, build_faits) records its progress in
+# 07_logs/journal/<stage>.jsonl, one JSON line per event, flushed to disk
+# before the next unit starts:
+#   {"event": "begin", "run": ...}
+#   {"event": "done", "unit": "2010/NAF/T2", "input": <sha1 of the input>}
+#   {"event": "failed", "unit": ..., "error": ...}
+#   {"event": "end", "run": ..., "units": ...}
+# A unit is one (year, category, table) file.
+#
+# A run without an "end" event was interrupted or had failures: the next run
+# resumes it and skips the units already done (with the same input checksum).
+# A failed unit is quarantined in 07_logs/journal/quarantine/<stage>/ with its
+# error and traceback while the rest of the batch proceeds; the run then stays
+# open so the next run retries only what is missing.
+
+JOURNAL_FOLDER = 'journal'  # In the logs folder
+
+
+def unit_key(unit):
+    """'2010/NAF/T2' for a unit (a catalog entry or a dict with year, category, table)."""
+    return f"{unit['year']}/{unit['category']}/{unit['table']}"
+
+
+class RunJournal:
+    """Write-ahead journal of one stage (see module comment)."""
+
+    def __init__(self, stage, journal_dir=None):
+        journal_dir = journal_dir or os.path.join(project_dir("logs"), JOURNAL_FOLDER)
+        self.stage = stage
+        self.path = os.path.join(journal_dir, f"{stage}.jsonl")
+        self.quarantine_dir = os.path.join(journal_dir, "quarantine", stage)
+        self.completed = {}
+        self.failures = {}
+        self.skipped = 0
+
+        run = None
+        for record in self._read():
+            if record["event"] == "begin":
+                run, self.completed = record["run"], {}
+            elif record["event"] == "done":
+                self.completed[record["unit"]] = record.get("input")
+            elif record["event"] == "end":
+                run, self.completed = None, {}
+
+        self.resumed = run is not None
+        if self.resumed:
+            self.run_id = run
+            print(f"Journal: resuming run {run} of {stage}, {len(self.completed)} units already done")
+        else:
+            self.run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            atomic_write_bytes(self.path, b"")
+            self._append({"event": "begin", "run": self.run_id})
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return []
+        records = []
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    break  # Torn last line of a crashed run
+        return records
+
+    def _append(self, record):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    # --- Units ---
+
+    def is_done(self, unit):
+        """True if the unit was completed in this run, from the same input."""
+        key = unit_key(unit)
+        return key in self.completed and self.completed[key] == unit.get("sha1")
+
+    def pending(self, units):
+        """The units still to process, in order."""
+        for unit in units:
+            if self.is_done(unit):
+                self.skipped += 1
+                continue
+            yield unit
+
+    def done(self, unit):
+        key = unit_key(unit)
+        self.completed[key] = unit.get("sha1")
+        self.failures.pop(key, None)
+        self._append({"event": "done", "unit": key, "input": unit.get("sha1")})
+
+    def failed(self, unit, error):
+        """Quarantines a unit with its error; the batch goes on."""
+        key = unit_key(unit)
+        self.failures[key] = repr(error)
+        report = {
+            "stage": self.stage,
+            "run": self.run_id,
+            "unit": key,
+            "path": unit.get("path"),
+            "error": repr(error),
+            "traceback": traceback.format_exception(type(error), error, error.__traceback__),
+        }
+        os.makedirs(self.quarantine_dir, exist_ok=True)
+        report_path = os.path.join(self.quarantine_dir, key.replace('/', '_') + ".json")
+        atomic_write_bytes(report_path, json.dumps(report, ensure_ascii=False, indent=1).encode('utf-8'))
+        self._append({"event": "failed", "unit": key, "error": repr(error)})
+        print(f"  - Error: {key} quarantined ({error}), see {report_path}")
+
+    def end(self):
+        """Closes the run unless units failed, which keeps it open for a retry."""
+        if self.skipped:
+            print(f"Journal: {self.skipped} units skipped (done in run {self.run_id})")
+        if self.failures:
+            print(f"Journal: {len(self.failures)} units quarantined, the next run of {self.stage} retries them")
+            return False
+        self._append({"event": "end", "run": self.run_id, "units": len(self.completed)})
+        return True
@@ -0,0 +1,274 @@
+import os
+import sys
+import time
+import functools
+import threading
+from contextlib import contextmanager, nullcontext
+
+from eacei_config import project_dir
+
+try:
+    import resource
+except ImportError:  # Windows: no peak RSS
+    resource = None
+
+# --- Run Metrics History ---
+#
+# Every run records, per stage and per file, how long it took and how much
+# data it moved into 07_logs/run_metrics.sqlite (one row per scope):
+#   wall_seconds, cpu_seconds   time.perf_counter / time.process_time
+#   peak_rss_bytes              the process's peak RSS so far when the scope
+#                               ends (the OS high-water mark cannot be reset)
+#   rows_in, rows_out           rows read and written
+#   cells_aggregated            cells folded into sums (duplicate columns/rows)
+#   suppression_events          suppression warnings logged
+#   bytes_read, bytes_written   input files, blob store and atomic writes
+# The stages open stage_metrics / file_metrics (or @metered) and the code
+# doing the work adds to the counters with count(); every open scope gets the
+# amounts, so a stage holds the totals of its files and nested stages.
+# Rows are saved when each stage ends. `eacei report` compares the last run
+# against the previous ones (report() below). EACEI_METRICS=0 turns it off.
+
+METRICS_ENV = "EACEI_METRICS"
+METRICS_FILE = "run_metrics.sqlite"  # In the logs folder
+COUNTERS = ("rows_in", "rows_out", "cells_aggregated", "suppression_events", "bytes_read", "bytes_written")
+BASELINE_RUNS = 5
+SLOWDOWN_THRESHOLD = 20.0  # Percent
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    started TEXT NOT NULL,
+    command TEXT
+);
+CREATE TABLE IF NOT EXISTS metrics (
+    run_id TEXT NOT NULL REFERENCES runs(run_id),
+    stage TEXT NOT NULL,
+    file TEXT,  -- NULL on the stage's own row
+    status TEXT NOT NULL,  -- 'ok' or 'failed'
+    wall_seconds REAL,
+    cpu_seconds REAL,
+    peak_rss_bytes INTEGER,
+    {", ".join(f"{name} INTEGER" for name in COUNTERS)}
+);
+CREATE INDEX IF NOT EXISTS metrics_stage ON metrics (stage, file);
+"""
+
+_NO_METRICS = nullcontext()
+_run = None
+_local = threading.local()  # counts of the task an executor worker runs (see executor.py)
+
+
+def metrics_enabled():
+    return os.environ.get(METRICS_ENV, "1") != "0"
+
+
+def metrics_path():
+    return os.path.join(project_dir("logs"), METRICS_FILE)
+
+
+def peak_rss():
+    """Peak resident set size of this process in bytes, None where unknown."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024  # kB on Linux
+
+
+def connect(db_path=None):
+    import sqlite3  # Only loaded when metrics are saved or reported
+    connection = sqlite3.connect(db_path or metrics_path())
+    connection.executescript(SCHEMA)
+    return connection
+
+
+class MetricsScope:
+    def __init__(self, stage, file=None):
+        self.stage = stage
+        self.file = file
+        self.counts = dict.fromkeys(COUNTERS, 0)
+        self.status = "ok"
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+
+    def row(self, run_id):
+        return (run_id, self.stage, self.file, self.status, self.wall, self.cpu, peak_rss(),
+                *(self.counts[name] for name in COUNTERS))
+
+    def end(self, failed):
+        self.status = "failed" if failed else "ok"
+        self.wall = time.perf_counter() - self.wall
+        self.cpu = time.process_time() - self.cpu
+
+
+class MetricsRun:
+    """The scopes of one run; rows wait in `pending` until their stage ends."""
+
+    def __init__(self):
+        self.run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        self.started = time.strftime('%Y-%m-%d %H:%M:%S')
+        self.stack = []
+        self.pending = []
+        self.saved = False
+
+    def save(self):
+        rows, self.pending = self.pending, []
+        placeholders = ", ".join("?" * (7 + len(COUNTERS)))
+        try:
+            os.makedirs(project_dir("logs"), exist_ok=True)
+            connection = connect()
+            with connection:
+                if not self.saved:
+                    connection.execute("INSERT INTO runs VALUES (?, ?, ?)",
+                                       (self.run_id, self.started, " ".join(sys.argv)))
+                connection.executemany(f"INSERT INTO metrics VALUES ({placeholders})", rows)
+            connection.close()
+            self.saved = True
+        except Exception as e:  # The history must never fail a pipeline run
+            print(f"  - Warning: run metrics not saved to {metrics_path()}: {e}")
+
+
+@contextmanager
+def _metrics_scope(stage, file=None, bytes_read=0):
+    global _run
+    if _run is None:
+        _run = MetricsRun()
+    run = _run
+    scope = MetricsScope(stage, file)
+    run.stack.append(scope)
+    count(bytes_read=bytes_read)
+    failed = True
+    try:
+        yield scope
+        failed = False
+    finally:
+        scope.end(failed)
+        run.stack.pop()
+        run.pending.append(scope.row(run.run_id))
+        if file is None:
+            run.save()
+        if not run.stack:
+            _run = None
+
+
+def stage_metrics(name):
+    """Context recording one stage (a script's batch loop, a CLI subcommand)."""
+    if not metrics_enabled():
+        return _NO_METRICS
+    return _metrics_scope(name)
+
+
+def metered(name):
+    """Decorator running a function inside stage_metrics(name)."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage_metrics(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def file_metrics(path):
+    """Context recording one input file of the current stage; counts its size as bytes_read."""
+    if _run is None or not _run.stack or getattr(_local, "counts", None) is not None:
+        return _NO_METRICS
+    size = os.path.getsize(path) if os.path.exists(path) else 0
+    return _metrics_scope(_run.stack[-1].stage, os.path.basename(path), size)
+
+
+def count(**amounts):
+    """Adds to the counters (COUNTERS) of every open scope."""
+    captured = getattr(_local, "counts", None)
+    if captured is not None:
+        for name, amount in amounts.items():
+            captured[name] += int(amount)
+        return
+    if _run is None:
+        return
+    for scope in _run.stack:
+        for name, amount in amounts.items():
+            scope.counts[name] += int(amount)
+
+
+@contextmanager
+def captured_counts():
+    """Collects this thread's count() calls in the yielded dict instead of the open scopes."""
+    _local.counts = dict.fromkeys(COUNTERS, 0)
+    try:
+        yield _local.counts
+    finally:
+        _local.counts = None
+
+
+def add_file(path, wall, cpu, counts, failed=False):
+    """
+    Records a file an executor worker processed (with captured_counts) as a
+    file of the current stage, as file_metrics would have.
+    """
+    if _run is None or not _run.stack:
+        return
+    scope = MetricsScope(_run.stack[-1].stage, os.path.basename(path))
+    size = os.path.getsize(path) if os.path.exists(path) else 0
+    scope.counts.update(counts, bytes_read=counts.get("bytes_read", 0) + size)
+    scope.status = "failed" if failed else "ok"
+    scope.wall, scope.cpu = wall, cpu
+    _run.pending.append(scope.row(_run.run_id))
+    count(**dict(counts, bytes_read=scope.counts["bytes_read"]))
+
+
+# --- Report ---
+
+def report(db_path=None, baseline_runs=BASELINE_RUNS, threshold=SLOWDOWN_THRESHOLD):
+    """
+    Compares the wall time of each stage of the last run with its median over
+    the `baseline_runs` previous runs where it succeeded. Prints the comparison
+    and returns the stages more than `threshold` percent slower, as
+    [{stage, seconds, baseline_seconds, change_pct}].
+    """
+    import statistics
+    db_path = db_path or metrics_path()
+    if not os.path.exists(db_path):
+        print(f"No run metrics recorded yet in {db_path}")
+        return []
+    connection = connect(db_path)
+    runs = connection.execute("SELECT run_id, started FROM runs ORDER BY started, rowid").fetchall()
+    stage_rows = connection.execute(
+        "SELECT run_id, stage, status, wall_seconds, rows_in FROM metrics WHERE file IS NULL ORDER BY rowid").fetchall()
+    connection.close()
+    if not runs:
+        print(f"No run metrics recorded yet in {db_path}")
+        return []
+
+    latest, started = runs[-1]
+    position = {run_id: i for i, (run_id, _) in enumerate(runs)}
+    history = {}  # stage -> [(seconds, rows_in)] of the earlier successful runs, oldest first
+    for run_id, stage, status, seconds, rows_in in stage_rows:
+        if run_id != latest and status == "ok":
+            history.setdefault(stage, []).append((position[run_id], seconds, rows_in))
+
+    print(f"Run {latest} ({started}) against the median of up to {baseline_runs} previous runs:")
+    print(f"  {'stage':<24} {'seconds':>9} {'baseline':>9} {'change':>8} {'rows in':>9} {'baseline':>9}")
+    regressions = []
+    for run_id, stage, status, seconds, rows_in in stage_rows:
+        if run_id != latest:
+            continue
+        if status != "ok":
+            print(f"  {stage:<24} {seconds:9.3f}  failed")
+            continue
+        previous = [(s, r) for _, s, r in sorted(history.get(stage, []))][-baseline_runs:]
+        if not previous:
+            print(f"  {stage:<24} {seconds:9.3f}  no baseline yet")
+            continue
+        baseline = statistics.median(s for s, _ in previous)
+        baseline_rows = statistics.median(r for _, r in previous)
+        change = (seconds / baseline - 1) * 100 if baseline else 0.0
+        slower = change > threshold
+        print(f"  {stage:<24} {seconds:9.3f} {baseline:9.3f} {change:+7.1f}% {rows_in:>9} {baseline_rows:>9g}"
+              + ("  SLOWER" if slower else ""))
+        if slower:
+            regressions.append({"stage": stage, "seconds": seconds,
+                                "baseline_seconds": baseline, "change_pct": change})
+
+    print(f"{len(regressions)} stages more than {threshold:g}% slower than their baseline")
+    return regressions
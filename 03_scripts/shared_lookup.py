@@ -0,0 +1,138 @@
+import numpy as np
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+
+# --- Shared Lookup Tables ---
+#
+# The dictionaries' lookups (indicator label -> ind_id, NAF/REG/TEFF code ->
+# id) are compiled into LookupTables: the keys sorted in a fixed-width text
+# array, the ids in a parallel array. A whole column of codes is resolved with
+# one np.searchsorted instead of a dict lookup per cell.
+#
+# For process pools, publish_lookups copies the tables once into a single
+# shared-memory block. Workers attach it with init_worker (the pool
+# initializer) and get LookupTables that are views of the block, so each
+# worker neither parses the dictionaries again nor holds its own copy:
+#     with publish_lookups(tables) as handle:
+#         pool = Pool(initializer=init_worker, initargs=(handle,))
+#         ...  # in the tasks: lookups()["NAF"].resolve(codes)
+# The publisher owns the block and removes it when its with block ends, so
+# the pool must be done by then.
+
+ALIGNMENT = 8  # Byte alignment of each array in the block
+
+# Block and tables attached by this worker, set by init_worker
+_attached = None
+
+
+class LookupTable:
+    """Read-only key -> id table over sorted keys and their ids (see module comment)."""
+
+    def __init__(self, keys, ids):
+        self.keys = keys
+        self.ids = ids
+
+    @classmethod
+    def from_dict(cls, mapping):
+        """Compiles a {str: id} dict."""
+        keys = np.array(list(mapping), dtype=str)
+        order = np.argsort(keys, kind='stable')
+        return cls(keys[order], np.asarray(list(mapping.values()))[order])
+
+    def __len__(self):
+        return len(self.keys)
+
+    def resolve(self, queries):
+        """
+        (ids, found) of a sequence of keys, found being False (and the id 0)
+        for unknown keys and for anything but a string (NaN, None).
+        """
+        queries = list(queries)
+        valid = np.array([isinstance(q, str) for q in queries], dtype=bool)
+        if not len(self.keys):
+            return np.zeros(len(queries), dtype=self.ids.dtype), np.zeros(len(queries), dtype=bool)
+        text = np.array([q if ok else "" for q, ok in zip(queries, valid)], dtype=str)
+        pos = np.minimum(np.searchsorted(self.keys, text), len(self.keys) - 1)
+        found = valid & (self.keys[pos] == text)
+        return np.where(found, self.ids[pos], 0), found
+
+    def get(self, key, default=None):
+        ids, found = self.resolve([key])
+        return ids[0].item() if found[0] else default
+
+
+# --- Shared Memory ---
+
+def _aligned(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def _layout(tables):
+    """Block size and {name: (keys dtype, ids dtype, length, keys offset, ids offset)}."""
+    offset, layout = 0, {}
+    for name, table in tables.items():
+        keys_at = offset
+        ids_at = _aligned(keys_at + table.keys.nbytes)
+        offset = _aligned(ids_at + table.ids.nbytes)
+        layout[name] = (table.keys.dtype.str, table.ids.dtype.str, len(table), keys_at, ids_at)
+    return max(offset, 1), layout
+
+
+def _views(buffer, spec):
+    keys_dtype, ids_dtype, length, keys_at, ids_at = spec
+    keys = np.ndarray((length,), dtype=keys_dtype, buffer=buffer, offset=keys_at)
+    ids = np.ndarray((length,), dtype=ids_dtype, buffer=buffer, offset=ids_at)
+    return keys, ids
+
+
+def _copy_into(buffer, layout, tables):
+    for name, table in tables.items():
+        keys, ids = _views(buffer, layout[name])
+        keys[:] = table.keys
+        ids[:] = table.ids
+
+
+@contextmanager
+def publish_lookups(tables):
+    """
+    Copies {name: LookupTable} into one shared-memory block. Yields the
+    handle workers attach it with (init_worker or attach_lookups); the block
+    is removed when the with block ends.
+    """
+    size, layout = _layout(tables)
+    block = shared_memory.SharedMemory(create=True, size=size)
+    try:
+        _copy_into(block.buf, layout, tables)
+        yield (block.name, layout)
+    finally:
+        block.close()
+        block.unlink()
+
+
+def attach_lookups(handle):
+    """
+    (block, {name: LookupTable}) of a published handle; the tables are
+    read-only views of the block, which must stay referenced while they are used.
+    """
+    name, layout = handle
+    block = shared_memory.SharedMemory(name=name)
+    tables = {}
+    for table, spec in layout.items():
+        keys, ids = _views(block.buf, spec)
+        keys.flags.writeable = False
+        ids.flags.writeable = False
+        tables[table] = LookupTable(keys, ids)
+    return block, tables
+
+
+def init_worker(handle):
+    """Pool initializer: attaches the lookups published under `handle`."""
+    global _attached
+    _attached = attach_lookups(handle)
+
+
+def lookups():
+    """The {name: LookupTable} this worker attached in init_worker."""
+    if _attached is None:
+        raise RuntimeError("No shared lookups attached: pass init_worker as the pool initializer")
+    return _attached[1]
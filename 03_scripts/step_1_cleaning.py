@@ -1,9 +1,17 @@
 import os
 import re
 
-def clean_file(file_path, output_dir):
-    # Step 1: Read the entire file as text
-    with open(file_path, 'r', encoding='utf-8') as f:
+from eacei_config import project_dir
+from io_pipeline import run_pipeline, open_text
+from blob_store import BlobStore
+from profiling import profiled, profile_file
+from run_metrics import metered, file_metrics, count
+
+BLOB_STORE = BlobStore()
+
+def clean_file(file_path, output_dir, data=None):
+    # Step 1: Read the entire file as text (`data`: its bytes, when prefetched)
+    with open_text(file_path, data) as f:
         content = f.read()
 
     # Step 2: Remove newlines within quoted strings
@@ -31,12 +39,21 @@ def clean_file(file_path, output_dir):
 
     # Step 6: Write cleaned content
     output_path = os.path.join(output_dir, os.path.basename(file_path))
-    with open(output_path, 'w', encoding='utf-8') as out_file:
-        out_file.writelines(cleaned_lines)
+    count(rows_in=len(lines), rows_out=len(cleaned_lines))
+    # Through the blob store, with the newline translation of a text-mode write
+    BLOB_STORE.write_bytes(output_path, "".join(cleaned_lines).replace('\n', os.linesep).encode('utf-8'))
 
     print(f"Cleaned and saved: {output_path}")
 
+def clean_task(data, file, file_path, output_dir):
+    """One file of the batch, as run by the executor (see io_pipeline.run_pipeline)."""
+    with profile_file(file), file_metrics(file_path):
+        clean_file(file_path, output_dir, data)
+
+@profiled("step_1")
+@metered("step_1")
 def process_all_files(base_dir):
+    tasks = []
     for year in range(2010, 2024):
         year_path = os.path.join(base_dir, str(year))
         if not os.path.isdir(year_path):
@@ -54,8 +71,14 @@ def process_all_files(base_dir):
                         # Create or use "step_1" folder at the same level as "original"
                         output_dir = os.path.join(of_interest_dir, "step_1")
 
-                        clean_file(file_path, output_dir)
+                        tasks.append((file, file_path, output_dir))
+
+    # On the executor of the run, I/O overlapped if set (see executor.py, io_pipeline.py)
+    for outcome in run_pipeline(clean_task, tasks, path=lambda task: task[1]):
+        if outcome.error is not None:
+            raise outcome.error
 
-# Set your root path here:
-base_data_path = r"C:\Users\Henri\Documents\Data Science\Portfolio\SQL\Datasets\EACEI\01_data_raw"
-process_all_files(base_data_path)
+# Run batch cleaning loop
+if __name__ == '__main__':
+    base_data_path = project_dir("raw")
+    process_all_files(base_data_path)
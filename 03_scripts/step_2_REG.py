@@ -1,49 +1,34 @@
 import os
 import csv
+import io
 import re
 
-def clean_reg_row_content(file_path):
+from category_normalizer import load_normalizer
+from eacei_config import project_dir
+from io_pipeline import run_pipeline, open_text
+from raw_catalog import load_catalog
+from run_journal import RunJournal
+from profiling import profiled, profile_file
+from run_metrics import metered, file_metrics, count
+from blob_store import BlobStore
+
+# step_2 outputs are stored once and linked in place (see blob_store.py)
+BLOB_STORE = BlobStore()
+
+def clean_reg_row_content(file_path, entry, data=None):
     print(f"--- Starting region cleaning for: {os.path.basename(file_path)} ---")
 
-    # Header keywords to identify (but not remove!)
-    header_keywords = [
-        "Type d’énergie", "Type d'énergie", "ENERGIES", "Indicateur", "Indicateurs",
-        "INDICATEUR", "Répartition", "Autoproduction", "Achats"
-    ]
-
-    region_map = {
-        "Alsace": "Grand Est", "Aquitaine": "Nouvelle-Aquitaine", "Auvergne": "Auvergne-Rhône-Alpes",
-        "Basse-Normandie": "Normandie", "Bourgogne": "Bourgogne-Franche-Comté", "Bretagne": "Bretagne",
-        "Centre": "Centre-Val de Loire", "Champagne-Ardenne": "Grand Est", "Corse": "_remove row_",
-        "Franche-Comté": "Bourgogne-Franche-Comté", "Haute-Normandie": "Normandie",
-        "Île-de-France": "Ile-de-France", "Languedoc-Roussillon": "Occitanie", "Limousin": "Nouvelle-Aquitaine",
-        "Lorraine": "Grand Est", "Midi-Pyrénées": "Occitanie", "Nord-Pas-de-Calais": "Hauts-de-France",
-        "Pays de la Loire": "Pays de la Loire", "Picardie": "Hauts-de-France",
-        "Poitou-Charentes": "Nouvelle-Aquitaine", "PACA et Corse": "Provence-Alpes-Côte d'Azur",
-        "Provence-Alpes-Côte d'Azur et Corse": "Provence-Alpes-Côte d'Azur",
-        "Provence-Alpes-Côte d'Azur": "Provence-Alpes-Côte d'Azur", "Rhône-Alpes": "Auvergne-Rhône-Alpes",
-        "Départements d'Outre-mer": "Départements d’Outre-mer", "DOM": "Départements d’Outre-mer", "Dom": "Départements d’Outre-mer",
-        "Toutes Régions": "France", "Toutes régions": "France", "France entière": "France"
-    }
-
-    region_codes = {
-        "Ile-de-France": "IDF", "Centre-Val de Loire": "CVL", "Bourgogne-Franche-Comté": "BFC",
-        "Normandie": "NOR", "Hauts-de-France": "HDF", "Grand Est": "GRE", "Pays de la Loire": "PAL",
-        "Bretagne": "BRE", "Nouvelle-Aquitaine": "NOA", "Occitanie": "OCC", "Auvergne-Rhône-Alpes": "ARA",
-        "Provence-Alpes-Côte d'Azur": "PAC", "France": "FRA", "Toutes régions": "FRA", "Toutes Régions": "FRA",
-        "Départements d’Outre-mer": "DOM"
-    }
-
-    
-    found_dom = False
+    normalizer = load_normalizer("REG")
+    header_keywords = normalizer.header_keywords
 
     # --- Read the file using the csv module ---
     # --- Differentiate between pre-2020 and post-2020 files ---
 
-    with open(file_path, 'r', encoding='utf-8') as f:
+    with open_text(file_path, data) as f:  # `data`: the file's bytes, when prefetched
         reader = csv.reader(f)
-        year = os.path.basename(file_path).split('_')[0]
-        t_cat = os.path.basename(file_path).split('_')[2]
+        # Year and table come from the raw catalog; the year is compared as text below
+        year = str(entry["year"])
+        t_cat = entry["table"]
         if year >= '2020':
             print(f"  - Detected post-2020 file or T4/T1 category: {year} {t_cat}")
             try :
@@ -54,7 +39,7 @@ def clean_reg_row_content(file_path):
                 print("  - Warning: File appears to be empty or has no header.")
 
         elif year < '2020':
-            if t_cat != 'T4.csv' and t_cat != 'T1.csv':
+            if t_cat not in ('T4', 'T1'):
                 print(f"  - Detected pre-2020 file and T2/T3 category: {year} {t_cat}")
                 try:
                     header_lines = [next(reader), next(reader)]
@@ -143,35 +128,12 @@ def clean_reg_row_content(file_path):
                     
         processed_headers.append(header)
 
-    # --- Process each data row ---
-    cleaned_rows = []
-
-    for row in data_rows:
-        if not row:
-            continue
-
-        first_cell = row[0].strip()
-
-        # ✅ Preserve header rows as-is
-        if any(first_cell.startswith(h) for h in header_keywords):
-            cleaned_rows.append(row)
-            continue
-
-        region_name = first_cell
-        original_region = region_name
-
-        # Normalize
-        region_name = region_map.get(region_name, region_name)
-        if region_name == "_remove row_":
-            print(f"  - Skipping row for region: {original_region}")
-            continue
-
-        if region_name == "Départements d’Outre-mer" or region_name == "Départements d'Outre-mer":
-            found_dom = True
-
-        region_code = region_codes.get(region_name, "")
-        new_row = [region_code, region_name] + row[1:]
-        cleaned_rows.append(new_row)
+    # --- Normalize each data row ---
+    # Header rows repeated in the data are kept as-is, old region names are
+    # mapped to the current ones and their code, 'Corse' is dropped
+    # (see category_normalization.json)
+    cleaned_rows = normalizer.normalize_rows(data_rows)
+    found_dom = any(row[0] == "DOM" for row in cleaned_rows)
 
     # Add missing DOM row if needed
     if not found_dom:
@@ -186,35 +148,38 @@ def clean_reg_row_content(file_path):
     base_name = os.path.basename(file_path).replace('.csv', '')
     output_path = os.path.join(output_dir, f"{base_name}.csv")
 
-    try:
-        with open(output_path, 'w', encoding='utf-8-sig', newline='') as f_out:
-            writer = csv.writer(f_out)
-            writer.writerows(processed_headers)
-            writer.writerows(cleaned_rows)
-        print(f"\nSuccess! Row-content-cleaned file saved to:\n{output_path}")
-    except Exception as e:
-        print(f"\nError saving the new file: {e}")
+    buffer = io.StringIO(newline='')
+    writer = csv.writer(buffer)
+    writer.writerows(processed_headers)
+    writer.writerows(cleaned_rows)
+    count(rows_in=len(data_rows), rows_out=len(cleaned_rows))
+    BLOB_STORE.write_bytes(output_path, buffer.getvalue().encode('utf-8-sig'))
+    print(f"\nSuccess! Row-content-cleaned file saved to:\n{output_path}")
+
 
+def clean_task(data, file_path, entry):
+    """One file of the batch, as run by the executor (see io_pipeline.run_pipeline)."""
+    print(f"\n>>> Processing: {file_path}")
+    with profile_file(os.path.basename(file_path)), file_metrics(file_path):
+        clean_reg_row_content(file_path, entry, data)
 
+@profiled("step_2_REG")
+@metered("step_2_REG")
 def process_all_files(base_dir):
-    for year in range(2010, 2024):
-        year_path = os.path.join(base_dir, str(year))
-        if not os.path.isdir(year_path):
+    catalog = load_catalog(base_dir)
+    journal = RunJournal("step_2_REG")
+    tasks = [(catalog.full_path(entry), entry)
+             for entry in journal.pending(catalog.tables("step_1", category="REG"))]
+    for outcome in run_pipeline(clean_task, tasks, path=lambda task: task[0]):
+        _, entry = outcome.task
+        if outcome.error is not None:
+            journal.failed(entry, outcome.error)
             continue
+        journal.done(entry)
 
-        for root, dirs, files in os.walk(year_path):
-            if os.path.basename(root) == "step_1":
-                for file in files:
-                    if file.endswith(".csv") and "REG" in file:
-                        file_path = os.path.join(root, file)
-
-                        print(f"\n>>> Processing: {file_path}")
-                        try:
-                            clean_reg_row_content(file_path)
-                        except Exception as e:
-                            print(f"  - Error while processing {file_path}: {e}")
+    journal.end()
 
 # Run batch cleaning loop
 if __name__ == '__main__':
-    base_data_path = r"C:\Users\Henri\Documents\Data Science\Portfolio\SQL\Datasets\EACEI\01_data_raw"
+    base_data_path = project_dir("raw")
     process_all_files(base_data_path)
@@ -1,45 +1,34 @@
 import os
 import csv
+import io
 import re
 
-def clean_teff_row_content(file_path):
+from category_normalizer import load_normalizer
+from eacei_config import project_dir
+from io_pipeline import run_pipeline, open_text
+from raw_catalog import load_catalog
+from run_journal import RunJournal
+from profiling import profiled, profile_file
+from run_metrics import metered, file_metrics, count
+from blob_store import BlobStore
+
+# step_2 outputs are stored once and linked in place (see blob_store.py)
+BLOB_STORE = BlobStore()
+
+def clean_teff_row_content(file_path, entry, data=None):
     print(f"--- Starting TEFF cleaning for: {os.path.basename(file_path)} ---")
 
-    # Header keywords to identify (but not remove!)
-    header_keywords = [
-        "Type d’énergie", "Type d'énergie", "ENERGIES", "Indicateur",
-        "INDICATEUR", 'Répartition', 'Autoproduction',
-        'Achats'
-    ]
-
-    teff_map = {
-        "20 à 49 employés": "20 à 49 salariés",
-        "50 à 99 employés": "50 à 99 salariés",
-        "100 à 249 employés": "100 à 249 salariés",
-        "250 à 499 employés": "250 à 499 salariés",
-        "500 à 999 employés": "500 salariés et plus",
-        "1 000 à 1 999 employés": "500 salariés et plus",
-        "2 000 employés ou plus": "500 salariés et plus",
-        "500 salariés ou plus": "500 salariés et plus",
-        "Total industrie": "Total"
-        }
-
-    teff_codes = {
-        "20 à 49 salariés": "20-49",
-        "50 à 99 salariés": "50-99",
-        "100 à 249 salariés": "100-249",
-        "250 à 499 salariés": "250-499",
-        "500 salariés et plus": "500+",
-        "Total": "_T"
-    }
+    normalizer = load_normalizer("TEFF")
+    header_keywords = normalizer.header_keywords
 
     # --- Read the file using the csv module ---
     # --- Differentiate between pre-2020 and post-2020 files ---
    
-    with open(file_path, 'r', encoding='utf-8') as f:
+    with open_text(file_path, data) as f:  # `data`: the file's bytes, when prefetched
         reader = csv.reader(f)
-        year = os.path.basename(file_path).split('_')[0]
-        t_cat = os.path.basename(file_path).split('_')[2]
+        # Year and table come from the raw catalog; the year is compared as text below
+        year = str(entry["year"])
+        t_cat = entry["table"]
         if year >= '2020':
             print(f"  - Detected post-2020 file or T4/T1 category: {year} {t_cat}")
             try :
@@ -50,7 +39,7 @@ def clean_teff_row_content(file_path):
                 print("  - Warning: File appears to be empty or has no header.")
 
         elif year < '2020':
-            if t_cat != 'T4.csv' and t_cat != 'T1.csv':
+            if t_cat not in ('T4', 'T1'):
                 print(f"  - Detected pre-2020 file and T2/T3 category: {year} {t_cat}")
                 try:
                     header_lines = [next(reader), next(reader)]
@@ -139,35 +128,10 @@ def clean_teff_row_content(file_path):
                     
         processed_headers.append(header)
 
-    # --- Process each data row ---
-    cleaned_rows = []
-
-    for row in data_rows:
-        if not row:
-            continue
-
-        first_cell = row[0].strip()
-
-        # ✅ Preserve header rows as-is
-        if any(first_cell.startswith(h) for h in header_keywords):
-            cleaned_rows.append(row)
-            continue
-
-        teff_name = first_cell
-        original_teff = teff_name
-
-        # Normalize
-        teff_name = teff_map.get(teff_name, teff_name)
-        if teff_name == "_remove row_":
-            print(f"  - Skipping row for teff: {original_teff}")
-            continue
-
-        if teff_name == "Départements d’Outre-mer" or teff_name == "Départements d'Outre-mer":
-            found_dom = True
-
-        teff_code = teff_codes.get(teff_name, "")
-        new_row = [teff_code, teff_name] + row[1:]
-        cleaned_rows.append(new_row)
+    # --- Normalize each data row ---
+    # Header rows repeated in the data are kept as-is, old size bands are
+    # mapped to the current ones and their code (see category_normalization.json)
+    cleaned_rows = normalizer.normalize_rows(data_rows)
 
     # Save to a sibling 'step_2' directory alongside the current file's folder
     output_dir = os.path.join(os.path.dirname(os.path.dirname(file_path)), "step_2")
@@ -175,35 +139,38 @@ def clean_teff_row_content(file_path):
     base_name = os.path.basename(file_path).replace('.csv', '')
     output_path = os.path.join(output_dir, f"{base_name}.csv")
 
-    try:
-        with open(output_path, 'w', encoding='utf-8-sig', newline='') as f_out:
-            writer = csv.writer(f_out)
-            writer.writerows(processed_headers)
-            writer.writerows(cleaned_rows)
-        print(f"\nSuccess! Row-content-cleaned file saved to:\n{output_path}")
-    except Exception as e:
-        print(f"\nError saving the new file: {e}")
+    buffer = io.StringIO(newline='')
+    writer = csv.writer(buffer)
+    writer.writerows(processed_headers)
+    writer.writerows(cleaned_rows)
+    count(rows_in=len(data_rows), rows_out=len(cleaned_rows))
+    BLOB_STORE.write_bytes(output_path, buffer.getvalue().encode('utf-8-sig'))
+    print(f"\nSuccess! Row-content-cleaned file saved to:\n{output_path}")
+
 
+def clean_task(data, file_path, entry):
+    """One file of the batch, as run by the executor (see io_pipeline.run_pipeline)."""
+    print(f"\n>>> Processing: {file_path}")
+    with profile_file(os.path.basename(file_path)), file_metrics(file_path):
+        clean_teff_row_content(file_path, entry, data)
 
+@profiled("step_2_TEFF")
+@metered("step_2_TEFF")
 def process_all_files(base_dir):
-    for year in range(2010, 2024):
-        year_path = os.path.join(base_dir, str(year))
-        if not os.path.isdir(year_path):
+    catalog = load_catalog(base_dir)
+    journal = RunJournal("step_2_TEFF")
+    tasks = [(catalog.full_path(entry), entry)
+             for entry in journal.pending(catalog.tables("step_1", category="TEFF"))]
+    for outcome in run_pipeline(clean_task, tasks, path=lambda task: task[0]):
+        _, entry = outcome.task
+        if outcome.error is not None:
+            journal.failed(entry, outcome.error)
             continue
+        journal.done(entry)
 
-        for root, dirs, files in os.walk(year_path):
-            if os.path.basename(root) == "step_1":
-                for file in files:
-                    if file.endswith(".csv") and "TEFF" in file:
-                        file_path = os.path.join(root, file)
-
-                        print(f"\n>>> Processing: {file_path}")
-                        try:
-                            clean_teff_row_content(file_path)
-                        except Exception as e:
-                            print(f"  - Error while processing {file_path}: {e}")
+    journal.end()
 
 # Run batch cleaning loop
 if __name__ == '__main__':
-    base_data_path = r"C:\Users\Henri\Documents\Data Science\Portfolio\SQL\Datasets\EACEI\01_data_raw"
+    base_data_path = project_dir("raw")
     process_all_files(base_data_path)
@@ -1,7 +1,18 @@
 import pandas as pd
+import numpy as np
 import os
 import logging
-import json
+
+from column_formulas import load_formulas, evaluate_formulas
+from blob_store import BlobStore
+from eacei_config import project_dir, load_dictionary
+from io_pipeline import run_pipeline, source
+from run_journal import RunJournal
+from profiling import profiled, profile_file
+from run_metrics import metered, file_metrics
+from pipeline_log import LOGGER_NAME, LogWriter, init_worker, set_log_file
+from raw_catalog import load_catalog
+from typed_table import read_typed_csv, null_codes, align_markers, sum_duplicate_columns, sum_rows, log_records, to_output, save_typed
 
 # --- Configuration Dictionaries ---
 
@@ -12,94 +23,41 @@ ID_HEADER_MAP = {
     "TEFF": {"ID": "teff_code", "TEFF": "teff_label"},
 }
 
-# For standardizing T4 indicator column headers
-
-try:
-    with open(r'C:\Users\Henri\Documents\Data Science\Portfolio\SQL\Datasets\EACEI\04_dictionaries\T4_naming_convention.json', 'r', encoding='utf-8') as file:
-        header_map = json.load(file)['header_map']
-except FileNotFoundError:
-    print("Error: 'T4_naming_convention.json' not found.")
-    exit()
+# For standardizing T4 indicator column headers (read on first use)
+NAMING_CONVENTION = 'T4_naming_convention.json'
 
 # --- Logging Setup ---
 
-def setup_logger():
-    """Sets up a logger to append warnings to a file in the root 07_logs directory."""
-    # Use a relative path to make the script portable
-    log_dir = os.path.join(os.path.dirname(__file__), '..', '07_logs')
-    if not os.path.exists(log_dir):
-        os.makedirs(log_dir)
-    
-    log_file_path = os.path.join(log_dir, 'data_cleaning_T4.log')
-    
-    logger = logging.getLogger('DataCleaningLogger')
-    logger.setLevel(logging.INFO)
-    
-    if not logger.handlers:
-        # Use mode 'a' to append to the log file instead of 'w' to overwrite
-        handler = logging.FileHandler(log_file_path, mode='a', encoding='utf-8')
-        formatter = logging.Formatter('%(asctime)s | %(levelname)s | %(message)s')
-        handler.setFormatter(formatter)
-        logger.addHandler(handler)
-        
-    return logger
-
-LOGGER = setup_logger()
-
-# --- Helper Function for Aggregation with Logging ---
-
-def sum_with_logging(series, script_name, file_name, aggregation_type, group_id, axis):
-    """
-    Custom aggregation function that sums a pandas Series, but logs a warning
-    if suppressed ('s', 'so', 'ns') or null values are present.
-    If all values are null/suppressed, returns null.
-    """
-    suppressed_values = ['s', 'so', 'ns']
-    # Create a copy to avoid SettingWithCopyWarning
-    series_cleaned = series.copy().replace(suppressed_values, pd.NA)
-    
-    # Check if all values in the series are null after cleaning
-    if series_cleaned.isnull().all():
-        return pd.NA # Return null if all values were null/suppressed
-        
-    # Log if any value was null/suppressed, but not all of them
-    if series_cleaned.isnull().any():
-        log_message = (
-            f"Script: {script_name} | File: {file_name} | "
-            f"{aggregation_type}Warning: Sum across axis '{axis}' for group '{group_id}' "
-            "included a suppressed or null value (s, so, ns, or null)."
-        )
-        LOGGER.info(log_message)
-        
-    # Convert to numeric, coercing errors and filling remaining NaNs with 0 for summation
-    numeric_series = pd.to_numeric(series_cleaned, errors='coerce').fillna(0)
-    return numeric_series.sum()
+# Records go through the run's log writer (see pipeline_log.py)
+LOGGER = logging.getLogger(LOGGER_NAME)
+
+# Outputs are stored once and linked into step_3/ (see blob_store.py)
+BLOB_STORE = BlobStore()
+
+# --- Suppression Markers ---
+
+SUPPRESSED_VALUES = ['s', 'so', 'ns']
+NULL_CODES = null_codes(SUPPRESSED_VALUES)
 
 # --- Main Processing Steps ---
 
-def step1_rename_id_headers(df, file_path):
-    """Identifies file type and renames the first two columns."""
+def step1_rename_id_headers(df, category):
+    """Renames the first two columns for the file's category (from the raw catalog)."""
     print("Step 1: Renaming identifier headers...")
-    file_name = os.path.basename(file_path)
-    file_type = None
-    if "NAF" in file_name:
-        file_type = "NAF"
-    elif "REG" in file_name:
-        file_type = "REG"
-    elif "TEFF" in file_name:
-        file_type = "TEFF"
-
-    if file_type:
-        rename_dict = ID_HEADER_MAP[file_type]
+    if category in ID_HEADER_MAP:
+        rename_dict = ID_HEADER_MAP[category]
         df = df.rename(columns=rename_dict)
     else:
-        print("  - Warning: Could not determine file type. ID columns not renamed.")
+        print("  - Warning: Unknown file category. ID columns not renamed.")
 
     return df
 
-def step2_rename_and_add_indicators(df, script_name, file_name): 
+def step2_rename_and_add_indicators(df, markers, script_name, file_name): 
     """Renames existing indicator columns and adds missing ones."""
     print("Step 2: Renaming and adding indicator columns...")
+    naming_convention = load_dictionary(NAMING_CONVENTION)
+    header_map = naming_convention['header_map']
+    derived_columns = load_formulas(naming_convention)
 
     # Renaming columns
     df.columns = [col.replace("'", "’") if isinstance(col, str) else col for col in df.columns]
@@ -108,136 +66,94 @@ def step2_rename_and_add_indicators(df, script_name, file_name):
 
 
 
-    # Add missing columns
+    # Add missing columns (derived columns are computed below)
     all_target_headers = list(header_map.keys())
     for header in all_target_headers:
-        if header not in df.columns and header != "Électricité autoproduite":
+        if header not in df.columns and header not in derived_columns:
             print(f"  - Adding missing column: '{header}'")
-            df[header] = pd.NA
-
-    # Define the final names of the source columns
-    thermal_col = 'Électricité produite d’origine thermique'
-    non_thermal_col = 'Production d’électricité d’origine non thermique'
-    target_col = 'Électricité autoproduite'
-    id_col = df.columns[0] # Assumes the first column is the unique row identifier
-
-    # Check if both source columns exist after renaming
-    if thermal_col in df.columns and non_thermal_col in df.columns and "Électricité autoproduite" not in df.columns:
-        
-        # Use df.apply to iterate row-wise and call your logging function
-        df[target_col] = df.apply(
-            lambda row: sum_with_logging(
-                pd.Series([row[thermal_col], row[non_thermal_col]]), # Create a series from the two values
-                script_name,      # Pass the script name
-                file_name,        # Pass the file name
-                "ManualColumnSum",# A clear aggregation type for the log
-                row[id_col],      # The ID of the current row (e.g., NAF code)
-                'columns'         # The axis of summation
-            ),
-            axis=1 # Apply the function to each row
-        )
-    else:
-        print(f"  - Warning: Could not calculate '{target_col}' because source columns were not found or because 'Électricité autoproduite' was already in columns.")
-        # Ensure the column exists even if calculation fails, filled with nulls
-        if target_col not in df.columns:
-            df[target_col] = pd.NA
+            df[header] = np.nan
+    markers = align_markers(df, markers)
 
-    return df
+    # Compute the derived columns declared in T4_naming_convention.json
+    # (e.g. 'Électricité autoproduite' = thermal + non-thermal production)
+    df, markers, records = evaluate_formulas(df, markers, derived_columns, NULL_CODES)
+    log_records(records, LOGGER, script_name, file_name)
+
+    return df, markers
 
-def step3_aggregate_columns(df, script_name, file_name):
+def step3_aggregate_columns(df, markers, script_name, file_name):
     """Aggregates columns with the same name, summing their values, then reorders columns."""
     print("Step 3: Aggregating duplicate columns...")
     cell1, cell2 = df.columns[0], df.columns[1]
 
-    df_agg = df.groupby(by=df.columns, axis=1).apply(
-        lambda g: g.apply(
-            lambda row: sum_with_logging(
-                row, script_name, file_name, "ColumnAggregation",
-                df.loc[row.name, cell1], # Use the row's ID as the group identifier
-                g.columns[0]
-            ),
-            axis=1
-                        
-        ) if g.shape[1] > 1 else g.iloc[:, 0]
-    )
+    df_agg, markers_agg, records = sum_duplicate_columns(df, markers, NULL_CODES)
+    log_records(records, LOGGER, script_name, file_name)
 
+    header_map = load_dictionary(NAMING_CONVENTION)['header_map']
     desired_order = [cell1, cell2] + list(header_map.keys())
     ordered_columns = [col for col in desired_order if col in df_agg.columns]
-    return df_agg.loc[:, ordered_columns]
+    return df_agg.loc[:, ordered_columns], markers_agg.loc[:, ordered_columns]
 
-def step4_aggregate_rows(df, script_name, file_name): 
+def step4_aggregate_rows(df, markers, script_name, file_name): 
     """Aggregates rows based on the primary identifier code, with logging."""
     print("Step 4: Aggregating duplicate rows...")
-    id_column_name = df.columns[0]
-    label_column_name = df.columns[1]
-    
-    # Define a custom aggregation function to use with .agg()
-    def agg_with_log(series):
-        # The name of the group (e.g., 'B07T09') is the name of the series
-        group_id = series.name        
-        row_header = df.loc[series.index[0], id_column_name]
-        return sum_with_logging(series, script_name, file_name, "RowAggregation", group_id, row_header)
-    
-    data_cols = df.columns.drop([id_column_name, label_column_name])
-    agg_dict = {col: agg_with_log for col in data_cols}
-    agg_dict[label_column_name] = 'first' # Keep the first label
-
-    df_agg = df.groupby(id_column_name).agg(agg_dict).reset_index()
-    
-    # Reorder columns to match the original dataframe's order
-    ordered_cols = [col for col in df.columns if col in df_agg.columns]
-    return df_agg[ordered_cols]
-
-def save_csv(df, file_path):
+    df_agg, markers_agg, records = sum_rows(df, markers, NULL_CODES)
+    log_records(records, LOGGER, script_name, file_name)
+    return df_agg, markers_agg
+
+def save_csv(df, markers, file_path):
     # Save the processed csv file
     output_dir = os.path.join(os.path.dirname(os.path.dirname(file_path)), "step_3")
     os.makedirs(output_dir, exist_ok=True)
     base_name = os.path.basename(file_path).replace('.csv', '')
     output_path = os.path.join(output_dir, f"{base_name}.csv")
 
-    try:
-        df.to_csv(output_path, index=False, encoding='utf-8-sig')
-        print(f"\nSuccess! Column-wise cleaned file saved to:\n{output_path}")
-    except Exception as e:
-        print(f"\nError saving the new file: {e}")
-
-    return
+    BLOB_STORE.write_bytes(output_path, to_output(df, markers).to_csv(index=False).encode('utf-8-sig'))
+    save_typed(BLOB_STORE, output_path, df, markers)
+    print(f"\nSuccess! Column-wise cleaned file saved to:\n{output_path}")
 
 # --- Main Orchestrator ---
 
+def clean_task(data, file_path, entry, script_name):
+    """One file of the batch, as run by the executor (see io_pipeline.run_pipeline)."""
+    set_log_file(os.path.basename(file_path))
+    LOGGER.info(f"--- Processing file: {os.path.basename(file_path)} ---")
+    with profile_file(os.path.basename(file_path)), file_metrics(file_path):
+        df, markers = read_typed_csv(source(file_path, data))
+
+        # Run pipeline steps sequentially
+        print("Starting the T4 file processing pipeline...")
+        print(f"  - Processing file : {os.path.basename(file_path)}")
+        df_step1 = step1_rename_id_headers(df, entry["category"])
+        markers = align_markers(df_step1, markers)
+        df_step2, markers = step2_rename_and_add_indicators(df_step1, markers, script_name, os.path.basename(file_path))
+        df_step3, markers = step3_aggregate_columns(df_step2, markers, script_name, os.path.basename(file_path))
+        df_step4, markers = step4_aggregate_rows(df_step3, markers, script_name, os.path.basename(file_path))
+        save_csv(df_step4, markers, file_path)
+
+@profiled("step_3_T4")
+@metered("step_3_T4")
 def process_t4_files(base_dir, script_name):
     """ Processes all T4 files in the specified base directory."""
-    for year in range(2010, 2024):
-        year_path = os.path.join(base_dir, str(year))
-        if not os.path.isdir(year_path):
-            continue
-
-        for root, dirs, files in os.walk(year_path):
-            if os.path.basename(root) == "step_2":
-                for file in files:
-                    if file.endswith(".csv") and "T4" in file:
-                        file_path = os.path.join(root, file)
-
-                        LOGGER.info(f"--- Processing file: {os.path.basename(file_path)} ---")
-
-                        try:
-                            df = pd.read_csv(file_path)
-                        except Exception as e:
-                            print(f"Error reading CSV file at {file_path}: {e}")
-                            return
-
-                        # Run pipeline steps sequentially
-                        print("Starting the T4 file processing pipeline...")
-                        print(f"  - Processing file : {os.path.basename(file_path)}")
-                        df_step1 = step1_rename_id_headers(df, file_path)
-                        df_step2 = step2_rename_and_add_indicators(df_step1, script_name, os.path.basename(file_path))
-                        df_step3 = step3_aggregate_columns(df_step2, script_name, os.path.basename(file_path))
-                        df_step4 = step4_aggregate_rows(df_step3, script_name, os.path.basename(file_path))
-                        save_csv(df_step4, file_path)
+    catalog = load_catalog(base_dir)
+    journal = RunJournal("step_3_T4")
+    with LogWriter("data_cleaning_T4", journal.run_id) as log_writer:
+        tasks = [(catalog.full_path(entry), entry, script_name)
+                 for entry in journal.pending(catalog.tables("step_2", table="T4"))]
+        # Pool workers log through the same writer (see pipeline_log.py)
+        for outcome in run_pipeline(clean_task, tasks, path=lambda task: task[0],
+                                    initializer=init_worker, initargs=log_writer.worker_args()):
+            entry = outcome.task[1]
+            if outcome.error is not None:
+                journal.failed(entry, outcome.error)
+                continue
+            journal.done(entry)
+
+    journal.end()
 
 # Run batch cleaning loop
 if __name__ == '__main__':
     # Get the name of the current script dynamically
     current_script_name = os.path.basename(__file__)
-    base_data_path = r"C:\Users\Henri\Documents\Data Science\Portfolio\SQL\Datasets\EACEI\01_data_raw"
+    base_data_path = project_dir("raw")
     process_t4_files(base_data_path, current_script_name)
\ No newline at end of file
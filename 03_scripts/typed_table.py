@@ -0,0 +1,303 @@
+import io
+import os
+import re
+import numpy as np
+import pandas as pd
+
+from eacei_config import TYPED_TABLES_ENV
+from run_metrics import count
+
+# --- Typed Tables ---
+#
+# The step_3 scripts read each step_2 file once into:
+#   - values:  the code/label columns as read, every indicator column as float64
+#   - markers: a uint8 frame with the same columns recording what each cell held
+# Strings are parsed once per distinct value of a column, so the suppression
+# markers are never searched again: every later sum works on the two arrays.
+#
+# Sums keep the step_3 suppression rules: blanks and the script's markers
+# are null, the result is null when every input is null, and otherwise nulls
+# (and any other text) count as 0. A sum of integers stays an integer, as with
+# pd.to_numeric, so INTEGER is kept apart from NUMBER and restored on output.
+# An aggregated column is typed like the one pandas builds from the group sums:
+# unless one sum is null, a single float turns every integer of it into a float.
+
+NUMBER, INTEGER, BLANK, S, SO, NS, ND, DASH, TEXT = range(9)
+MARKER_CODES = {"s": S, "so": SO, "ns": NS, "nd": ND, "-": DASH}
+MARKER_NAMES = {
+    NUMBER: "number", INTEGER: "integer", BLANK: "blank", S: "s", SO: "so",
+    NS: "ns", ND: "nd", DASH: "-", TEXT: "text",
+}
+INTEGER_TEXT = re.compile(r'\s*[+-]?\d+\s*')
+
+
+def null_codes(suppressed_values):
+    """Marker codes treated as null: blanks plus the given suppression markers."""
+    return np.array([BLANK] + [MARKER_CODES[v] for v in suppressed_values], dtype=np.uint8)
+
+
+def parse_column(column):
+    """(float64 values, uint8 markers) of one column."""
+    if pd.api.types.is_bool_dtype(column):
+        column = column.astype(object)
+    if pd.api.types.is_integer_dtype(column):
+        return column.to_numpy(dtype=np.float64), np.full(len(column), INTEGER, dtype=np.uint8)
+    if pd.api.types.is_float_dtype(column):
+        values = column.to_numpy(dtype=np.float64)
+        return values, np.where(np.isnan(values), BLANK, NUMBER).astype(np.uint8)
+
+    # Text column: parse each distinct value once
+    codes, uniques = pd.factorize(column)
+    uniques = pd.Series(uniques, dtype=object)
+    parsed = pd.to_numeric(uniques, errors='coerce').to_numpy(dtype=np.float64)
+    kinds = np.where(np.isnan(parsed), TEXT, NUMBER).astype(np.uint8)
+    is_int = uniques.map(lambda v: bool(INTEGER_TEXT.fullmatch(v)) if isinstance(v, str)
+                         else isinstance(v, (int, np.integer)) and not isinstance(v, bool))
+    kinds[is_int.to_numpy(dtype=bool)] = INTEGER
+    for marker, code in MARKER_CODES.items():
+        kinds[(uniques == marker).to_numpy()] = code
+
+    present = codes >= 0
+    values = np.full(len(column), np.nan)
+    values[present] = parsed[codes[present]]
+    markers = np.full(len(column), BLANK, dtype=np.uint8)
+    markers[present] = kinds[codes[present]]
+    return values, markers
+
+
+def to_typed(df, id_columns=2):
+    """Splits a frame as read into (values, markers); the first `id_columns` are kept as-is."""
+    n_rows = len(df)
+    parsed = [parse_column(df.iloc[:, i]) for i in range(id_columns, df.shape[1])]
+    block = np.column_stack([v for v, _ in parsed]) if parsed else np.empty((n_rows, 0))
+    marks = np.column_stack([np.zeros((n_rows, id_columns), dtype=np.uint8)] + [m[:, None] for _, m in parsed])
+
+    values = pd.concat(
+        [df.iloc[:, :id_columns], pd.DataFrame(block, index=df.index, columns=df.columns[id_columns:])], axis=1)
+    markers = pd.DataFrame(marks.astype(np.uint8), index=df.index, columns=df.columns)
+    return values, markers
+
+
+def read_typed_csv(path, header=0, id_columns=2):
+    """Reads a step_2 file straight into (values, markers)."""
+    df = pd.read_csv(path, header=header)
+    count(rows_in=len(df))
+    return to_typed(df, id_columns)
+
+
+def align_markers(df, markers):
+    """
+    Relabels `markers` after column renames on `df`, position by position; columns
+    appended to `df` (missing indicators) get BLANK markers.
+    """
+    block = markers.to_numpy(dtype=np.uint8)
+    extra = df.shape[1] - block.shape[1]
+    if extra > 0:
+        block = np.hstack([block, np.full((len(df), extra), BLANK, dtype=np.uint8)])
+    return pd.DataFrame(block, index=df.index, columns=df.columns)
+
+
+def null_aware_sum(values, markers, nulls, axis):
+    """
+    Sums `values` along `axis` with the suppression rules (see module comment).
+    Returns (sums, result markers, partial) where `partial` flags the sums that
+    included a null.
+    """
+    isnull = np.isin(markers, nulls)
+    all_null = isnull.all(axis=axis)
+    partial = isnull.any(axis=axis) & ~all_null
+
+    sums = np.nan_to_num(values).sum(axis=axis)
+    sums[all_null] = np.nan
+    integral = (markers == INTEGER).all(axis=axis)
+    first = np.take(markers, 0, axis=axis)
+    result = np.where(all_null, first, np.where(integral, INTEGER, NUMBER)).astype(np.uint8)
+    return sums, result, partial
+
+
+def infer_columns(result):
+    """Applies the pandas column typing (see module comment) to result markers, in place."""
+    result = result.reshape(len(result), -1)
+    no_null = np.isin(result, (NUMBER, INTEGER)).all(axis=0)
+    as_float = no_null & (result == NUMBER).any(axis=0)
+    result[(result == INTEGER) & as_float] = NUMBER
+
+
+def sum_duplicate_columns(df, markers, nulls):
+    """
+    Sums the columns sharing a name (in sorted name order, like groupby(axis=1)).
+    Returns (df, markers, records) with one (aggregation, axis, group_id) record
+    per row sum that included a null.
+    """
+    positions = {}
+    for i, label in enumerate(df.columns):
+        positions.setdefault(label, []).append(i)
+    ids = df.iloc[:, 0].to_numpy()
+
+    columns, marks, records = {}, {}, []
+    for label in sorted(positions):
+        pos = positions[label]
+        if len(pos) == 1:
+            columns[label] = df.iloc[:, pos[0]]
+            marks[label] = markers.iloc[:, pos[0]].to_numpy()
+            continue
+        sums, result, partial = null_aware_sum(
+            df.iloc[:, pos].to_numpy(dtype=np.float64), markers.iloc[:, pos].to_numpy(), nulls, axis=1)
+        infer_columns(result)
+        columns[label] = pd.Series(sums, index=df.index)
+        marks[label] = result
+        records.extend(("ColumnAggregation", label, group_id) for group_id in ids[partial])
+        count(cells_aggregated=len(pos) * len(df))
+
+    return pd.DataFrame(columns), pd.DataFrame(marks, index=df.index), records
+
+
+def sum_rows(df, markers, nulls):
+    """
+    Sums the rows sharing a code (first column), keeping the first label, like
+    groupby(code).agg(...). Rows without a code are dropped.
+    Returns (df, markers, records) with one (aggregation, axis, group_id) record
+    per (code, column) sum that included a null, column by column.
+    """
+    id_col, label_col = df.columns[0], df.columns[1]
+    data_cols = list(df.columns[2:])
+    keep = df[id_col].notna().to_numpy()
+    keys, uniques = pd.factorize(df[id_col][keep], sort=True)
+
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    starts = np.r_[0, np.flatnonzero(np.diff(sorted_keys)) + 1] if len(order) else np.array([], dtype=int)
+
+    values = df.iloc[:, 2:].to_numpy(dtype=np.float64)[keep][order]
+    marks = markers.iloc[:, 2:].to_numpy()[keep][order]
+    sums = np.full((len(starts), len(data_cols)), np.nan)
+    result = np.full((len(starts), len(data_cols)), BLANK, dtype=np.uint8)
+    partial = np.zeros((len(starts), len(data_cols)), dtype=bool)
+    if len(starts):
+        sizes = np.diff(np.r_[starts, len(order)])[:, None]
+        isnull = np.isin(marks, nulls)
+        n_null = np.add.reduceat(isnull.astype(np.int64), starts, axis=0)
+        all_null = n_null == sizes
+        partial = (n_null > 0) & ~all_null
+        sums = np.add.reduceat(np.nan_to_num(values), starts, axis=0)
+        # reduceat adds row by row; groups of 3+ rows are re-summed along a
+        # contiguous axis so the floats round as pandas' (pairwise) sum does
+        wide = np.flatnonzero(sizes[:, 0] > 2)
+        if len(wide):
+            by_column = np.ascontiguousarray(np.nan_to_num(values).T)
+            for g in wide:
+                sums[g] = by_column[:, starts[g]:starts[g] + sizes[g, 0]].sum(axis=1)
+        sums[all_null] = np.nan
+        integral = np.add.reduceat((marks == INTEGER).astype(np.int64), starts, axis=0) == sizes
+        result = np.where(all_null, marks[starts], np.where(integral, INTEGER, NUMBER)).astype(np.uint8)
+        infer_columns(result)
+        count(cells_aggregated=sizes[sizes > 1].sum() * len(data_cols))
+
+    labels = df[label_col][keep].groupby(keys, sort=True).first()
+    out = pd.DataFrame(sums, columns=data_cols)
+    out.insert(0, label_col, labels.to_numpy())
+    out.insert(0, id_col, np.asarray(uniques))
+    out_markers = pd.DataFrame(np.zeros((len(out), 2), dtype=np.uint8), columns=[id_col, label_col])
+    out_markers = pd.concat([out_markers, pd.DataFrame(result, columns=data_cols)], axis=1)
+
+    records = [("RowAggregation", uniques[g], col)
+               for j, col in enumerate(data_cols) for g in np.flatnonzero(partial[:, j])]
+    return out, out_markers, records
+
+
+def log_records(records, logger, script_name, file_name):
+    """Writes one DataCleaningLogger warning per suppression record."""
+    count(suppression_events=len(records))
+    for aggregation_type, axis, group_id in records:
+        logger.info(
+            f"Script: {script_name} | File: {file_name} | "
+            f"{aggregation_type}Warning: Sum across axis '{axis}' for group '{group_id}' "
+            "included a suppressed or null value (s, so, ns, or null)."
+        )
+
+
+def to_output(df, markers, id_columns=2):
+    """Frame ready for to_csv: integer sums are written without a decimal part."""
+    out = df.copy()
+    for i in range(id_columns, df.shape[1]):
+        is_int = markers.iloc[:, i].to_numpy() == INTEGER
+        if is_int.any():
+            column = df.iloc[:, i].to_numpy(dtype=np.float64).astype(object)
+            column[is_int] = df.iloc[:, i].to_numpy(dtype=np.float64)[is_int].astype(np.int64)
+            out.isetitem(i, column)
+    count(rows_out=len(out))
+    return out
+
+
+# --- Typed Table Files ---
+#
+# With EACEI_TYPED_TABLES=1 (or `eacei --typed`), step_3 also saves each table
+# next to its CSV as a .npy file, and build_faits reads that instead of
+# parsing the CSV again. The file holds a single record with one field per
+# column, each an array of every row of the column:
+#   ids:      the code/label columns as text, written like to_csv ('' if empty)
+#   values:   the indicator columns as float64, NaN where null
+#   markers:  the indicator columns' markers (the codes above), so suppressed
+#             cells stay told apart from blanks, which the CSV cannot keep
+# The dtype in the header is the schema (canonical column names and types), so
+# nothing is parsed, and np.load(mmap_mode='r') maps the file: each column is a
+# contiguous view of it. The CSV stays the export for people.
+
+TYPED_EXTENSION = ".npy"
+TYPED_FORMAT_VERSION = (3, 0)  # The .npy version storing utf-8 field names
+
+
+def typed_tables_enabled():
+    return os.environ.get(TYPED_TABLES_ENV, "") not in ("", "0")
+
+
+def typed_path(csv_path):
+    """The typed file saved next to a table's CSV."""
+    return os.path.splitext(csv_path)[0] + TYPED_EXTENSION
+
+
+def typed_bytes(df, markers, id_columns=2):
+    """A (values, markers) table as the bytes of a typed file."""
+    n_rows = len(df)
+    ids = [(str(col), np.array(["" if pd.isna(v) else str(v) for v in df.iloc[:, i]], dtype=str))
+           for i, col in enumerate(df.columns[:id_columns])]
+    data_cols = [str(col) for col in df.columns[id_columns:]]
+    table = np.zeros(1, dtype=[
+        ("ids", [(name, text.dtype, (n_rows,)) for name, text in ids]),
+        ("values", [(name, np.float64, (n_rows,)) for name in data_cols]),
+        ("markers", [(name, np.uint8, (n_rows,)) for name in data_cols]),
+    ])
+    for name, text in ids:
+        table["ids"][name][0] = text
+    for i, name in enumerate(data_cols, start=id_columns):
+        table["values"][name][0] = df.iloc[:, i].to_numpy(dtype=np.float64)
+        table["markers"][name][0] = markers.iloc[:, i].to_numpy()
+
+    buffer = io.BytesIO()
+    np.lib.format.write_array(buffer, table, version=TYPED_FORMAT_VERSION)
+    return buffer.getvalue()
+
+
+def save_typed(store, csv_path, df, markers, id_columns=2):
+    """With typed tables on, stores the table next to `csv_path`; otherwise removes a stale one."""
+    path = typed_path(csv_path)
+    if typed_tables_enabled():
+        store.write_bytes(path, typed_bytes(df, markers, id_columns))
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def open_typed(path, mmap_mode='r'):
+    """
+    The record of a typed file: table["values"][column] is one column. With
+    mmap_mode set, the columns are views of the mapped file.
+    """
+    return np.load(path, mmap_mode=mmap_mode)[0]
+
+
+def typed_frame(table):
+    """The code/label and value columns of an opened typed file, as read_csv gives them from the CSV."""
+    ids, values = table["ids"], table["values"]
+    columns = {name: pd.Series(ids[name], dtype=object).mask(ids[name] == "") for name in ids.dtype.names}
+    columns.update((name, values[name]) for name in values.dtype.names)
+    return pd.DataFrame(columns)
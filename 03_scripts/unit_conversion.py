@@ -0,0 +1,101 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+
+from eacei_config import project_dir
+from fact_store import FactTable, write_facts_csv
+
+# --- Unit Conversion ---
+#
+# 04_dictionaries/unit_conversions.json gives each unit of ind_dim a quantity
+# (energy, money, mass...) and its factor to that quantity's reference unit,
+# e.g. kTEP -> 11.63 GWh, MWh -> 0.001 GWh. Any indicator can be converted to
+# any unit of the same quantity; the others (counts, TEP per establishment...)
+# are left out of a conversion.
+#
+# A UnitConverter turns the indicators' units into one factor array indexed by
+# ind_id per target unit, so converting a fact selection is a single gather
+# and multiply. The "views" of the file (name -> unit) are materialized by
+# build_faits as faits_<cat>_<view>.csv, e.g. all energy in GWh.
+
+UNITS_FILE = "unit_conversions.json"  # In the dictionaries folder
+
+
+def load_conversions(path=None):
+    path = path or os.path.join(project_dir("dictionaries"), UNITS_FILE)
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def indicator_units(mapping):
+    """ind_id -> unit over the T1..T4 sets of id_mapping.json."""
+    return {
+        rec["ind_id"]: rec.get(f"{set_name}_unit", "")
+        for set_name in ("T1", "T2", "T3", "T4")
+        for rec in mapping.get(set_name, [])
+    }
+
+
+class UnitConverter:
+    """Converts fact values between units of the same quantity (see module comment)."""
+
+    def __init__(self, ind_units, conversions):
+        self.ind_units = ind_units
+        self.units = conversions["units"]
+        self.views = conversions.get("views", {})
+        self._factors = {}
+
+    @classmethod
+    def from_ind_dim(cls, ind_dim_path=None, conversions_path=None):
+        """Builds a converter from ind_dim.csv (default: in the database folder)."""
+        ind_dim_path = ind_dim_path or os.path.join(project_dir("database"), "ind_dim.csv")
+        ind_dim = pd.read_csv(ind_dim_path, keep_default_na=False, encoding='utf-8-sig')
+        return cls(dict(zip(ind_dim["ind_id"].tolist(), ind_dim["unit"])), load_conversions(conversions_path))
+
+    def factors(self, target):
+        """Factor array indexed by ind_id converting to `target`, NaN where it does not apply."""
+        if target not in self._factors:
+            if target not in self.units:
+                raise KeyError(f"Unknown unit '{target}', expected one of {', '.join(self.units)}")
+            to = self.units[target]
+            factors = np.full(max(self.ind_units, default=0) + 1, np.nan)
+            for ind_id, unit in self.ind_units.items():
+                source = self.units.get(unit)
+                if source is not None and source["quantity"] == to["quantity"]:
+                    factors[ind_id] = source["factor"] / to["factor"]
+            self._factors[target] = factors
+        return self._factors[target]
+
+    def lookup(self, ind_ids, target):
+        """Factor of each of `ind_ids` to `target`, NaN for indicators that cannot be converted."""
+        factors = self.factors(target)
+        ind_ids = np.asarray(ind_ids, dtype=np.int64)
+        known = (ind_ids >= 0) & (ind_ids < len(factors))
+        return np.where(known, factors[np.where(known, ind_ids, 0)], np.nan)
+
+    def convert(self, table, target):
+        """FactTable of the rows of `table` convertible to `target`, values converted."""
+        factor = self.lookup(table.ind_id, target)
+        rows = ~np.isnan(factor)
+        value = np.asarray(table.value)
+        return FactTable(table.cat_col, np.asarray(table.cat_id)[rows], np.asarray(table.ind_id)[rows],
+                         np.asarray(table.year_id)[rows], (value[rows] * factor[rows]).astype(value.dtype))
+
+    def convert_frame(self, df, target, value_col="value"):
+        """Rows of a DataFrame with an ind_id column convertible to `target`, values converted."""
+        factor = self.lookup(df["ind_id"].to_numpy(), target)
+        rows = ~np.isnan(factor)
+        out = df[rows].copy()
+        out[value_col] = out[value_col].to_numpy(dtype=np.float64) * factor[rows]
+        return out.assign(unit=target)
+
+
+def write_views(tables, converter, output_dir):
+    """Writes faits_<cat>_<view>.csv for each category of `tables` and each view of the converter."""
+    for category, table in tables.items():
+        for view, unit in converter.views.items():
+            converted = converter.convert(table, unit)
+            out_name = f"faits_{category.lower()}_{view}"
+            write_facts_csv(converted, os.path.join(output_dir, f"{out_name}.csv"))
+            print(f"Written {out_name}: {len(converted)} facts in {unit}")
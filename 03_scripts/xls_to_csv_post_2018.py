@@ -1,7 +1,33 @@
 import os
 import pandas as pd
 
+from atomic_io import atomic_path
+from eacei_config import project_dir
+from executor import run_tasks
+
+def convert_file(subdir, file):
+    """Converts the sheets of one Excel file, as run by the executor."""
+    file_path = os.path.join(subdir, file)
+
+    # Read the Excel file
+    xls = pd.ExcelFile(file_path)
+
+    # Loop through each sheet in the Excel file
+    for sheet_name in xls.sheet_names:
+        # Read the sheet into a DataFrame
+        df = pd.read_excel(xls, sheet_name=sheet_name)
+
+        # Create the output CSV file path
+        csv_filename = f"{file[:-5]}_{sheet_name}.csv"
+        csv_path = os.path.join(subdir, csv_filename)
+
+        # Save the DataFrame to a CSV file, replaced rather than rewritten in place
+        with atomic_path(csv_path) as tmp_path:
+            df.to_csv(tmp_path, index=False)
+        print(f"Converted {file_path} (sheet: {sheet_name}) to {csv_path}")
+
 def convert_excel_to_csv(root_dir, start_year=2023):
+    tasks = []
     # Loop through each year directory starting from the specified start_year
     for year in range(start_year, 2024):
         year_dir = os.path.join(root_dir, str(year))
@@ -10,24 +36,14 @@ def convert_excel_to_csv(root_dir, start_year=2023):
             for subdir, _, files in os.walk(year_dir):
                 for file in files:
                     if file.endswith('.xls') or file.endswith('.xlsx'):
-                        file_path = os.path.join(subdir, file)
-
-                        # Read the Excel file
-                        xls = pd.ExcelFile(file_path)
-
-                        # Loop through each sheet in the Excel file
-                        for sheet_name in xls.sheet_names:
-                            # Read the sheet into a DataFrame
-                            df = pd.read_excel(xls, sheet_name=sheet_name)
-
-                            # Create the output CSV file path
-                            csv_filename = f"{file[:-5]}_{sheet_name}.csv"
-                            csv_path = os.path.join(subdir, csv_filename)
+                        tasks.append((subdir, file))
 
-                            # Save the DataFrame to a CSV file
-                            df.to_csv(csv_path, index=False)
-                            print(f"Converted {file_path} (sheet: {sheet_name}) to {csv_path}")
+    # I/O bound: threads rather than processes (see executor.py)
+    for outcome in run_tasks(convert_file, tasks, path=lambda task: os.path.join(*task), io_bound=True):
+        if outcome.error is not None:
+            raise outcome.error
 
-# Specify the root directory where your folders are located
-root_directory = r"C:\Users\Henri\Documents\Data Science\Portfolio\SQL\Datasets\EACEI\data"
-convert_excel_to_csv(root_directory)
+# Run on the raw data folder (downloaded packages)
+if __name__ == '__main__':
+    root_directory = project_dir("raw")
+    convert_excel_to_csv(root_directory)
@@ -0,0 +1,72 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), '03_scripts'))
+
+import pandas as pd
+
+import xls_to_csv
+from blob_store import BlobStore
+from of_interest import organize_and_rename_files
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+def test_identical_files_are_stored_once(tmp_path):
+    """Copies and identical outputs are views of one object."""
+    store = BlobStore(str(tmp_path / "blobs"))
+    src = tmp_path / "raw" / "naf_t1.csv"
+    os.makedirs(str(src.parent))
+    src.write_bytes(b"ID,NAF\n_T,Total\n")
+
+    store.copy(str(src), str(tmp_path / "of_interest" / "2019_NAF_T1.csv"))
+    store.write_bytes(str(tmp_path / "step_1" / "2019_NAF_T1.csv"), b"ID,NAF\n_T,Total\n")
+
+    assert len(store.objects()) == 1
+    assert os.path.samefile(str(tmp_path / "of_interest" / "2019_NAF_T1.csv"), str(tmp_path / "step_1" / "2019_NAF_T1.csv"))
+    assert not os.path.samefile(str(src), str(tmp_path / "of_interest" / "2019_NAF_T1.csv"))
+
+def test_rewriting_a_view_leaves_the_others(tmp_path):
+    """A new output replaces the link; the other views and the object keep their bytes."""
+    store = BlobStore(str(tmp_path / "blobs"))
+    step_3 = str(tmp_path / "step_3" / "2019_NAF_T1.csv")
+    clean = str(tmp_path / "clean" / "2019_NAF_T1.csv")
+    store.write_bytes(step_3, b"v1\n")
+    store.copy(step_3, clean)
+
+    store.write_bytes(step_3, b"v2\n")
+    assert read(step_3) == b"v2\n" and read(clean) == b"v1\n"
+    assert store.verify() == []
+
+    os.remove(clean)
+    assert store.prune() == 1
+    assert len(store.objects()) == 1
+
+class FakeExcelFile:
+    """Stands in for pd.ExcelFile: one sheet whose values are set by the test."""
+    rows = {"ID": ["_T"], "NAF": ["Total"]}
+    sheet_names = ["T1"]
+
+    def __init__(self, path):
+        pass
+
+def test_converting_again_after_organize(tmp_path, monkeypatch):
+    """Re-running convert after organize never changes the stored objects."""
+    monkeypatch.setattr(pd, "ExcelFile", FakeExcelFile)
+    monkeypatch.setattr(pd, "read_excel", lambda xls, sheet_name: pd.DataFrame(xls.rows))
+    store = BlobStore(str(tmp_path / "blobs"))
+    package = tmp_path / "raw" / "2019" / "eacei19"
+    os.makedirs(str(package))
+    (package / "naf.xlsx").write_bytes(b"")
+
+    xls_to_csv.convert_excel_to_csv(str(tmp_path / "raw"))
+    organize_and_rename_files(str(tmp_path / "raw"), store)
+    view = str(package / "of_interest" / "2019_NAF_T1.csv")
+    first = read(view)
+
+    monkeypatch.setattr(FakeExcelFile, "rows", {"ID": ["_T"], "NAF": ["Ensemble"]})
+    xls_to_csv.convert_excel_to_csv(str(tmp_path / "raw"))
+    assert read(str(package / "naf_T1.csv")) != first
+    assert read(view) == first
+    assert store.verify() == []
@@ -0,0 +1,38 @@
+import os
+import sys
+import shutil
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), '03_scripts'))
+
+from build_faits import build_faits
+from fact_tensor import load_fact_table
+
+ROOT = os.path.dirname(os.path.dirname(__file__))
+
+def test_no_binary_rebuild_replaces_binary_table(tmp_path, monkeypatch):
+    """After a --no-binary rebuild, the loaders read the new facts, not the last binary table."""
+    monkeypatch.setenv("EACEI_LOGS_DIR", str(tmp_path / "logs"))
+    dictionaries = tmp_path / "dictionaries"
+    os.makedirs(str(dictionaries))
+    shutil.copy(os.path.join(ROOT, '04_dictionaries', 'id_mapping.json'), str(dictionaries))
+    clean_file = tmp_path / "clean" / "2015" / "2015_NAF_T1.csv"
+    os.makedirs(str(clean_file.parent))
+    shutil.copy(os.path.join(ROOT, '02_data_clean', '2015', '2015_NAF_T1.csv'), str(clean_file))
+    database = str(tmp_path / "database")
+    build = dict(mapping_path=str(dictionaries / "id_mapping.json"), clean_dir=str(clean_file.parent.parent),
+                 output_dir=database, write_sparse=False)
+
+    first = np.array(build_faits(**build)["NAF"].value)
+    assert os.path.isdir(os.path.join(database, "faits_naf"))
+
+    df = pd.read_csv(str(clean_file), encoding='utf-8-sig', dtype={"naf_code": str})
+    df.iloc[:, 2:] = df.iloc[:, 2:] * 2
+    df.to_csv(str(clean_file), index=False, encoding='utf-8-sig')
+    build_faits(**build, write_binary=False)
+
+    assert not os.path.exists(os.path.join(database, "faits_naf"))
+    np.testing.assert_array_equal(np.asarray(load_fact_table("NAF", database).value), first * 2)
+    updates = pd.read_csv(os.path.join(database, "changes", "faits_naf_updates.csv"), encoding='utf-8-sig')
+    assert len(updates) == int((np.nan_to_num(first) != 0).sum())
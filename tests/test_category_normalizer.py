@@ -0,0 +1,48 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), '03_scripts'))
+
+from category_normalizer import load_normalizer, DROP, SPLIT, REPLACE
+
+def test_naf_rows_match_the_2023_standard():
+    """Combined cells are split, old codes mapped and obsolete rows dropped."""
+    naf = load_normalizer("NAF")
+    rows = [
+        ["07 - 08 - 09 Industries extractives", "1", "2"],
+        ["13", "Textile", "3"],
+        ["Total hors IAA", "9"],
+        [],
+        ["Total industrie", "10"],
+    ]
+    normalized = naf.normalize_rows(rows)
+
+    assert [row[0] for row in normalized] == ["B07T09", "13", "_T"]
+    assert normalized[0][1:] == [naf.labels["B07T09"], "1", "2"]
+    assert normalized[1] == ["13", "Fabrication de textiles", "3"]
+    assert normalized[2] == ["_T", "Total", "10"]
+
+def test_first_listed_prefix_wins():
+    """The compiled regex keeps the order of the prefix list."""
+    naf = load_normalizer("NAF")
+    assert naf.resolve("10 - 11 - 12 Industries alimentaires")[:2] == (SPLIT, "C10T12")
+    assert naf.resolve("08 - 09 - Autres industries extractives")[:2] == (SPLIT, "B07T09")
+    assert naf.resolve("C10T12") == (REPLACE, "C10T12", naf.labels["C10T12"])
+
+def test_reg_aliases_drops_and_header_rows():
+    """Old regions map to the current name and code, 'Corse' is dropped, header rows kept."""
+    reg = load_normalizer("REG")
+    rows = [
+        ["Alsace", "1"],
+        ["Corse", "2"],
+        ["Indicateurs", "x"],
+        [" Dom ", "3"],
+    ]
+    normalized = reg.normalize_rows(rows)
+
+    assert normalized == [
+        ["GRE", "Grand Est", "1"],
+        ["Indicateurs", "x"],
+        ["DOM", "Départements d’Outre-mer", "3"],
+    ]
+    assert reg.resolve("Corse")[0] == DROP
@@ -0,0 +1,47 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), '03_scripts'))
+
+from column_formulas import evaluate_formulas
+from typed_table import INTEGER, BLANK, null_codes, to_typed, to_output
+
+FORMULAS = {"C": {"op": "sum", "inputs": ["A", "B"]}}
+NULLS = null_codes(['s', 'so', 'ns'])
+
+def evaluate(df):
+    values, markers = to_typed(df, id_columns=1)
+    return evaluate_formulas(values, markers, FORMULAS, NULLS)
+
+def test_sum_follows_suppression_semantics():
+    """Markers and blanks count as 0 unless every input is null; partial sums are reported."""
+    df = pd.DataFrame({
+        "naf_code": ["13", "14", "15", "16"],
+        "A": ["5", "s", "so", "2.5"],
+        "B": ["6", "4", np.nan, "1"],
+    })
+    df, markers, records = evaluate(df)
+
+    assert df["C"].tolist()[:2] == [11, 4.0]
+    assert np.isnan(df["C"].iloc[2])
+    assert df["C"].iloc[3] == 3.5
+    assert markers["C"].tolist()[:2] == [INTEGER, 0]
+    assert records == [("ManualColumnSum", "columns", "14")]
+
+def test_integer_sums_stay_integers():
+    """Rows of integers are written as ints, as pd.to_numeric would give."""
+    df, markers, _ = evaluate(pd.DataFrame({"naf_code": ["13", "14"], "A": [5, 6], "B": [1.0, np.nan]}))
+    assert [type(v) for v in to_output(df, markers, id_columns=1)["C"]] == [float, float]
+
+    df, markers, _ = evaluate(pd.DataFrame({"naf_code": ["13"], "A": [5], "B": [1]}))
+    assert str(to_output(df, markers, id_columns=1)["C"].iloc[0]) == "6"
+
+def test_missing_inputs_or_existing_target():
+    """A formula with a missing input yields nulls; an existing target is left as is."""
+    df, markers, _ = evaluate(pd.DataFrame({"naf_code": ["13"], "A": [1]}))
+    assert df["C"].isna().all() and (markers["C"] == BLANK).all()
+
+    df, _, records = evaluate(pd.DataFrame({"naf_code": ["13"], "A": [1], "B": [2], "C": [99]}))
+    assert df["C"].tolist() == [99] and records == []
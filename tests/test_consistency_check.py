@@ -0,0 +1,30 @@
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), '03_scripts'))
+
+from fact_store import FactBuffer
+from consistency_check import check_consistency
+
+MAPPING = {
+    "TEFF": [{"teff_code": "20-49", "teff_id": 302}, {"teff_code": "50-99", "teff_id": 304},
+             {"teff_code": "_T", "teff_id": 306}],
+    "T1": [{"T1_code": "T1_TOTAL_NET_KTEP", "ind_id": 1023, "T1_unit": "kTEP"}],
+    "T2": [{"T2_code": "T2_PRIX_ELEC_EUR-MWH", "ind_id": 2052, "T2_unit": "€/MWh"}],
+}
+
+def test_suppression_aware_statuses():
+    """Exact sums pass, partial sums are lower bounds, prices are skipped."""
+    buffer = FactBuffer('teff_id')
+    members = [302, 304, 306]
+    buffer.extend(members, [1023] * 3, [2010] * 3, [10.0, 20.0, 30.0])      # ok
+    buffer.extend(members, [1023] * 3, [2011] * 3, [10.0, 20.0, 45.0])      # mismatch
+    buffer.extend(members, [1023] * 3, [2012] * 3, [np.nan, 20.0, 45.0])    # ok_partial
+    buffer.extend(members, [1023] * 3, [2013] * 3, [np.nan, 50.0, 45.0])    # components_exceed_total
+    buffer.extend(members, [2052] * 3, [2010] * 3, [80.0, 90.0, 85.0])      # price, not additive
+    discrepancies, checked = check_consistency({"TEFF": buffer.finish()}, MAPPING)
+
+    statuses = checked.set_index('year_id')['status'].to_dict()
+    assert statuses == {2010: 'ok', 2011: 'mismatch', 2012: 'ok_partial', 2013: 'components_exceed_total'}
+    assert sorted(discrepancies['year_id']) == [2011, 2013]
@@ -0,0 +1,50 @@
+import os
+import sys
+import json
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), '03_scripts'))
+
+from fact_store import FactBuffer
+from derived_indicators import compute_derived
+
+MAPPING = {
+    "NAF": [{"naf_code": "13", "naf_id": 101}, {"naf_code": "_T", "naf_id": 124}],
+    "T2": [
+        {"T2_code": "T2_VALEUR_ELEC_EUR", "ind_id": 2051},
+        {"T2_code": "T2_ACHAT_ELEC_GWH", "ind_id": 2048},
+    ],
+}
+
+DEFINITIONS = {
+    "total_codes": {"NAF": "_T"},
+    "D": [
+        {"D_code": "D_PRIX", "ind_id": 9001,
+         "formula": {"op": "ratio", "numerator": ["T2_VALEUR_ELEC_EUR"], "denominator": ["T2_ACHAT_ELEC_GWH"], "scale": 1000}},
+        {"D_code": "D_PART", "ind_id": 9002,
+         "formula": {"op": "share_of_total", "input": "T2_ACHAT_ELEC_GWH", "scale": 100}},
+    ],
+}
+
+def make_tables():
+    buffer = FactBuffer('naf_id')
+    buffer.extend([101, 101, 124, 124], [2051, 2048, 2051, 2048], [2010] * 4, [86.0, 1073.0, 500.0, np.nan])
+    return {"NAF": buffer.finish()}
+
+def test_derived_rows_and_cache(tmp_path, capsys):
+    """Ratios and shares are computed vectorially and reused from cache when inputs are unchanged."""
+    definitions_path = tmp_path / 'derived_indicators.json'
+    definitions_path.write_text(json.dumps(DEFINITIONS), encoding='utf-8')
+
+    compute_derived(make_tables(), MAPPING, str(definitions_path), str(tmp_path))
+    derived = pd.read_csv(tmp_path / 'faits_naf_derived.csv', encoding='utf-8-sig').set_index(['naf_id', 'ind_id'])
+
+    assert (derived['derived'] == 1).all()
+    assert abs(derived.loc[(101, 9001), 'value'] - 86000.0 / 1073.0) < 1e-9
+    # The total's purchased quantity is null, so neither its price nor the share can be computed
+    assert pd.isna(derived.loc[(124, 9001), 'value'])
+    assert pd.isna(derived.loc[(101, 9002), 'value'])
+
+    compute_derived(make_tables(), MAPPING, str(definitions_path), str(tmp_path))
+    assert "0 of 2 indicators recomputed" in capsys.readouterr().out
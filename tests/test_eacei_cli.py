@@ -0,0 +1,51 @@
+import os
+import sys
+import json
+import subprocess
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), '03_scripts')
+sys.path.insert(0, SCRIPTS_DIR)
+
+from eacei_config import project_dir
+
+STAGE_MODULES = [
+    "xls_to_csv", "xls_to_csv_post_2018", "of_interest", "step_1_cleaning",
+    "step_2_NAF", "step_2_REG", "step_2_TEFF", "step_3_T1", "step_3_T2", "step_3_T3", "step_3_T4",
+    "copy_files_new_folder", "build_dims", "build_faits", "consistency_check", "fact_tensor",
+]
+
+def run_python(code, root):
+    env = dict(os.environ, EACEI_ROOT=str(root))
+    return subprocess.run([sys.executable, "-c", code], cwd=SCRIPTS_DIR, env=env,
+                          capture_output=True, text=True, timeout=60)
+
+def test_cli_parses_without_pandas(tmp_path):
+    """Parsing a stage command does not import the stage, pandas or NumPy."""
+    result = run_python(
+        "import sys, eacei\n"
+        "args = eacei.build_parser().parse_args(['step3', 't2'])\n"
+        "assert args.tables == ['T2']\n"
+        "print(sorted(m for m in ('pandas', 'numpy', 'step_3_T2') if m in sys.modules))", tmp_path)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "[]"
+
+def test_importing_stages_does_nothing(tmp_path):
+    """Stage modules can be imported (e.g. by worker pools) without running or printing anything."""
+    result = run_python("\n".join(f"import {name}" for name in STAGE_MODULES), tmp_path)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout == ""
+    assert os.listdir(str(tmp_path)) == []
+
+def test_folder_resolution(tmp_path, monkeypatch):
+    """Environment variables win over eacei.json, which wins over the default layout."""
+    monkeypatch.setenv("EACEI_ROOT", str(tmp_path))
+    for key in ("EACEI_CONFIG", "EACEI_RAW_DIR", "EACEI_CLEAN_DIR", "EACEI_LOGS_DIR"):
+        monkeypatch.delenv(key, raising=False)
+    with open(str(tmp_path / "eacei.json"), 'w', encoding='utf-8') as f:
+        json.dump({"paths": {"raw": "data/raw", "clean": "/srv/eacei/clean"}}, f)
+
+    assert project_dir("logs") == str(tmp_path / "07_logs")
+    assert project_dir("raw") == str(tmp_path / "data" / "raw")
+    assert project_dir("clean") == os.path.abspath("/srv/eacei/clean")
+    monkeypatch.setenv("EACEI_RAW_DIR", str(tmp_path / "elsewhere"))
+    assert project_dir("raw") == str(tmp_path / "elsewhere")
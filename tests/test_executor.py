@@ -0,0 +1,94 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), '03_scripts'))
+
+import executor
+import run_metrics
+from executor import SerialExecutor, ThreadExecutor, ProcessExecutor, ClusterExecutor, run_tasks
+from run_metrics import metered, connect, count
+
+def square(x):
+    if x == 3:
+        raise ValueError("bad file")
+    count(rows_in=x, rows_out=1)
+    return x * x
+
+@pytest.fixture(params=["serial", "threads", "processes", "cluster"])
+def backend(request, monkeypatch):
+    if request.param == "serial":
+        instance = SerialExecutor()
+    elif request.param == "threads":
+        instance = ThreadExecutor(3)
+    elif request.param == "processes":
+        instance = ProcessExecutor(3)
+    else:  # Local stand-in for a cluster: the coordinator and two workers on this host
+        instance = ClusterExecutor(local_workers=2)
+    monkeypatch.setattr(executor, "_executor", instance)
+    yield instance
+    executor.close_executor()
+
+def test_outcomes_come_back_in_task_order(backend):
+    """Every backend returns the same results in task order, errors included."""
+    for _ in range(2):  # The executor serves several stages
+        outcomes = list(run_tasks(square, [(x,) for x in range(8)]))
+        assert [o.task for o in outcomes] == [(x,) for x in range(8)]
+        assert [o.result for o in outcomes] == [0, 1, 4, None, 16, 25, 36, 49]
+        assert all(o.error is None for o in outcomes if o.task != (3,))
+        assert isinstance(outcomes[3].error, ValueError)
+
+def test_worker_counts_are_recorded(backend, tmp_path, monkeypatch):
+    """Off the serial backend, each task's counts end up as a file row of the stage."""
+    if backend.kind == "serial":
+        pytest.skip("serial tasks record their own file_metrics")
+    monkeypatch.delenv(run_metrics.METRICS_ENV, raising=False)
+    monkeypatch.setenv("EACEI_LOGS_DIR", str(tmp_path))
+
+    @metered("step_1")
+    def stage():
+        return list(run_tasks(square, [(x,) for x in (2, 3, 5)], path=lambda task: f"{task[0]}.csv"))
+    stage()
+
+    connection = connect()
+    rows = connection.execute("SELECT file, status, rows_in FROM metrics WHERE stage = 'step_1' ORDER BY rowid").fetchall()
+    connection.close()
+    assert rows[:3] == [("2.csv", "ok", 2), ("3.csv", "failed", 0), ("5.csv", "ok", 5)]
+    assert rows[3] == (None, "ok", 7)
+
+def test_tasks_are_handed_out_within_the_window(backend):
+    """A slow consumer holds the tasks back: they are pulled lazily, a window ahead."""
+    window = executor.WINDOW_PER_WORKER * getattr(backend, "workers", 1)
+    if backend.kind == "cluster":
+        window = backend.window
+    pulled = [0]
+
+    def tasks():
+        for x in range(40):
+            pulled[0] += 1
+            yield (x,)
+
+    ahead = []
+    for consumed, outcome in enumerate(run_tasks(square, tasks()), start=1):
+        ahead.append(pulled[0] - consumed)
+    assert consumed == 40
+    assert max(ahead) <= window
+
+def test_cluster_fails_without_workers(monkeypatch):
+    """A cluster run with no worker left raises instead of waiting forever."""
+    monkeypatch.setattr(executor, "WORKER_TIMEOUT", 0.5)
+    instance = ClusterExecutor()  # No local worker, and no remote one joins
+    try:
+        with pytest.raises(RuntimeError, match="No cluster worker"):
+            list(instance.run(square, [(x,) for x in range(4)]))
+    finally:
+        instance.close()
+
+def test_default_cluster_key_only_on_loopback(monkeypatch):
+    """A coordinator reachable from other hosts needs its own key."""
+    monkeypatch.delenv(executor.CLUSTER_KEY_ENV, raising=False)
+    assert executor.cluster_key(("127.0.0.1", 7000)) == executor.cluster_key(("localhost", 7000))
+    with pytest.raises(ValueError, match=executor.CLUSTER_KEY_ENV):
+        ClusterExecutor(("0.0.0.0", 0))
+    monkeypatch.setenv(executor.CLUSTER_KEY_ENV, "s3cret")
+    assert executor.cluster_key(("0.0.0.0", 7000)) == b"s3cret"
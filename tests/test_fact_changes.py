@@ -0,0 +1,44 @@
+import os
+import sys
+import json
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), '03_scripts'))
+
+from fact_store import FactTable, save_binary
+from fact_changes import load_previous, capture_changes, write_summary, CHANGES_FOLDER, SUMMARY_FILE
+
+def facts(rows):
+    cat_id, ind_id, year_id, value = zip(*rows)
+    return FactTable("naf_id", np.array(cat_id, dtype=np.int16), np.array(ind_id, dtype=np.int16),
+                     np.array(year_id, dtype=np.int16), np.array(value, dtype=np.float64))
+
+def test_changes_against_the_previous_build(tmp_path):
+    """Only changed keys reach the change files; a null that stays null is unchanged."""
+    output_dir = str(tmp_path)
+    assert load_previous(output_dir, "faits_naf") is None
+    save_binary(facts([(101, 1001, 2010, 1.5), (101, 1001, 2011, np.nan), (102, 1002, 2010, 3.0),
+                       (102, 1002, 2011, 4.0)]), os.path.join(output_dir, "faits_naf"))
+    current = facts([(101, 1001, 2010, 1.5), (101, 1001, 2011, np.nan), (102, 1002, 2010, np.nan),
+                     (103, 1002, 2010, 7.0)])
+
+    entry = capture_changes(load_previous(output_dir, "faits_naf"), current, "faits_naf", output_dir)
+    assert (entry["inserts"], entry["updates"], entry["deletes"], entry["indicators"]) == (1, 1, 1, [1002])
+
+    changes_dir = tmp_path / CHANGES_FOLDER
+    read = lambda kind: pd.read_csv(changes_dir / f"faits_naf_{kind}.csv", encoding='utf-8-sig')
+    assert read("inserts").values.tolist() == [[103, 1002, 2010, 7.0]]
+    updates = read("updates")
+    assert updates.iloc[0, :3].tolist() == [102, 1002, 2010] and np.isnan(updates["value"][0])
+    assert read("deletes").values.tolist() == [[102, 1002, 2011]]
+
+    # Without a previous build: full reload, no stale change files left
+    other = str(tmp_path / "other")
+    os.makedirs(os.path.join(other, CHANGES_FOLDER))
+    open(os.path.join(other, CHANGES_FOLDER, "faits_naf_inserts.csv"), 'w').close()
+    full = capture_changes(load_previous(other, "faits_naf"), current, "faits_naf", other)
+    write_summary({"faits_naf": full}, other)
+    assert os.listdir(os.path.join(other, CHANGES_FOLDER)) == [SUMMARY_FILE]
+    with open(os.path.join(other, CHANGES_FOLDER, SUMMARY_FILE), encoding='utf-8') as f:
+        assert json.load(f)["tables"]["faits_naf"] == {"full_reload": True, "rows": 4}
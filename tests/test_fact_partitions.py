@@ -0,0 +1,47 @@
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), '03_scripts'))
+
+from fact_store import FactTable, FACT_CAT_COLUMNS, save_binary
+from fact_partitions import export_partitions, refresh, STATE_FILE
+
+def save_facts(database_dir, years, bump=None):
+    """Writes one small binary fact table per category; `bump` changes that year's values."""
+    for category, cat_col in FACT_CAT_COLUMNS.items():
+        year_id = np.repeat(np.array(years, dtype=np.int16), 2)
+        value = np.where(year_id == bump, 5.0, 1.0)
+        value[1] = np.nan
+        table = FactTable(cat_col, np.full(len(year_id), 101, dtype=np.int16),
+                          np.tile(np.array([1001, 1002], dtype=np.int16), len(years)), year_id, value)
+        save_binary(table, os.path.join(database_dir, f"faits_{category.lower()}"))
+
+def test_refresh_loads_only_changed_years(tmp_path):
+    """Only the partitions whose hash changed are re-imported; removed years are dropped."""
+    database_dir = str(tmp_path)
+    save_facts(database_dir, [2010, 2011, 2012])
+    first = export_partitions(database_dir)
+    assert first["tables"]["faits_naf"]["2011"]["rows"] == 2
+
+    loaded, dropped = [], []
+    load = lambda table, year, path: loaded.append((table, year, os.path.exists(path)))
+    drop = lambda table, year: dropped.append((table, year))
+    out_dir = os.path.join(database_dir, "partitions")
+    assert refresh(load, drop, out_dir) == (9, 0)
+    assert all(exists for _, _, exists in loaded)
+
+    save_facts(database_dir, [2010, 2011], bump=2011)
+    second = export_partitions(database_dir)
+    naf = second["tables"]["faits_naf"]
+    assert naf["2010"] == first["tables"]["faits_naf"]["2010"]
+    assert naf["2011"]["build_id"] == second["build_id"] and "2012" not in naf
+    assert not os.path.exists(os.path.join(out_dir, "faits_naf", "faits_naf_2012.csv"))
+
+    del loaded[:]
+    assert refresh(load, drop, out_dir, record=False) == (3, 3)
+    assert refresh(load, drop, out_dir) == (3, 3)
+    assert sorted(year for _, year, _ in loaded) == ["2011"] * 6
+    assert sorted(dropped) == sorted([(f"faits_{c.lower()}", "2012") for c in FACT_CAT_COLUMNS] * 2)
+    assert refresh(load, drop, out_dir) == (0, 0)
+    assert os.path.exists(os.path.join(out_dir, STATE_FILE))
@@ -0,0 +1,65 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), '03_scripts'))
+
+from fact_ranking import ranking_index, build_ranking, save_ranking, open_ranking
+from fact_store import FactTable
+
+MAPPING = {
+    "NAF": [{"naf_code": code, "naf_id": naf_id} for code, naf_id in
+            (("_T", 100), ("10", 101), ("11", 102), ("12", 103), ("13", 104), ("14", 105))],
+    "T1": [{"T1_code": "T1_CONSO", "ind_id": 1001, "T1_unit": "kTEP"}],
+}
+
+def make_ranking(tmp_path, rows):
+    table = FactTable.from_frame(pd.DataFrame(rows, columns=["naf_id", "ind_id", "year_id", "value"]))
+    index = ranking_index("NAF", MAPPING)
+    save_ranking(str(tmp_path), "NAF", build_ranking(table, index["excluded"]), index)
+    return open_ranking("NAF", str(tmp_path))
+
+def test_ties_nulls_and_totals(tmp_path):
+    """Ties share a rank, nulls are listed apart and the total is never ranked."""
+    nan = float("nan")
+    ranking = make_ranking(tmp_path, [
+        (100, 1001, 2020, 99.0), (101, 1001, 2020, 5.0), (102, 1001, 2020, 7.0),
+        (103, 1001, 2020, nan), (104, 1001, 2020, 5.0), (105, 1001, 2020, 1.0),
+        (101, 1001, 2021, nan), (102, 1001, 2021, 3.0),
+    ])
+    members, values = ranking.top("T1_CONSO", 2020, 2)
+    assert list(members) == [102, 101] and list(values) == [7.0, 5.0]
+    members, _ = ranking.top(1001, 2020, 2, with_ties=True)
+    assert list(members) == [102, 101, 104]
+    assert ranking.member_codes(ranking.bottom(1001, 2020, 2)[0]) == ["14", "13"]
+
+    assert [ranking.rank_of(code, 1001, 2020) for code in ("10", "11", "12", "13", "14")] == [2, 1, None, 2, 4]
+    assert ranking.rank_of("_T", 1001, 2020) is None
+    assert list(ranking.nulls(1001, 2020)) == [103]
+    assert ranking.counts(1001, 2020) == (4, 1)
+    assert ranking.counts(1001, 2021) == (1, 1)
+    assert ranking.percentile(1001, 2020, 50) == 5.0
+    assert ranking.percentile(1001, 2020, 100) == 7.0
+    assert ranking.percentile(1001, 2020, 0) == 1.0
+
+def test_matches_a_sort_of_each_group(tmp_path):
+    """On random facts, every group's order and ranks match a pandas sort."""
+    rng = np.random.default_rng(0)
+    n = 2000
+    df = pd.DataFrame({
+        "naf_id": rng.integers(100, 106, n), "ind_id": 1001, "year_id": rng.integers(2010, 2024, n),
+        "value": rng.integers(0, 20, n).astype(float),
+    }).drop_duplicates(["naf_id", "ind_id", "year_id"])
+    df.loc[df.sample(frac=0.2, random_state=0).index, "value"] = np.nan
+    ranking = make_ranking(tmp_path, df.itertuples(index=False))
+
+    ranked = df[df["naf_id"] != 100].dropna()
+    for year, group in ranked.groupby("year_id"):
+        expected = group.sort_values(["value", "naf_id"], ascending=[False, True])
+        members, values = ranking.top(1001, year, len(group) + 5)
+        assert list(members) == list(expected["naf_id"])
+        assert list(values) == list(expected["value"])
+        ranks = group.set_index("naf_id")["value"].rank(method="min", ascending=False)
+        for naf_id, rank in ranks.items():
+            assert ranking.rank_of(int(naf_id), 1001, year) == int(rank)
@@ -0,0 +1,42 @@
+import os
+import sys
+import pytest
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), '03_scripts'))
+
+from fact_tensor import export_tensors, open_tensor
+
+DATABASE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), '05_database_final')
+
+def test_tensor_matches_fact_table(tmp_path):
+    """Tensor cells equal the fact rows and slices are views of the memory map."""
+    export_tensors(DATABASE_DIR, str(tmp_path))
+    tensor = open_tensor('NAF', str(tmp_path))
+    facts = pd.read_csv(os.path.join(DATABASE_DIR, 'faits_naf.csv'), encoding='utf-8-sig')
+
+    sample = facts.dropna(subset=['value']).sample(50, random_state=0)
+    for naf_id, ind_id, year_id, value in sample.itertuples(index=False):
+        assert tensor.values[tensor.member_pos(naf_id), tensor.ind_pos(ind_id), tensor.year_pos(year_id)] == value
+
+    assert int(tensor.mask.sum()) == facts['value'].notna().sum()
+    assert np.shares_memory(tensor.series('_T', 'T1_TOTAL_NET_KTEP'), tensor.values)
+
+def test_interrupted_export_keeps_previous_tensor(tmp_path, monkeypatch):
+    """A save that fails midway leaves the last complete tensor and no temporary file."""
+    export_tensors(DATABASE_DIR, str(tmp_path))
+    before = sorted(os.listdir(str(tmp_path)))
+    values = np.load(os.path.join(str(tmp_path), 'naf_values.npy'))
+
+    def crash(path, array):
+        with open(path, 'wb') as f:
+            f.write(b"half")
+        raise OSError("disk full")
+    monkeypatch.setattr(np, "save", crash)
+    with pytest.raises(OSError):
+        export_tensors(DATABASE_DIR, str(tmp_path))
+    monkeypatch.undo()
+
+    assert sorted(os.listdir(str(tmp_path))) == before
+    np.testing.assert_array_equal(open_tensor('NAF', str(tmp_path)).values, values)
@@ -0,0 +1,86 @@
+import os
+import sys
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), '03_scripts'))
+
+from header_plan import HeaderPlanCache, apply_plan
+
+HEADER_MAP = {
+    "Houille achetée": [
+        {"years": "2010-2019", "type": "multi-index", "product_contains": "Houille", "indicator": "Quantités achetées"},
+        {"years": "2020-2023", "type": "single-header", "header": "Houille achetée"},
+    ],
+    "Gaz acheté": [
+        {"years": "2010-2019", "type": "multi-index", "product_contains": "Gaz", "indicator": "Quantités achetées"},
+    ],
+}
+
+def pre_2020_frame(dim):
+    columns = pd.MultiIndex.from_tuples([
+        (f"{dim}_code", f"{dim}_code"), (f"{dim}_label", f"{dim}_label"),
+        ("Houille (en kt)", "Quantités achetées"), ("Houille (en kt)", "Prix moyen"),
+        ("Coke de houille", "Stock"),
+    ])
+    return pd.DataFrame([["13", "Textile", "5", "1", "2"]], columns=columns)
+
+def test_plan_renames_drops_and_adds(tmp_path):
+    """Matched pairs are renamed, unmatched columns dropped, missing ones added."""
+    plans = HeaderPlanCache("T2", HEADER_MAP, cache_dir=str(tmp_path))
+    df = pre_2020_frame("naf")
+    plan = plans.plan_for(df.columns, 2015)
+    out = apply_plan(df, plan)
+
+    assert list(out.columns) == ["naf_code", "naf_label", "Houille achetée", "Gaz acheté"]
+    assert out["Houille achetée"].tolist() == ["5"]
+    assert out["Gaz acheté"].isna().all()
+    assert plan["order"] == ["naf_code", "naf_label", "Houille achetée", "Gaz acheté"]
+
+def test_plans_are_shared_across_dimensions_and_runs(tmp_path):
+    """NAF and REG headers share a plan, which is reused by the next run."""
+    plans = HeaderPlanCache("T2", HEADER_MAP, cache_dir=str(tmp_path))
+    plans.plan_for(pre_2020_frame("naf").columns, 2015)
+    reg_plan = plans.plan_for(pre_2020_frame("reg").columns, 2016)
+    plans.save()
+    assert (plans.misses, plans.hits) == (1, 1)
+    assert reg_plan["names"][:2] == ["reg_code", "reg_label"]
+
+    next_run = HeaderPlanCache("T2", HEADER_MAP, cache_dir=str(tmp_path))
+    next_run.plan_for(pre_2020_frame("teff").columns, 2017)
+    assert (next_run.misses, next_run.hits) == (0, 1)
+
+    changed = dict(HEADER_MAP, **{"Fioul acheté": []})
+    new_version = HeaderPlanCache("T2", changed, cache_dir=str(tmp_path))
+    assert new_version.plans == {}
+
+def test_forks_merge_back(tmp_path):
+    """Plans resolved by the per-file forks of an executor run are merged and saved."""
+    plans = HeaderPlanCache("T2", HEADER_MAP, cache_dir=str(tmp_path))
+    forks = [plans.fork(), plans.fork()]
+    forks[0].plan_for(pre_2020_frame("naf").columns, 2015)
+    forks[1].plan_for(pre_2020_frame("reg").columns, 2015)
+    assert plans.plans == {}
+    for fork in forks:
+        plans.merge(fork.changes())
+    plans.save()
+    assert (plans.misses, plans.hits, len(plans.plans)) == (2, 0, 1)
+
+    later = plans.fork()
+    later.plan_for(pre_2020_frame("teff").columns, 2016)
+    assert later.changes() == ({}, 1, 0)
+    assert len(HeaderPlanCache("T2", HEADER_MAP, cache_dir=str(tmp_path)).plans) == 1
+
+def test_unreadable_cache_counts_as_empty(tmp_path):
+    """A truncated plan file is ignored, then replaced whole by the next save."""
+    plans = HeaderPlanCache("T2", HEADER_MAP, cache_dir=str(tmp_path))
+    plans.plan_for(pre_2020_frame("naf").columns, 2015)
+    plans.save()
+    with open(plans.path, 'r+', encoding='utf-8') as f:
+        f.truncate(20)
+
+    again = HeaderPlanCache("T2", HEADER_MAP, cache_dir=str(tmp_path))
+    assert again.plans == {}
+    again.plan_for(pre_2020_frame("naf").columns, 2015)
+    again.save()
+    assert HeaderPlanCache("T2", HEADER_MAP, cache_dir=str(tmp_path)).plans == again.plans
+    assert os.listdir(str(tmp_path)) == ["T2.json"]  # No temporary file left
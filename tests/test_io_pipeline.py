@@ -0,0 +1,79 @@
+import os
+import sys
+import time
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), '03_scripts'))
+
+import executor
+import io_pipeline
+from blob_store import BlobStore
+from io_pipeline import run_pipeline, open_text
+
+def upper_task(data, path, out_path, store):
+    """Reads a text file, writes it in upper case through the store."""
+    with open_text(path, data) as f:
+        text = f.read()
+    if text.startswith("bad"):
+        raise ValueError("unreadable")
+    store.write_bytes(out_path, text.upper().encode('utf-8'))
+    return len(text)
+
+def make_tasks(tmp_path, texts):
+    store = BlobStore(str(tmp_path / "blobs"))
+    tasks = []
+    for i, text in enumerate(texts):
+        path = tmp_path / f"in_{i}.csv"
+        path.write_bytes(text.encode('utf-8'))
+        tasks.append((str(path), str(tmp_path / f"out_{i}.csv"), store))
+    return tasks
+
+def test_same_outcomes_with_and_without_overlap(tmp_path, monkeypatch):
+    """Overlapped or not, outcomes come back in order and the outputs are written."""
+    monkeypatch.setattr(executor, "_executor", executor.ThreadExecutor(3))
+    texts = ["a,b\r\n1,2\r\n", "bad", "c\n", "d,e\n"] * 3
+    tasks = make_tasks(tmp_path, texts)
+    results = {}
+    for overlap in ("0", "1"):
+        monkeypatch.setenv(io_pipeline.OVERLAP_ENV, overlap)
+        for i in range(len(texts)):
+            if os.path.exists(tmp_path / f"out_{i}.csv"):
+                os.remove(tmp_path / f"out_{i}.csv")
+        outcomes = list(run_pipeline(upper_task, tasks, path=lambda task: task[0]))
+        assert [o.task for o in outcomes] == tasks
+        results[overlap] = [o.result for o in outcomes]
+        assert all(isinstance(o.error, ValueError) for o in outcomes[1::4])
+        assert (tmp_path / "out_0.csv").read_bytes() == b"A,B\n1,2\n"
+        assert not os.path.exists(tmp_path / "out_1.csv")
+    assert results["0"] == results["1"] == [8, None, 2, 4] * 3
+
+def slow_task(data, path, out_path, store):
+    time.sleep(0.05)
+    return len(data or b"")
+
+def test_reads_overlap_compute_within_the_window(tmp_path, monkeypatch):
+    """Slow reads run while files are computed, never more than the window ahead."""
+    monkeypatch.setattr(executor, "_executor", executor.SerialExecutor())
+    monkeypatch.setenv(io_pipeline.OVERLAP_ENV, "1")
+    monkeypatch.setenv(io_pipeline.WINDOW_ENV, "3")
+    read_bytes = io_pipeline.read_bytes
+    started, lock = [0], threading.Lock()
+
+    def slow_read(path):
+        with lock:
+            started[0] += 1
+        time.sleep(0.05)  # A slow network drive
+        return read_bytes(path)
+    monkeypatch.setattr(io_pipeline, "read_bytes", slow_read)
+
+    tasks = make_tasks(tmp_path, ["x"] * 12)
+    ahead = []
+    begin = time.perf_counter()
+    for consumed, outcome in enumerate(run_pipeline(slow_task, tasks, path=lambda task: task[0]), start=1):
+        assert outcome.result == 1
+        ahead.append(started[0] - consumed)
+    elapsed = time.perf_counter() - begin
+
+    # One compute thread: 12 x 0.05 s of compute, the reads hidden behind it
+    assert elapsed < 0.8 * 12 * 0.1
+    assert max(ahead) <= 3
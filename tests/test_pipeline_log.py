@@ -0,0 +1,49 @@
+import os
+import sys
+import logging
+import multiprocessing
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), '03_scripts'))
+
+from pipeline_log import LOGGER_NAME, LogWriter, init_worker, set_log_file
+
+def log_file_rows(file_name):
+    """Worker task: logs 50 records for one file."""
+    set_log_file(file_name)
+    logger = logging.getLogger(LOGGER_NAME)
+    for i in range(50):
+        logger.info(f"row {i} of {file_name}")
+    return file_name
+
+def read_lines(path):
+    with open(path, encoding='utf-8') as f:
+        return f.read().splitlines()
+
+def test_workers_write_through_one_writer(tmp_path):
+    """Records of every worker reach the log whole, tagged with run, worker and file."""
+    files = [f"2019_NAF_T{t}.csv" for t in range(1, 5)]
+    with LogWriter("data_cleaning_T1", "run-1", log_dir=str(tmp_path), batch_size=16) as log_writer:
+        logging.getLogger(LOGGER_NAME).info("--- start ---")
+        pool = multiprocessing.Pool(2, initializer=init_worker, initargs=log_writer.worker_args())
+        assert pool.map(log_file_rows, files) == files
+        pool.close()
+        pool.join()
+
+    lines = read_lines(str(tmp_path / "data_cleaning_T1.log"))
+    assert len(lines) == 1 + 50 * len(files)
+    fields = [line.split(" | ") for line in lines]
+    assert all(len(f) == 6 and f[1] == "INFO" and f[2] == "run-1" for f in fields)
+    assert fields[0][3:] == ["MainProcess", "-", "--- start ---"]
+    assert all(f[5].endswith(f"of {f[4]}") and f[3] != "MainProcess" for f in fields[1:])
+
+def test_each_run_gets_a_fresh_log(tmp_path):
+    """The previous run's log moves to history/ and old runs beyond `keep` are dropped."""
+    history = tmp_path / "history"
+    for run in ("run-1", "run-2"):
+        with LogWriter("data_cleaning_T4", run, log_dir=str(tmp_path)):
+            logging.getLogger(LOGGER_NAME).info(run)
+
+    assert [line.split(" | ")[2] for line in read_lines(str(tmp_path / "data_cleaning_T4.log"))] == ["run-2"]
+    rotated = os.listdir(str(history))
+    assert rotated == ["data_cleaning_T4.run-1.log"]
+    assert read_lines(str(history / rotated[0]))[0].endswith("| run-1")
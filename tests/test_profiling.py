@@ -0,0 +1,41 @@
+import os
+import sys
+import json
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), '03_scripts'))
+
+import profiling
+from profiling import profiled, profile_file, profile_stage
+
+@profiled("step_3_T1")
+def process_files(names):
+    for name in names:
+        with profile_file(name):
+            sum(i * i for i in range(20000 * (1 + names.index(name))))
+
+def test_disabled_profiling_is_a_no_op(tmp_path, monkeypatch):
+    """Without EACEI_PROFILE the contexts are the shared no-op and nothing is written."""
+    monkeypatch.delenv(profiling.PROFILE_ENV, raising=False)
+    monkeypatch.setenv("EACEI_LOGS_DIR", str(tmp_path))
+    assert profile_stage("step_3_T1") is profile_file("2010_NAF_T1.csv")
+    process_files(["2010_NAF_T1.csv"])
+    assert os.listdir(str(tmp_path)) == []
+
+def test_profile_artifacts(tmp_path, monkeypatch):
+    """A profiled run writes one .prof per stage and a summary ranking the slowest files."""
+    monkeypatch.setenv(profiling.PROFILE_ENV, "1")
+    monkeypatch.setenv("EACEI_LOGS_DIR", str(tmp_path))
+    with profile_stage("step3"):
+        process_files(["2010_NAF_T1.csv", "2011_NAF_T1.csv", "2012_NAF_T1.csv"])
+
+    (run_dir,) = os.listdir(str(tmp_path / "profiles"))
+    out = tmp_path / "profiles" / run_dir
+    assert sorted(os.listdir(str(out))) == ["step3.prof", "step_3_T1.prof", "summary.json", "summary.txt"]
+    with open(str(out / "summary.json"), encoding='utf-8') as f:
+        summary = json.load(f)
+    assert [s["stage"] for s in summary["stages"]] == ["step3", "step_3_T1"]
+    assert [f["file"] for f in summary["files"]][0] == "2012_NAF_T1.csv"
+    assert all(f["stage"] == "step_3_T1" and f["peak_bytes"] > 0 for f in summary["files"])
+    assert any("<genexpr>" in f["function"] for f in summary["functions"])
+    assert set(summary["allocations"]) == {"step3", "step_3_T1"}
+    assert profiling._run is None
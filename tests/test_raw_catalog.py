@@ -0,0 +1,92 @@
+import os
+import sys
+import zipfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), '03_scripts'))
+
+from raw_catalog import RawCatalog, classify_source, read_header
+
+T2_PRE_2020 = "ID,NAF,Houille,Houille\nID,NAF,Quantités achetées,Prix moyen\n_T,Total,8396,s\n"
+T1 = "﻿ID,NAF,Houille\n_T,Total,4920\n"
+
+def write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+
+def raw_tree(tmp_path, monkeypatch):
+    """One 2010 package: a converted sheet, its 'original' copy and a step_2 file."""
+    raw_dir = tmp_path / "01_data_raw"
+    package = raw_dir / "2010" / "dd_irecoeacei10_excel"
+    write(str(package / "converted_csv_files" / "eacei2010_tab2_na_eacei2010_tab2_naf.csv"), T2_PRE_2020)
+    write(str(package / "of_interest" / "original" / "2010_NAF_T2.csv"), T2_PRE_2020)
+    write(str(package / "of_interest" / "step_1" / "2010_NAF_T1.csv"), T1)
+    write(str(package / "of_interest" / "step_2" / "2010_NAF_T1.csv"), T1)
+
+    # The zips folder is configured, away from the raw folder
+    zips_dir = tmp_path / "downloads" / "zips"
+    os.makedirs(str(zips_dir))
+    monkeypatch.setenv("EACEI_ZIPS_DIR", str(zips_dir))
+    with zipfile.ZipFile(str(zips_dir / "dd_irecoeacei10_excel.zip"), 'w') as z:
+        z.writestr("eacei2010_tab2_naf.xls", b"")
+        z.writestr("eacei2010_tab2_nce.xls", b"")
+    return str(raw_dir), package
+
+def test_classify_source():
+    """Downloaded tables are classified like of_interest did; IAA and tab5 files are not."""
+    assert classify_source("eacei2010_tab2_na_eacei2010_tab2_naf.csv") == ("NAF", "T2")
+    assert classify_source("teff_t4.csv") == ("TEFF", "T4")
+    assert classify_source("eacei2010_tab2_taille_ia_eacei2010_tab2_taille.csv") is None
+    assert classify_source("eacei2010_tab5_na_eacei2010_tab5_naf.csv") is None
+
+def test_entries_record_origin_and_layout(tmp_path, monkeypatch):
+    """Stage files are classified, linked to their source and zip member, with their header depth."""
+    raw_dir, _ = raw_tree(tmp_path, monkeypatch)
+    catalog = RawCatalog(raw_dir)
+    assert catalog.refresh() == (4, 0, 0)
+
+    original = catalog.lookup("original", 2010, "NAF", "T2")
+    assert original["source"] == "2010/dd_irecoeacei10_excel/converted_csv_files/eacei2010_tab2_na_eacei2010_tab2_naf.csv"
+    assert (original["archive"], original["member"]) == ("dd_irecoeacei10_excel.zip", "eacei2010_tab2_naf.xls")
+    assert original["header_depth"] == 2 and read_header(original) == [0, 1]
+
+    step_2 = catalog.lookup("step_2", 2010, "NAF", "T1")
+    assert step_2["source"] == "2010/dd_irecoeacei10_excel/of_interest/step_1/2010_NAF_T1.csv"
+    assert step_2["encoding"] == "utf-8-sig" and read_header(step_2) == 0
+    assert [e["table"] for e in catalog.tables("step_2", category="NAF")] == ["T1"]
+    assert catalog.lookup("step_2", 2010, "NAF", "T4") is None
+
+def test_refresh_is_incremental(tmp_path, monkeypatch):
+    """Unchanged files are kept, touched files keep their checksum, edits and deletions are picked up."""
+    raw_dir, package = raw_tree(tmp_path, monkeypatch)
+    catalog = RawCatalog(raw_dir)
+    catalog.refresh()
+    catalog.save()
+
+    step_1 = str(package / "of_interest" / "step_1" / "2010_NAF_T1.csv")
+    stat = os.stat(step_1)
+    os.utime(step_1, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    write(str(package / "of_interest" / "step_2" / "2010_NAF_T1.csv"), T2_PRE_2020)
+    os.remove(str(package / "of_interest" / "original" / "2010_NAF_T2.csv"))
+
+    reloaded = RawCatalog(raw_dir)
+    assert reloaded.refresh() == (0, 1, 1)
+    assert reloaded.entry(step_1)["mtime_ns"] == stat.st_mtime_ns + 10**9
+    assert reloaded.lookup("step_2", 2010, "NAF", "T1")["header_depth"] == 2
+    assert reloaded.lookup("original", 2010, "NAF", "T2") is None
+
+def test_unreadable_catalog_is_rebuilt(tmp_path, monkeypatch):
+    """A truncated catalog file counts as empty; the save replaces it whole."""
+    raw_dir, _ = raw_tree(tmp_path, monkeypatch)
+    catalog = RawCatalog(raw_dir)
+    catalog.refresh()
+    catalog.save()
+    with open(catalog.path, 'r+', encoding='utf-8') as f:
+        f.truncate(100)
+
+    reloaded = RawCatalog(raw_dir)
+    assert reloaded.entries == {}
+    assert reloaded.refresh() == (4, 0, 0)
+    reloaded.save()
+    assert RawCatalog(raw_dir).entries == reloaded.entries
+    assert sorted(os.listdir(raw_dir)) == sorted(["2010", os.path.basename(catalog.path)])  # No temporary file left
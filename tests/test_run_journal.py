@@ -0,0 +1,68 @@
+import os
+import sys
+import json
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), '03_scripts'))
+
+from atomic_io import atomic_path
+from run_journal import RunJournal
+
+UNITS = [{"year": 2010, "category": "NAF", "table": t, "sha1": t.lower()} for t in ("T1", "T2", "T3")]
+
+def test_interrupted_run_resumes(tmp_path):
+    """A run without an end event is resumed and skips the units already done."""
+    journal = RunJournal("step_3_T1", str(tmp_path))
+    journal.done(UNITS[0])
+    with open(journal.path, 'a', encoding='utf-8') as f:
+        f.write('{"event": "done", "unit": "2010/NA')  # Torn line of the crash
+
+    resumed = RunJournal("step_3_T1", str(tmp_path))
+    assert resumed.resumed and resumed.run_id == journal.run_id
+    assert [u["table"] for u in resumed.pending(UNITS)] == ["T2", "T3"]
+
+def test_changed_input_is_reprocessed(tmp_path):
+    """A unit whose input checksum changed since it was done runs again."""
+    journal = RunJournal("step_3_T1", str(tmp_path))
+    journal.done(UNITS[0])
+
+    resumed = RunJournal("step_3_T1", str(tmp_path))
+    edited = dict(UNITS[0], sha1="edited")
+    assert list(resumed.pending([edited])) == [edited]
+
+def test_failed_unit_is_quarantined(tmp_path):
+    """A failure is reported in quarantine and keeps the run open; a clean retry closes it."""
+    journal = RunJournal("step_3_T1", str(tmp_path))
+    journal.done(UNITS[0])
+    try:
+        raise ValueError("bad header")
+    except ValueError as e:
+        journal.failed(UNITS[1], e)
+    journal.done(UNITS[2])
+    assert journal.end() is False
+
+    with open(str(tmp_path / "quarantine" / "step_3_T1" / "2010_NAF_T2.json"), encoding='utf-8') as f:
+        report = json.load(f)
+    assert report["error"] == "ValueError('bad header')" and report["run"] == journal.run_id
+
+    retry = RunJournal("step_3_T1", str(tmp_path))
+    assert [u["table"] for u in retry.pending(UNITS)] == ["T2"]
+    retry.done(UNITS[1])
+    assert retry.end() is True
+    assert not RunJournal("step_3_T1", str(tmp_path)).resumed
+
+def test_atomic_path_keeps_previous_file(tmp_path):
+    """A write that fails leaves the destination untouched and no temporary file."""
+    path = str(tmp_path / "faits_naf.csv")
+    with atomic_path(path) as tmp:
+        with open(tmp, 'w') as f:
+            f.write("v1\n")
+    with pytest.raises(RuntimeError):
+        with atomic_path(path) as tmp:
+            with open(tmp, 'w') as f:
+                f.write("v2, half")
+            raise RuntimeError("crash")
+    with open(path) as f:
+        assert f.read() == "v1\n"
+    assert os.listdir(str(tmp_path)) == ["faits_naf.csv"]
@@ -0,0 +1,60 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), '03_scripts'))
+
+import run_metrics
+from run_metrics import metered, file_metrics, count, connect, report
+
+@metered("step_3_T1")
+def process_files(paths):
+    for path in paths:
+        try:
+            with file_metrics(str(path)):
+                if path.name.startswith("bad"):
+                    raise ValueError("unreadable")
+                count(rows_in=10, rows_out=4, suppression_events=2)
+        except ValueError:
+            continue
+
+def add_run(connection, run_id, seconds):
+    connection.execute("INSERT INTO runs VALUES (?, ?, ?)", (run_id, f"2025-01-01 00:00:{run_id}", "eacei step3"))
+    connection.execute("INSERT INTO metrics (run_id, stage, status, wall_seconds, rows_in) VALUES (?, ?, 'ok', ?, 100)",
+                       (run_id, "step_3_T1", seconds))
+
+def test_stage_and_file_rows(tmp_path, monkeypatch):
+    """Each file gets a row; the stage row holds the totals and failed files are marked."""
+    monkeypatch.delenv(run_metrics.METRICS_ENV, raising=False)
+    monkeypatch.setenv("EACEI_LOGS_DIR", str(tmp_path))
+    paths = [tmp_path / "2010_NAF_T1.csv", tmp_path / "bad_NAF_T1.csv", tmp_path / "2011_NAF_T1.csv"]
+    for path in paths:
+        path.write_bytes(b"x" * 100)
+    process_files(paths)
+
+    connection = connect()
+    rows = connection.execute(
+        "SELECT file, status, rows_in, rows_out, suppression_events, bytes_read, wall_seconds "
+        "FROM metrics WHERE stage = 'step_3_T1' ORDER BY rowid").fetchall()
+    (run_count,) = connection.execute("SELECT COUNT(*) FROM runs").fetchone()
+    connection.close()
+    assert run_count == 1
+    assert [r[:6] for r in rows] == [
+        ("2010_NAF_T1.csv", "ok", 10, 4, 2, 100),
+        ("bad_NAF_T1.csv", "failed", 0, 0, 0, 100),
+        ("2011_NAF_T1.csv", "ok", 10, 4, 2, 100),
+        (None, "ok", 20, 8, 4, 300),
+    ]
+    assert rows[-1][6] >= sum(r[6] for r in rows[:-1])
+    assert run_metrics._run is None
+
+def test_report_flags_slower_stages(tmp_path):
+    """The last run is compared with the median of the previous runs."""
+    db_path = str(tmp_path / run_metrics.METRICS_FILE)
+    connection = connect(db_path)
+    with connection:
+        for run_id, seconds in (("01", 10.0), ("02", 50.0), ("03", 11.0), ("04", 12.0)):
+            add_run(connection, run_id, seconds)
+    connection.close()
+    (regression,) = report(db_path, baseline_runs=3, threshold=5.0)
+    assert regression["stage"] == "step_3_T1" and regression["baseline_seconds"] == 11.0
+    assert report(db_path, baseline_runs=3, threshold=20.0) == []
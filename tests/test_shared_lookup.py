@@ -0,0 +1,42 @@
+import os
+import sys
+import multiprocessing
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), '03_scripts'))
+
+from shared_lookup import LookupTable, publish_lookups, attach_lookups, init_worker, lookups
+
+NAF = {"13": 1, "10-12": 2, "C": 3, "31-32": 4}
+
+def resolve_in_worker(codes):
+    """Worker task: resolves codes with the attached NAF table."""
+    table = lookups()["NAF"]
+    ids, found = table.resolve(codes)
+    return ids.tolist(), found.tolist(), table.keys.flags.writeable
+
+def test_resolve_matches_the_dict():
+    """Known codes get their id; unknown codes and non-strings are not found."""
+    table = LookupTable.from_dict(NAF)
+    codes = ["31-32", "13", "14", np.nan, None, "C", "", "10-12"]
+    ids, found = table.resolve(codes)
+    assert found.tolist() == [code in NAF for code in codes]
+    assert ids[found].tolist() == [NAF[code] for code in codes if code in NAF]
+    assert table.get("C") == 3 and table.get("Z") is None
+    assert LookupTable.from_dict({}).resolve(["13"])[1].tolist() == [False]
+
+def test_workers_attach_the_published_tables():
+    """Pool workers resolve through read-only views of one shared block."""
+    tables = {"NAF": LookupTable.from_dict(NAF), "indicators": LookupTable.from_dict({"Consommation": 101})}
+    with publish_lookups(tables) as handle:
+        block, attached = attach_lookups(handle)
+        assert attached["indicators"].get("Consommation") == 101
+        del attached
+        block.close()
+
+        pool = multiprocessing.Pool(2, initializer=init_worker, initargs=(handle,))
+        results = pool.map(resolve_in_worker, [["13", "99"], ["C", "31-32"]])
+        pool.close()
+        pool.join()
+
+    assert results == [([1, 0], [True, False], False), ([3, 4], [True, True], False)]
@@ -0,0 +1,79 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), '03_scripts'))
+
+from typed_table import (NUMBER, INTEGER, BLANK, S, DASH, TEXT, null_codes, to_typed,
+                         sum_duplicate_columns, sum_rows, to_output, typed_bytes, open_typed, typed_frame)
+
+NULLS = null_codes(['s', 'so', 'ns'])
+
+def test_values_are_parsed_once_into_markers():
+    """Numbers, integers, blanks, suppression markers and text each get their code."""
+    df = pd.DataFrame({
+        "naf_code": ["13", "14", "15", "16", "17"],
+        "naf_label": ["a", "b", "c", "d", "e"],
+        "A": ["5", "2.5", np.nan, "s", "-"],
+        "B": ["x", "7", "7", "7", "7"],
+    })
+    values, markers = to_typed(df)
+
+    assert markers["A"].tolist() == [INTEGER, NUMBER, BLANK, S, DASH]
+    assert markers["B"].tolist()[:2] == [TEXT, INTEGER]
+    assert values["A"].iloc[1] == 2.5 and np.isnan(values["A"].iloc[3])
+    assert values["naf_code"].tolist() == df["naf_code"].tolist()
+
+def test_duplicate_columns_are_summed_with_records():
+    """Same-named columns are summed; a partial sum is recorded, an all-null one stays null."""
+    df = pd.DataFrame([["13", "a", "1", "2"], ["14", "b", "s", "3"], ["15", "c", "so", np.nan]],
+                      columns=["naf_code", "naf_label", "A", "A"])
+    values, markers = to_typed(df)
+    out, out_markers, records = sum_duplicate_columns(values, markers, NULLS)
+
+    assert list(out.columns) == ["A", "naf_code", "naf_label"]
+    assert out["A"].tolist()[:2] == [3.0, 3.0] and np.isnan(out["A"].iloc[2])
+    assert records == [("ColumnAggregation", "A", "14")]
+    assert to_output(out[["naf_code", "naf_label", "A"]],
+                     out_markers[["naf_code", "naf_label", "A"]])["A"].tolist()[:2] == [3, 3.0]
+
+def test_rows_sharing_a_code_are_summed():
+    """Rows are grouped by sorted code, keep the first label and drop missing codes."""
+    df = pd.DataFrame({
+        "naf_code": ["14", "13", "14", np.nan],
+        "naf_label": ["b1", "a", "b2", "z"],
+        "A": ["1", "s", "2", "9"],
+    })
+    values, markers = to_typed(df)
+    out, out_markers, records = sum_rows(values, markers, NULLS)
+
+    assert out["naf_code"].tolist() == ["13", "14"]
+    assert out["naf_label"].tolist() == ["a", "b1"]
+    assert np.isnan(out["A"].iloc[0]) and out["A"].iloc[1] == 3
+    assert out_markers["A"].tolist() == [S, INTEGER]
+    assert records == []
+
+
+def test_typed_file_keeps_values_and_markers(tmp_path):
+    """A typed file maps back to the values read from the CSV, and keeps the suppression markers."""
+    df = pd.DataFrame({
+        "naf_code": [13, 14, 15],
+        "naf_label": ["a", np.nan, "c"],
+        "Consommation d’électricité": ["0.1", "s", np.nan],
+        "Prix moyen (en euros)": ["1", "2", "3"],
+    })
+    values, markers = to_typed(df)
+    values["Consommation d’électricité"] += 0.2  # A sum the CSV text does not round-trip
+    path = tmp_path / "2010_NAF_T1.npy"
+    path.write_bytes(typed_bytes(values, markers))
+
+    table = open_typed(str(path))
+    assert not table["values"]["Prix moyen (en euros)"].flags.writeable  # A view of the read-only map
+    assert table["markers"]["Consommation d’électricité"].tolist() == [NUMBER, S, BLANK]
+    frame = typed_frame(table)
+    assert list(frame.columns) == list(df.columns)
+    assert frame["naf_code"].tolist() == ["13", "14", "15"]
+    assert frame["naf_label"].isna().tolist() == [False, True, False]
+    assert frame["Consommation d’électricité"].iloc[0] == 0.1 + 0.2
+    assert frame["Prix moyen (en euros)"].tolist() == [1.0, 2.0, 3.0]
@@ -0,0 +1,35 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), '03_scripts'))
+
+from fact_store import FactTable
+from unit_conversion import UnitConverter, load_conversions
+
+DICTIONARIES_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), '04_dictionaries')
+
+def converter():
+    units = {1001: "", 1002: "kTEP", 2001: "M€", 2011: "GWh", 2044: "K€", 2009: "€/MWh"}
+    return UnitConverter(units, load_conversions(os.path.join(DICTIONARIES_DIR, 'unit_conversions.json')))
+
+def test_convert_keeps_only_the_same_quantity():
+    """kTEP and GWh convert into each other; counts and money are left out."""
+    table = FactTable("naf_id", np.array([101, 101, 102, 102, 103], dtype=np.int16),
+                      np.array([1001, 1002, 2011, 2001, 1002], dtype=np.int16),
+                      np.full(5, 2015, dtype=np.int16), np.array([7.0, 2.0, 23.26, 5.0, np.nan]))
+    conv = converter()
+    gwh = conv.convert(table, "GWh")
+    assert gwh.ind_id.tolist() == [1002, 2011, 1002]
+    np.testing.assert_allclose(gwh.value, [23.26, 23.26, np.nan])
+    ktep = conv.convert(table, "kTEP")
+    np.testing.assert_allclose(ktep.value, [2.0, 2.0, np.nan])
+    np.testing.assert_allclose(conv.lookup([2044, 2001, 9999, 2009], "M€"), [0.001, 1.0, np.nan, np.nan])
+
+def test_convert_frame():
+    """A DataFrame selection gets the converted values and the target unit."""
+    df = pd.DataFrame({"reg_id": [201, 202], "ind_id": [1002, 2001], "value": [1.0, 3.0]})
+    out = converter().convert_frame(df, "MWh")
+    assert out["reg_id"].tolist() == [201] and out["unit"].tolist() == ["MWh"]
+    np.testing.assert_allclose(out["value"], [11630.0])